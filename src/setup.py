@@ -29,7 +29,7 @@ setup(
 
     keywords='Windows autotest library',
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),
-    install_requires=['pywin32', 'chardet', 'wmi'],
+    install_requires=['pywin32', 'chardet', 'wmi', 'scandir; python_version < "3.5"'],
 
     # List additional groups of dependencies here (e.g. development
     # dependencies). You can install these using the following syntax,
@@ -0,0 +1,136 @@
+# encoding=utf-8
+"""
+Run shell commands concurrently with asyncio (Python 3 only).
+Use Shell.run_async()/Shell.gather() instead of importing this module directly.
+"""
+import os
+import signal
+import asyncio
+import logging
+import weakref
+
+from . import launcher
+from .launcher import get_launcher
+
+launcher.INTERNAL_MODULES.add(__name__)
+
+# Max number of child processes running at the same time
+MAX_CONCURRENCY = 8
+
+# Semaphore of each event loop to limit concurrent child processes
+_SEMAPHORES = weakref.WeakKeyDictionary()
+
+
+def set_max_concurrency(count):
+    """Change max number of concurrent child processes.
+    Event loops which already run commands keep their limit."""
+    global MAX_CONCURRENCY
+    MAX_CONCURRENCY = count
+    _SEMAPHORES.clear()
+
+
+def _get_semaphore():
+    """Get semaphore of running event loop"""
+    loop = asyncio.get_event_loop()
+    sem = _SEMAPHORES.get(loop)
+    if sem is None:
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+        _SEMAPHORES[loop] = sem
+    return sem
+
+
+def _create_process(cmd, shell):
+    """Start command with piped output.
+    A shell command is passed to the shell as it is, so quotes are not escaped again.
+    On POSIX the command gets its own process group, so children of shell are killed too"""
+    kwargs = {'stdout': asyncio.subprocess.PIPE, 'stderr': asyncio.subprocess.PIPE}
+    if os.name != 'nt':
+        kwargs['start_new_session'] = True
+    if shell:
+        if not isinstance(cmd, str):
+            cmd = ' '.join(cmd)
+        return asyncio.create_subprocess_shell(cmd, **kwargs)
+    args = [cmd] if isinstance(cmd, str) else list(cmd)
+    return asyncio.create_subprocess_exec(*args, **kwargs)
+
+
+def _kill(process):
+    """Kill process and its process group"""
+    try:
+        if os.name != 'nt':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:
+        # Process already exited
+        pass
+
+
+async def run_async(cmd, expected_code=0, shell=True, timeout=None, caller=None):
+    """Execute a command as Shell.system() does, without blocking event loop.
+    The process is killed if the command times out or the coroutine is cancelled,
+    e.g. when another command of gather() fails.
+    @param timeout: Seconds to wait for command. The process is killed on timeout.
+    @param caller: Caller name recorded by launcher
+    @return: stdout and stderr of application
+    """
+    async with _get_semaphore():
+        logging.debug('Execute command: %s', cmd)
+        token = get_launcher().begin(cmd, caller)
+        try:
+            process = await _create_process(cmd, shell)
+        except BaseException:
+            get_launcher().end(token, None)
+            raise
+        out = err = b''
+        try:
+            out, err = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            desc = '%s timed out after %s seconds' % (cmd, timeout)
+            logging.error(desc)
+            raise Exception(desc)
+        finally:
+            if process.returncode is None:
+                _kill(process)
+                await process.wait()
+            get_launcher().end(token, process.returncode, len(out) + len(err))
+
+    ret = process.returncode
+    if ret != expected_code:
+        desc = '%s failed: %s\nError Message: %s' % (cmd, out, err)
+        logging.error(desc)
+        raise Exception(desc)
+
+    return out, err
+
+
+async def gather(cmds, expected_code=0, shell=True, timeout=None,
+                 return_exceptions=False, caller=None):
+    """Execute commands concurrently.
+    @param cmds: List of commands
+    @return: List of (stdout, stderr) in the same order of cmds
+    """
+    tasks = [asyncio.ensure_future(run_async(cmd, expected_code, shell, timeout, caller))
+             for cmd in cmds]
+    try:
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+    finally:
+        # A failed command does not stop others in asyncio.gather(), cancel them
+        # and wait until their processes are killed
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def system_many(cmds, expected_code=0, shell=True, timeout=None, caller=None):
+    """Execute commands concurrently from synchronous code.
+    Use 'await gather()' in a coroutine, an event loop cannot be run inside another one"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        desc = 'system_many() cannot be called in a running event loop, await gather() instead'
+        logging.error(desc)
+        raise Exception(desc)
+    return asyncio.run(gather(cmds, expected_code, shell, timeout, caller=caller))
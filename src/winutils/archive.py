@@ -0,0 +1,168 @@
+# encoding=utf-8
+"""
+Extract zip files in process with a thread pool.
+"""
+from __future__ import absolute_import, division
+
+import os
+import time
+import errno
+import fnmatch
+import logging
+import zipfile
+import threading
+from multiprocessing.pool import ThreadPool
+
+from .exclude import get_matcher
+
+# Size of buffer used to copy data of one member
+BUFFER_SIZE = 1024 * 1024
+
+
+class ExtractStats(object):
+    """Result of extract_zip()"""
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """Bytes per second"""
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return '<ExtractStats files=%d bytes=%d elapsed=%.3fs %.1f MB/s>' % (
+            self.files, self.bytes, self.elapsed, self.throughput / 1024 / 1024)
+
+
+def makedirs(path):
+    """Create directory and its parents if they do not exist"""
+    try:
+        os.makedirs(path)
+    except OSError as err:
+        if err.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+
+
+def member_path(dest_dir, name):
+    """
+    Get path to extract a member to, None if member is outside dest_dir
+    >>> member_path('out', 'a/b.txt') == os.path.join('out', 'a', 'b.txt')
+    True
+    >>> member_path('out', '../evil.txt') is None
+    True
+    """
+    parts = [i for i in name.replace('\\', '/').split('/') if i not in ('', '.')]
+    if not parts or '..' in parts or ':' in parts[0]:
+        return None
+    return os.path.join(dest_dir, *parts)
+
+
+def _match(name, patterns):
+    """Check whether member name matches any pattern"""
+    return any(fnmatch.fnmatch(name, i) for i in patterns)
+
+
+class _Extractor(object):
+    """Extract members of one zip file, each thread opens zip file once"""
+    def __init__(self, zip_file, buffer_size):
+        self.zip_file = zip_file
+        self.buffer_size = buffer_size
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+
+    def _zip(self):
+        """Get zip file handle of current thread"""
+        handle = getattr(self._local, 'zip', None)
+        if handle is None:
+            handle = zipfile.ZipFile(self.zip_file)
+            self._local.zip = handle
+            self._local.buf = bytearray(self.buffer_size)
+            with self._lock:
+                self._handles.append(handle)
+        return handle
+
+    def extract(self, item):
+        """Extract one member to path, return bytes written"""
+        info, path = item
+        handle = self._zip()
+        buf = self._local.buf
+        view = memoryview(buf)
+        size = 0
+        src = handle.open(info)
+        try:
+            with open(path, 'wb') as dst:
+                while True:
+                    count = src.readinto(buf)
+                    if not count:
+                        break
+                    dst.write(view[:count])
+                    size += count
+        finally:
+            src.close()
+
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        os.utime(path, (mtime, mtime))
+        return size
+
+    def close(self):
+        """Close all zip file handles"""
+        for handle in self._handles:
+            handle.close()
+
+
+def extract_zip(zip_file, dest_dir, patterns=None, workers=4, buffer_size=BUFFER_SIZE,
+                excluded=None):
+    """
+    Extract zip file to directory, members are written to disk in parallel.
+    @param patterns: Only extract members whose name matches one of the glob patterns
+    @param excluded: ExcludeMatcher or list of exclusion patterns of members not to extract
+    @param workers: Number of threads to extract members
+    @return: ExtractStats
+    """
+    stats = ExtractStats()
+    start = time.time()
+    logging.info('Extract %s to %s', zip_file, dest_dir)
+
+    with zipfile.ZipFile(zip_file) as handle:
+        infos = handle.infolist()
+
+    # Create directories first, then files can be written by any thread
+    files = []
+    excluded = get_matcher(excluded)
+    makedirs(dest_dir)
+    for info in infos:
+        if patterns and not _match(info.filename, patterns) or \
+                excluded and excluded.match(info.filename):
+            stats.skipped += 1
+            continue
+        path = member_path(dest_dir, info.filename)
+        if path is None:
+            logging.warning('Skip member outside of destination: %s', info.filename)
+            stats.skipped += 1
+            continue
+        if info.filename.endswith(('/', '\\')):
+            makedirs(path)
+        else:
+            makedirs(os.path.dirname(path))
+            files.append((info, path))
+
+    # Large members first to balance threads
+    files.sort(key=lambda i: i[0].file_size, reverse=True)
+    extractor = _Extractor(zip_file, buffer_size)
+    pool = ThreadPool(max(1, workers))
+    try:
+        for size in pool.imap_unordered(extractor.extract, files):
+            stats.files += 1
+            stats.bytes += size
+    finally:
+        pool.close()
+        pool.join()
+        extractor.close()
+
+    stats.elapsed = time.time() - start
+    logging.info('Extracted %s: %s', zip_file, stats)
+    return stats
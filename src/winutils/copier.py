@@ -0,0 +1,314 @@
+# encoding=utf-8
+"""
+Copy files and directory trees in process.
+Files are copied on a thread pool with the fastest way the OS provides.
+"""
+from __future__ import absolute_import, division
+
+import os
+import sys
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from functools import partial
+from multiprocessing.pool import ThreadPool
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir # Python 2
+
+from .archive import makedirs
+from .exclude import get_matcher
+
+# Size of buffer used when kernel copy is not available
+BUFFER_SIZE = 1024 * 1024
+
+# Number of threads to copy files
+WORKERS = 8
+
+
+class CopyStats(object):
+    """Result of copytree()"""
+    def __init__(self):
+        self.files = 0
+        self.dirs = 0
+        self.bytes = 0
+        self.skipped = 0
+        # Number of destination files whose digest is verified
+        self.verified = 0
+        self.elapsed = 0.0
+        # List of (path, error message)
+        self.failures = []
+
+    @property
+    def throughput(self):
+        """Bytes per second"""
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return '<CopyStats files=%d dirs=%d bytes=%d verified=%d failures=%d elapsed=%.3fs ' \
+               '%.1f MB/s>' % (self.files, self.dirs, self.bytes, self.verified,
+                               len(self.failures), self.elapsed, self.throughput / 1024 / 1024)
+
+
+_local = threading.local()
+
+
+def _get_buffer():
+    """Get copy buffer of current thread"""
+    buf = getattr(_local, 'buf', None)
+    if buf is None:
+        buf = _local.buf = bytearray(BUFFER_SIZE)
+    return buf
+
+
+def _kernel_copy(src, dst, size):
+    """Copy data in kernel with copy_file_range or sendfile.
+    Return False if they are not supported or stop before size, then both files are
+    positioned at the bytes copied so far. An empty size is not trusted, files of
+    procfs report size 0 but have content"""
+    if size == 0:
+        return False
+    for name in ('copy_file_range', 'sendfile'):
+        func = getattr(os, name, None)
+        if func is None:
+            continue
+        offset = 0
+        try:
+            while offset < size:
+                if name == 'sendfile':
+                    count = func(dst.fileno(), src.fileno(), offset, size - offset)
+                else:
+                    count = func(src.fileno(), dst.fileno(), size - offset, offset, offset)
+                if count == 0:
+                    break
+                offset += count
+        except OSError:
+            if offset:
+                raise
+            continue
+        if offset < size:
+            # Source is shorter than its size, continue from offset with buffer copy
+            src.seek(offset)
+            dst.seek(offset)
+            return False
+        return True
+    return False
+
+
+def _buffer_copy(src, dst):
+    """Copy data with buffer of current thread"""
+    buf = _get_buffer()
+    view = memoryview(buf)
+    while True:
+        count = src.readinto(buf)
+        if not count:
+            break
+        dst.write(view[:count])
+
+
+def copy_file(src_path, dest_path):
+    """Copy data, permission and timestamps of a file, return bytes copied"""
+    with open(src_path, 'rb') as src:
+        size = os.fstat(src.fileno()).st_size
+        with open(dest_path, 'wb') as dst:
+            if not (sys.platform.startswith('linux') and _kernel_copy(src, dst, size)):
+                _buffer_copy(src, dst)
+            dst.flush()
+            size = os.fstat(dst.fileno()).st_size
+    shutil.copystat(src_path, dest_path)
+    return size
+
+
+def copy_file_digest(src_path, dest_path, algorithm='sha1'):
+    """
+    Copy file like copy_file(), data is hashed while it is copied.
+    Kernel copy is not used as data has to pass through the buffer.
+    @return: (bytes copied, hex digest of source)
+    """
+    digest = hashlib.new(algorithm)
+    buf = _get_buffer()
+    view = memoryview(buf)
+    size = 0
+    with open(src_path, 'rb') as src:
+        with open(dest_path, 'wb') as dst:
+            while True:
+                count = src.readinto(buf)
+                if not count:
+                    break
+                digest.update(view[:count])
+                dst.write(view[:count])
+                size += count
+    shutil.copystat(src_path, dest_path)
+    return size, digest.hexdigest()
+
+
+def file_digest(path, algorithm='sha1'):
+    """Get hex digest of file content"""
+    digest = hashlib.new(algorithm)
+    buf = _get_buffer()
+    view = memoryview(buf)
+    with open(path, 'rb') as file_obj:
+        while True:
+            count = file_obj.readinto(buf)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.hexdigest()
+
+
+def iter_tree(root, excluded_files=None, stats=None):
+    """
+    Walk directory tree, yield (relative path, DirEntry) of files and directories.
+    Directories are yielded before their children.
+    @param excluded_files: ExcludeMatcher or list of exclusion patterns relative to root
+    @param stats: Object with skipped and failures attributes to update
+    """
+    excluded = get_matcher(excluded_files)
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            entries = list(scandir(os.path.join(root, rel_dir)))
+        except OSError as err:
+            logging.error('Failed to read directory %s: %s', rel_dir, err)
+            if stats is not None:
+                stats.failures.append((os.path.join(root, rel_dir), str(err)))
+            continue
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name)
+            if excluded and excluded.match(rel_path):
+                logging.debug('Exclude %s', rel_path)
+                if stats is not None:
+                    stats.skipped += 1
+                continue
+            if entry.is_dir():
+                stack.append(rel_path)
+            yield rel_path, entry
+
+
+def walk_files(src, dest, excluded_files=None, stats=None):
+    """
+    Walk source tree, create directories in destination,
+    yield (source file, destination file) of files to copy.
+    @param excluded_files: ExcludeMatcher or list of exclusion patterns relative to src
+    """
+    makedirs(dest)
+    for rel_path, entry in iter_tree(src, excluded_files, stats):
+        dest_path = os.path.join(dest, rel_path)
+        if entry.is_dir():
+            try:
+                makedirs(dest_path)
+            except OSError as err:
+                logging.error('Failed to create directory %s: %s', dest_path, err)
+                if stats is not None:
+                    stats.failures.append((dest_path, str(err)))
+                continue
+            if stats is not None:
+                stats.dirs += 1
+        else:
+            yield entry.path, dest_path
+
+
+def _copy_item(item):
+    """Copy one file in worker thread, return (path, bytes copied, error)"""
+    src_path, dest_path = item
+    try:
+        return src_path, copy_file(src_path, dest_path), None
+    except (IOError, OSError) as err:
+        return src_path, 0, str(err)
+
+
+def _copy_digest_item(algorithm, item):
+    """Copy and hash one file in worker thread, return (source, destination, bytes copied,
+    source mtime, hex digest, error)"""
+    src_path, dest_path = item
+    try:
+        size, digest = copy_file_digest(src_path, dest_path, algorithm)
+        return src_path, dest_path, size, os.stat(src_path).st_mtime, digest, None
+    except (IOError, OSError) as err:
+        return src_path, dest_path, 0, 0, None, str(err)
+
+
+def copytree(src, dest, excluded_files=None, workers=None, verify=None, manifest_file=None):
+    """
+    Copy directory tree, files are overwritten as robocopy /e /is does.
+    @param excluded_files: ExcludeMatcher or list of exclusion patterns relative to src,
+        see winutils.exclude
+    @param workers: Number of threads to copy files
+    @param verify: Hash algorithm like 'sha1' to verify copied files. Source files are hashed
+        while they are copied, destination files are hashed on another thread pool which
+        overlaps with copy. Digests are saved to a manifest which incremental copy reuses
+    @param manifest_file: Manifest path used with verify, default is dest + '.manifest'
+    @return: CopyStats, failed files are listed in stats.failures
+    """
+    if verify:
+        return _copytree_verify(src, dest, excluded_files, workers, verify, manifest_file)
+
+    stats = CopyStats()
+    start = time.time()
+    logging.info('Copy %s to %s', src, dest)
+
+    pool = ThreadPool(workers or WORKERS)
+    try:
+        items = walk_files(src, dest, excluded_files, stats)
+        for path, size, err in pool.imap_unordered(_copy_item, items):
+            if err is not None:
+                logging.error('Failed to copy %s: %s', path, err)
+                stats.failures.append((path, err))
+            else:
+                stats.files += 1
+                stats.bytes += size
+    finally:
+        pool.close()
+        pool.join()
+
+    stats.elapsed = time.time() - start
+    logging.info('Copied %s: %s', src, stats)
+    return stats
+
+
+def _copytree_verify(src, dest, excluded_files, workers, algorithm, manifest_file):
+    """copytree() which verifies digests of copied files and saves them to manifest"""
+    # sync imports this module
+    from .sync import Manifest, manifest_path
+    from .verify import Verifier
+
+    stats = CopyStats()
+    start = time.time()
+    logging.info('Copy %s to %s, verify with %s', src, dest, algorithm)
+    manifest = Manifest.load(manifest_file or manifest_path(dest), algorithm)
+    manifest.algorithm = algorithm
+
+    verifier = Verifier(algorithm)
+    pool = ThreadPool(workers or WORKERS)
+    try:
+        items = walk_files(src, dest, excluded_files, stats)
+        for src_path, dest_path, size, mtime, digest, err in pool.imap_unordered(
+                partial(_copy_digest_item, algorithm), items):
+            key = os.path.relpath(dest_path, dest).replace(os.sep, '/')
+            if err is not None:
+                logging.error('Failed to copy %s: %s', src_path, err)
+                stats.failures.append((src_path, err))
+                manifest.files.pop(key, None)
+                continue
+            stats.files += 1
+            stats.bytes += size
+            manifest.files[key] = [size, mtime, digest]
+            verifier.submit(dest_path, digest, key)
+    finally:
+        pool.close()
+        pool.join()
+        verifier.join()
+
+    for key in verifier.failed_keys:
+        manifest.files.pop(key, None)
+    stats.verified = verifier.verified
+    stats.failures.extend(verifier.failures)
+    manifest.save()
+
+    stats.elapsed = time.time() - start
+    logging.info('Copied %s: %s', src, stats)
+    return stats
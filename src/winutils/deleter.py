@@ -0,0 +1,170 @@
+# encoding=utf-8
+"""
+Delete files and directory trees in process.
+Files are deleted on a thread pool, then directories are removed bottom-up.
+"""
+from __future__ import absolute_import
+
+import os
+import stat
+import time
+import errno
+import logging
+from multiprocessing.pool import ThreadPool
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir # Python 2
+
+from .exclude import get_matcher
+
+# Number of threads to delete files
+WORKERS = 8
+
+# Windows file attribute of symbolic links and junctions
+FILE_ATTRIBUTE_REPARSE_POINT = 0x400
+
+
+class DeleteStats(object):
+    """Result of delete_tree(), counts are files/directories to delete in dry run"""
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.files = 0
+        self.dirs = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+        # List of (path, error message)
+        self.failures = []
+
+    def __repr__(self):
+        return '<DeleteStats%s files=%d dirs=%d bytes=%d failures=%d elapsed=%.3fs>' % (
+            ' dry_run' if self.dry_run else '', self.files, self.dirs, self.bytes,
+            len(self.failures), self.elapsed)
+
+
+def _is_link(entry):
+    """Check whether entry is a symbolic link or junction, which is removed without its target"""
+    if entry.is_symlink():
+        return True
+    attributes = getattr(entry.stat(follow_symlinks=False), 'st_file_attributes', 0)
+    return bool(attributes & FILE_ATTRIBUTE_REPARSE_POINT)
+
+
+def _retry_writable(func, path):
+    """Call func(path), clear read-only attribute and try again if access is denied"""
+    try:
+        func(path)
+    except OSError as err:
+        if err.errno not in (errno.EACCES, errno.EPERM):
+            raise
+        os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+        func(path)
+
+
+def _remove_link(path):
+    """Remove symbolic link or junction"""
+    try:
+        os.unlink(path)
+    except OSError:
+        # Directory link on Windows
+        os.rmdir(path)
+
+
+def _delete_file(item):
+    """Delete one file in worker thread, return (path, error)"""
+    path, is_link = item
+    try:
+        _retry_writable(_remove_link if is_link else os.remove, path)
+        return path, None
+    except OSError as err:
+        if err.errno == errno.ENOENT:
+            return path, None
+        return path, str(err)
+
+
+def _walk(root, excluded, stats, dirs):
+    """Yield (path, is link) of files under root, append directories to dirs in pre-order.
+    Directories containing excluded entries are kept"""
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        dirs.append(rel_dir)
+        try:
+            entries = list(scandir(os.path.join(root, rel_dir)))
+        except OSError as err:
+            stats.failures.append((os.path.join(root, rel_dir), str(err)))
+            continue
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name)
+            if excluded and excluded.match(rel_path):
+                stats.skipped += 1
+                continue
+            if entry.is_dir(follow_symlinks=False) and not _is_link(entry):
+                stack.append(rel_path)
+                continue
+            stats.files += 1
+            stats.bytes += entry.stat(follow_symlinks=False).st_size
+            yield entry.path, _is_link(entry)
+
+
+def delete_tree(path, workers=None, dry_run=False, excluded=None):
+    """
+    Delete file or directory even if it is readonly.
+    Symbolic links and junctions are removed without touching their targets.
+    @param workers: Number of threads to delete files
+    @param dry_run: Only count files and directories to delete
+    @param excluded: ExcludeMatcher or list of exclusion patterns relative to path
+    @return: DeleteStats, failed paths are listed in stats.failures
+    """
+    stats = DeleteStats(dry_run)
+    start = time.time()
+
+    if not os.path.isdir(path) or os.path.islink(path):
+        if os.path.lexists(path):
+            stats.files = 1
+            if not dry_run:
+                err = _delete_file((path, os.path.islink(path)))[1]
+                if err is not None:
+                    stats.failures.append((path, err))
+        stats.elapsed = time.time() - start
+        return stats
+
+    logging.info('Delete %s%s', path, ' (dry run)' if dry_run else '')
+    dirs = []
+    excluded = get_matcher(excluded)
+    files = _walk(path, excluded, stats, dirs)
+    if dry_run:
+        for _ in files:
+            pass
+    else:
+        pool = ThreadPool(workers or WORKERS)
+        try:
+            for file_path, err in pool.imap_unordered(_delete_file, files, chunksize=16):
+                if err is not None:
+                    logging.error('Failed to delete %s: %s', file_path, err)
+                    stats.failures.append((file_path, err))
+        finally:
+            pool.close()
+            pool.join()
+
+    # Children are always after their parent in pre-order
+    for rel_dir in reversed(dirs):
+        if dry_run:
+            stats.dirs += 1
+            continue
+        dir_path = os.path.join(path, rel_dir) if rel_dir else path
+        try:
+            _retry_writable(os.rmdir, dir_path)
+            stats.dirs += 1
+        except OSError as err:
+            if err.errno == errno.ENOENT:
+                continue
+            # Directory is not empty because some files failed or are excluded
+            if not (stats.failures or stats.skipped) or err.errno != errno.ENOTEMPTY:
+                logging.error('Failed to remove directory %s: %s', dir_path, err)
+                stats.failures.append((dir_path, str(err)))
+
+    stats.elapsed = time.time() - start
+    logging.info('Deleted %s: %s', path, stats)
+    return stats
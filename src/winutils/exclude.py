@@ -0,0 +1,206 @@
+# encoding=utf-8
+r"""
+Match relative paths against exclusion patterns.
+
+Patterns are compiled once, so walkers can check each path without any stat:
+  - Literal relative path, e.g. 'build\out': the path and everything under it
+  - Glob without separator, e.g. '*.pyc': matches file/directory name at any level
+  - Glob with separator, e.g. 'logs/*.tmp' or '**/cache': matches path from root
+  - Regular expression with 're:' prefix: matches relative path with '/' separator
+A glob also matches the literal path it is written as, so a file named
+'build[1].log' is excluded by the pattern 'build[1].log'.
+
+>>> matcher = ExcludeMatcher(['build/out', '*.pyc', 'logs/*.tmp', 're:^tmp\\d+$'])
+>>> [matcher.match(i) for i in ['build/out/a.txt', 'src/x.pyc', 'logs/a.tmp', 'tmp12']]
+[True, True, True, True]
+>>> [matcher.match(i) for i in ['build/output', 'src/x.py', 'logs/sub/a.tmp', 'tmp12a']]
+[False, False, False, False]
+>>> [ExcludeMatcher(['build[1].log']).match(i) for i in ['build[1].log', 'build1.log']]
+[True, True]
+"""
+import os
+import re
+
+REGEX_PREFIX = 're:'
+_GLOB_CHARS = re.compile(r'[*?\[]')
+# Keys of trie node which mark the end of a literal path and globs under the node,
+# they never conflict with path components
+_END = ''
+_GLOBS = '/'
+
+
+def _split(path):
+    """Split relative path to components"""
+    return [i for i in path.replace('\\', '/').split('/') if i not in ('', '.')]
+
+
+def glob_to_regex(pattern):
+    """
+    Translate glob pattern to regular expression without anchors.
+    '**' matches any number of directories, '*' and '?' do not match '/'.
+    """
+    result = []
+    i = 0
+    length = len(pattern)
+    while i < length:
+        char = pattern[i]
+        if pattern.startswith('**/', i):
+            result.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            result.append('.*')
+            i += 2
+            continue
+        if char == '*':
+            result.append('[^/]*')
+        elif char == '?':
+            result.append('[^/]')
+        elif char == '[':
+            end = pattern.find(']', i + 2)
+            if end < 0:
+                result.append(re.escape(char))
+            else:
+                chars = pattern[i + 1:end]
+                if chars.startswith('!'):
+                    chars = '^' + chars[1:]
+                result.append('[%s]' % chars.replace('\\', '\\\\'))
+                i = end
+        else:
+            result.append(re.escape(char))
+        i += 1
+    return ''.join(result)
+
+
+class ExcludeMatcher(object):
+    """
+    Exclusion patterns compiled into:
+      - a trie of literal path components. Path globs are attached to the trie node
+        of their literal prefix, so only globs under a matched prefix are tried
+      - a set of name suffixes for name globs like '*.tmp'
+      - one regular expression of other name globs, matched against each name
+      - one regular expression of 're:' patterns
+    """
+    def __init__(self, patterns=None, ignore_case=None):
+        """
+        @param patterns: List of patterns, see module document
+        @param ignore_case: Compare paths case insensitively, default is True on Windows
+        """
+        self.ignore_case = os.name == 'nt' if ignore_case is None else ignore_case
+        self.patterns = list(patterns or [])
+        # Literal relative paths, names with wildcard, paths with wildcard, regular expressions
+        self.literals = []
+        self.name_globs = []
+        self.path_globs = []
+        self.regexes = []
+        self._flags = re.IGNORECASE if self.ignore_case else 0
+        self._trie = {}
+        self._suffixes = set()
+
+        name_regexes = []
+        for pattern in self.patterns:
+            if pattern.startswith(REGEX_PREFIX):
+                self.regexes.append(pattern[len(REGEX_PREFIX):])
+                continue
+            parts = _split(pattern)
+            if not _GLOB_CHARS.search(pattern):
+                if parts:
+                    self.literals.append('/'.join(parts))
+                    self._node(parts)[_END] = True
+                continue
+            # A glob also matches its exact path, e.g. file name 'build[1].log'
+            if parts:
+                self._node(parts)[_END] = True
+            if '/' in pattern.replace('\\', '/').strip('/'):
+                self.path_globs.append('/'.join(parts))
+                self._add_path_glob(parts)
+            else:
+                name = pattern.strip('/\\')
+                self.name_globs.append(name)
+                if len(name) > 1 and name[0] == '*' and not _GLOB_CHARS.search(name[1:]):
+                    self._suffixes.add(self._case(name[1:]))
+                else:
+                    name_regexes.append(glob_to_regex(name))
+
+        self._suffix_lengths = sorted(set(len(i) for i in self._suffixes))
+        self._name_regex = self._compile(name_regexes, r'\Z')
+        self._regex = re.compile('|'.join('(?:%s)' % i for i in self.regexes), self._flags) \
+            if self.regexes else None
+        self._compile_trie(self._trie)
+
+    def _case(self, text):
+        """Convert text to lower case if case is ignored"""
+        return text.lower() if self.ignore_case else text
+
+    def _compile(self, regexes, suffix):
+        """Compile regular expressions into one, None if the list is empty"""
+        if not regexes:
+            return None
+        return re.compile('(?:%s)%s' % ('|'.join(regexes), suffix), self._flags)
+
+    def _node(self, parts):
+        """Get trie node of literal path components, create it if not exist"""
+        node = self._trie
+        for part in parts:
+            node = node.setdefault(self._case(part), {})
+        return node
+
+    def _add_path_glob(self, parts):
+        """Attach glob to trie node of its literal prefix"""
+        index = 0
+        while index < len(parts) and not _GLOB_CHARS.search(parts[index]):
+            index += 1
+        node = self._node(parts[:index])
+        node.setdefault(_GLOBS, []).append(glob_to_regex('/'.join(parts[index:])))
+
+    def _compile_trie(self, node):
+        """Compile globs attached to trie nodes"""
+        for key, value in node.items():
+            if key == _GLOBS:
+                node[key] = self._compile(value, '(?:/|$)')
+            elif key != _END:
+                self._compile_trie(value)
+
+    def __bool__(self):
+        return bool(self._trie or self._suffixes or self._name_regex or self._regex)
+
+    __nonzero__ = __bool__ # Python 2
+
+    def __call__(self, rel_path):
+        return self.match(rel_path)
+
+    def match(self, rel_path):
+        """Check whether relative path or one of its parents is excluded"""
+        parts = _split(rel_path)
+
+        # Literal paths and path globs
+        node = self._trie
+        for index, part in enumerate(parts):
+            if _GLOBS in node and node[_GLOBS].match('/'.join(parts[index:])):
+                return True
+            node = node.get(self._case(part))
+            if node is None:
+                break
+            if _END in node:
+                return True
+
+        # Name globs
+        if self._suffixes or self._name_regex is not None:
+            for part in parts:
+                name = self._case(part)
+                for length in self._suffix_lengths:
+                    if name[-length:] in self._suffixes:
+                        return True
+                if self._name_regex is not None and self._name_regex.match(part):
+                    return True
+
+        if self._regex is not None:
+            return self._regex.search('/'.join(parts)) is not None
+        return False
+
+
+def get_matcher(excluded):
+    """Get ExcludeMatcher from list of patterns, a matcher is returned as it is"""
+    if isinstance(excluded, ExcludeMatcher):
+        return excluded
+    return ExcludeMatcher(excluded)
@@ -0,0 +1,225 @@
+# encoding=utf-8
+"""
+Local cache of files downloaded from share drives.
+
+Entries are keyed by remote path, size and mtime, so a changed remote file
+is a miss. An entry is written to a temporary file and renamed into place,
+concurrent jobs never see partial entries. Access time of an entry is set on
+each hit and the least recently used entries are evicted when the cache
+grows over its size limit.
+"""
+from __future__ import absolute_import, division
+
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir # Python 2
+
+from .archive import makedirs
+from .copier import copy_file
+from .sync import replace
+
+# Default max bytes of cache
+MAX_SIZE = 10 * 1024 ** 3
+
+_TMP_PREFIX = 'tmp-'
+
+
+class CacheStats(object):
+    """Hits and misses of FileCache"""
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        # Bytes served from cache instead of network
+        self.hit_bytes = 0
+        self.miss_bytes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def add(self, hit, size):
+        """Record one lookup"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_bytes += size
+            else:
+                self.misses += 1
+                self.miss_bytes += size
+
+    @property
+    def hit_ratio(self):
+        """Ratio of lookups served from cache"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self):
+        """Get statistics as dict"""
+        return {'hits': self.hits, 'misses': self.misses, 'hit_bytes': self.hit_bytes,
+                'miss_bytes': self.miss_bytes, 'evictions': self.evictions,
+                'hit_ratio': self.hit_ratio}
+
+    def __repr__(self):
+        return '<CacheStats hits=%d misses=%d hit_bytes=%d evictions=%d>' % (
+            self.hits, self.misses, self.hit_bytes, self.evictions)
+
+
+def _link_or_copy(src, dest, link):
+    """Hard link src to dest if link is set and possible, else copy it"""
+    if os.path.lexists(dest):
+        os.remove(dest)
+    if link and hasattr(os, 'link'):
+        try:
+            os.link(src, dest)
+            return
+        except OSError as err:
+            logging.debug('Cannot link %s to %s, copy it: %s', src, dest, err)
+    copy_file(src, dest)
+
+
+class FileCache(object):
+    """Size bounded file cache with LRU eviction, shared by processes using the same root"""
+    def __init__(self, root, max_size=MAX_SIZE, link=False):
+        """
+        @param root: Local cache directory
+        @param max_size: Max total bytes of entries
+        @param link: Serve hits by hard link instead of copy. Linked files must not be
+            modified, as they share content with the cache entry
+        """
+        self.root = root
+        self.max_size = max_size
+        self.link = link
+        self.stats = CacheStats()
+
+    @staticmethod
+    def key(path, size, mtime):
+        """Get cache key of remote file"""
+        path = os.path.normpath(os.path.abspath(path))
+        if os.name == 'nt':
+            path = path.lower()
+        text = '%s|%d|%.6f' % (path, size, mtime)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def entry_path(self, key):
+        """Get path of cache entry"""
+        return os.path.join(self.root, key[:2], key)
+
+    def fetch(self, src, dest):
+        """
+        Copy src to dest through cache.
+        @return: True if it is served from cache, False if src is copied and cached
+        """
+        stat = os.stat(src)
+        entry = self.entry_path(self.key(src, stat.st_size, stat.st_mtime))
+        makedirs(os.path.dirname(os.path.abspath(dest)))
+
+        if os.path.isfile(entry) and os.path.getsize(entry) == stat.st_size:
+            try:
+                # Access time records last use, mtime stays mtime of remote file
+                os.utime(entry, (time.time(), stat.st_mtime))
+                _link_or_copy(entry, dest, self.link)
+                self.stats.add(True, stat.st_size)
+                logging.debug('Cache hit %s: %s', src, entry)
+                return True
+            except (IOError, OSError) as err:
+                # Entry is evicted by another process
+                logging.debug('Cannot use cache entry %s: %s', entry, err)
+
+        self.stats.add(False, stat.st_size)
+        logging.debug('Cache miss %s', src)
+        self._publish(src, entry, stat)
+        try:
+            _link_or_copy(entry, dest, self.link)
+        except (IOError, OSError) as err:
+            # Entry is evicted or replaced between publish and copy
+            logging.debug('Cannot use cache entry %s: %s', entry, err)
+            copy_file(src, dest)
+        self.evict()
+        return False
+
+    def _publish(self, src, entry, stat):
+        """Copy src to a temporary file, then rename it to entry"""
+        makedirs(os.path.dirname(entry))
+        tmp_path = os.path.join(os.path.dirname(entry), _TMP_PREFIX + uuid.uuid4().hex)
+        try:
+            copy_file(src, tmp_path)
+            os.utime(tmp_path, (time.time(), stat.st_mtime))
+            try:
+                replace(tmp_path, entry)
+            except OSError:
+                # Windows cannot replace an entry which is in use, it is published already
+                if not os.path.isfile(entry):
+                    raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def entries(self):
+        """Get list of (path, size, last access time) of cache entries"""
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for group in scandir(self.root):
+            if not group.is_dir():
+                continue
+            for entry in scandir(group.path):
+                if entry.name.startswith(_TMP_PREFIX) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                result.append((entry.path, stat.st_size, stat.st_atime))
+        return result
+
+    def size(self):
+        """Get total bytes of cache entries"""
+        return sum(i[1] for i in self.entries())
+
+    def evict(self, max_size=None):
+        """Remove least recently used entries until cache is not larger than max_size"""
+        max_size = self.max_size if max_size is None else max_size
+        entries = self.entries()
+        total = sum(i[1] for i in entries)
+        if total <= max_size:
+            return 0
+        count = 0
+        for path, size, _ in sorted(entries, key=lambda i: i[2]):
+            if total <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError as err:
+                # Entry is being served on Windows
+                logging.debug('Cannot evict %s: %s', path, err)
+                continue
+            total -= size
+            count += 1
+        self.stats.evictions += count
+        logging.info('Evicted %d entries from cache %s', count, self.root)
+        return count
+
+    def clear(self):
+        """Remove all cache entries"""
+        if os.path.isdir(self.root):
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+# Cache used by ShareDrive.download, it is disabled if WINUTILS_DOWNLOAD_CACHE is not set
+_CACHE = FileCache(os.environ['WINUTILS_DOWNLOAD_CACHE'],
+                   int(os.environ.get('WINUTILS_DOWNLOAD_CACHE_SIZE', MAX_SIZE))) \
+    if os.environ.get('WINUTILS_DOWNLOAD_CACHE') else None
+
+
+def get_cache():
+    """Get download cache, None if it is disabled"""
+    return _CACHE
+
+
+def set_cache(cache):
+    """Set download cache, None to disable it"""
+    global _CACHE
+    _CACHE = cache
@@ -2,100 +2,176 @@
 """
 Provide functions to operate file/directory easily.
 """
+from __future__ import absolute_import
+
 import os
-import time
 import re
-import subprocess
+import time
+import errno
 import logging
-import shlex
-from shutil import copyfile
+import tempfile
+from collections import namedtuple
+
+from .launcher import get_launcher
+from .shellhost import get_host
+from .retry import RetryPolicy
+from .archive import extract_zip
+from .copier import copy_file, copy_file_digest, copytree
+from .sync import sync_tree, replace
+from .deleter import delete_tree
+from .textfile import open_text
+from .verify import verify_file
+from .volumes import get_inventory
+from .exclude import get_matcher
 
-from .shell import Shell
+# Result of move(), strategy is 'rename' or 'copy', stats is CopyStats of directory copy
+MoveResult = namedtuple('MoveResult', ['strategy', 'elapsed', 'stats'])
+
+# Max length of robocopy exclusion arguments, a job file is used for longer arguments
+ROBOCOPY_ARGS_LIMIT = 4096
+
+
+# There is a bug on Win10 ver. 10041 duing unzip progress
+# Exception calling "ExtractToDirectory" with "2" argument(s): "There are no more files."
+# It is a workground to try some times to unzip the file, other errors are not retried.
+# There is no deadline, a large file takes minutes to unzip before the error is raised
+UNZIP_RETRY = RetryPolicy(max_attempts=6, initial_delay=1.0, max_delay=10.0,
+                          retry_if=lambda err: 'There are no more files' in str(err))
 
 
 def unzip_ps(zip_file, dest_dir):
-    """Unzip file to specified directory using PowerShell Command"""
+    """Unzip file to specified directory using PowerShell Command.
+    Command is executed in the PowerShell process shared by current process"""
     logging.info('Unzip %s ...', zip_file)
 
     # Powershell command to unzip file
-    cmd = 'powershell.exe -nologo -noprofile -command' + \
-          '''"& { Add-Type -A 'System.IO.Compression.FileSystem'; ''' + \
-          '''[IO.Compression.ZipFile]::ExtractToDirectory('%s', '%s');}"''' % (zip_file, dest_dir)
-
-    # There is a bug on Win10 ver. 10041 duing unzip progress
-    # Exception calling "ExtractToDirectory" with "2" argument(s): "There are no more files."
-    # It is a workground to try some times to unzip the file
-    i = 0
-    desc = ''
-    while i < 6:
-        logging.info('[%d] : %s', i, cmd)
-        prs = subprocess.Popen(cmd, stderr=subprocess.PIPE)
-        prs.wait()
-
-        err_msg = prs.stderr.read()
-        if len(err_msg) == 0:
-            logging.info('unzip completed')
-            return True
-        else:
+    cmd = "Add-Type -A 'System.IO.Compression.FileSystem'; " + \
+          "[IO.Compression.ZipFile]::ExtractToDirectory('%s', '%s')" % (zip_file, dest_dir)
+
+    def _unzip():
+        """Execute unzip command once"""
+        logging.info(cmd)
+        ret, err_msg = get_host('powershell').run(cmd)
+        if ret != 0:
             desc = 'Fail to extract file. Error msg: %s' % err_msg
             logging.error(desc)
-            i += 1
-            time.sleep(10)
+            raise Exception('%s : %s' % (cmd, desc))
 
-    msg = '%s : %s' %(cmd, desc)
-    raise Exception(msg)
+    UNZIP_RETRY.call(_unzip)
+    logging.info('unzip completed')
+    return True
 
 
-def _del(file_path):
-    '''Delete file using del command'''
-    cmd = 'del /f /q "%s"' % file_path
+def unzip(zip_file, dest_dir, patterns=None, workers=4, excluded=None):
+    """Unzip file to specified directory in process, members are extracted in parallel.
+    @param patterns: Only extract members matching one of the glob patterns
+    @param excluded: Exclusion patterns of members not to extract, see winutils.exclude
+    @return: ExtractStats with number of files/bytes and throughput
+    """
+    return extract_zip(zip_file, dest_dir, patterns, workers, excluded=excluded)
 
-    logging.info('Delete file %s: %s', file_path, cmd)
-    ret = os.system(cmd)
-    if ret == 0:
-        logging.info('File Deleted')
-    else:
-        msg = 'Cannot delete file. Error code %d' % ret
-        logging.error(msg)
-        raise Exception(cmd + ',' + msg)
 
+def _is_real_dir(path):
+    """Check whether path is a directory and not a link to one"""
+    return os.path.isdir(path) and not os.path.islink(path)
 
-def _rmdir(file_path):
-    '''Remove directory using rmdir command'''
-    cmd = 'rmdir /s /q "%s"' % file_path
 
-    logging.info('Delete %s: %s', file_path, cmd)
-    ret = os.system(cmd)
-    if ret == 0:
-        logging.info('Directory removed')
-    else:
-        msg = 'Cannot remove directory. Error code %d' % ret
-        logging.error(msg)
-        raise Exception(cmd + ',' + msg)
+def _rename_missing(src, dest):
+    """Rename entries of src which do not exist in dest, directories existing in both
+    are merged the same way. Return number of conflicting entries left in src"""
+    conflicts = 0
+    for name in os.listdir(src):
+        src_path = os.path.join(src, name)
+        dest_path = os.path.join(dest, name)
+        if not os.path.lexists(dest_path):
+            os.rename(src_path, dest_path)
+        elif _is_real_dir(src_path) and _is_real_dir(dest_path):
+            conflicts += _rename_missing(src_path, dest_path)
+        else:
+            conflicts += 1
+    return conflicts
 
 
-def move(src, dest):
+def move(src, dest, workers=None):
     """Move one file or folder to another direcotry.
-    This command can be more effective when move files between the same disk
+    It is renamed if src and dest are on the same disk, else it is copied
+    with a thread pool and then deleted. If dest folder exists on the same disk,
+    entries missing in it are renamed into it and only conflicting files are copied.
+    @param dest: Destination path, src is moved into it if it is an existing directory
+    @param workers: Number of threads to copy and delete files across disks
+    @return: MoveResult of strategy 'rename' or 'copy', elapsed seconds and
+        CopyStats of a directory copied across disks
     """
-    cmd = 'move /Y "%s" "%s"' % (src, dest)
-    logging.debug('Move %s to %s: %s', src, dest, cmd)
-    Shell.system(cmd, shell=True)
+    start = time.time()
+    if os.path.isdir(dest):
+        dest = os.path.join(dest, os.path.basename(os.path.normpath(src)))
+    logging.debug('Move %s to %s', src, dest)
+
+    try:
+        replace(src, dest)
+        result = MoveResult('rename', time.time() - start, None)
+        logging.info('Moved %s to %s: %s', src, dest, result)
+        return result
+    except OSError as err:
+        # Directories are merged as move /Y does if destination exists
+        if err.errno != errno.EXDEV and not (os.path.isdir(src) and os.path.isdir(dest)):
+            msg = 'Cannot move %s to %s: %s' % (src, dest, err)
+            logging.error(msg)
+            raise Exception(msg)
+        logging.debug('Cannot rename %s, merge it: %s', src, err)
+        if err.errno != errno.EXDEV:
+            try:
+                conflicts = _rename_missing(src, dest)
+            except OSError as rename_err:
+                logging.debug('Cannot rename entries of %s, copy them: %s', src, rename_err)
+                conflicts = None
+            if conflicts == 0:
+                # Only empty directories are left
+                delete(src, workers=workers)
+                result = MoveResult('rename', time.time() - start, None)
+                logging.info('Moved %s to %s: %s', src, dest, result)
+                return result
+
+    stats = None
+    if os.path.isdir(src):
+        stats = copytree(src, dest, workers=workers)
+        if stats.failures:
+            msg = 'Failed to move %s. %d files failed, first error: %s' % (
+                src, len(stats.failures), stats.failures[0][1])
+            logging.error(msg)
+            raise Exception(msg)
+    else:
+        copy_file(src, dest)
+    delete(src, workers=workers)
+
+    result = MoveResult('copy', time.time() - start, stats)
+    logging.info('Moved %s to %s: %s', src, dest, result)
+    return result
 
 
-def delete(file_path):
+def delete(file_path, dry_run=False, workers=None):
     """Delete file/directory even if it is readonly.
+    Files are deleted in process with a thread pool, see winutils.deleter.
     @param file_path: path of file to be deleted.
+    @param dry_run: Only count files and directories to delete
+    @param workers: Number of threads to delete files
+    @return: DeleteStats
     """
-    if os.path.exists(file_path):
-        if os.path.isfile(file_path):
-            _del(file_path)
-        else:
-            _rmdir(file_path)
+    stats = delete_tree(file_path, workers=workers, dry_run=dry_run)
+    if stats.failures:
+        path, err = stats.failures[0]
+        msg = 'Cannot delete %s, %d failures. %s: %s' % (file_path, len(stats.failures), path, err)
+        logging.error(msg)
+        raise Exception(msg)
+    return stats
 
 
-def copy(src_path, dest_path, **args):
-    """copy file or folder to a new path"""
+def copy(src_path, dest_path, incremental=False, verify=None, **args):
+    """copy file or folder to a new path
+    @param incremental: Only copy files changed since last copy, see copydir()
+    @param verify: Hash algorithm like 'sha1' to verify copied files, see copydir()
+    @return: Stats returned by copydir() if src_path is a folder, else None
+    """
     dir_path = os.path.dirname(dest_path)
     logging.debug('Copy file from %s to %s', src_path, dest_path)
 
@@ -104,22 +180,61 @@ def copy(src_path, dest_path, **args):
         if not os.path.exists(dir_path):
             os.makedirs(dir_path)
     if os.path.isfile(src_path):
-        copyfile(src_path, dest_path)
+        if incremental and _same_file_stat(src_path, dest_path):
+            logging.debug('%s is not changed', src_path)
+            return
+        if verify:
+            digest = copy_file_digest(src_path, dest_path, verify)[1]
+            verify_file(dest_path, digest, verify)
+        else:
+            copy_file(src_path, dest_path)
     elif os.path.isdir(src_path):
-        copydir(src_path, dest_path, **args)
+        return copydir(src_path, dest_path, incremental=incremental, verify=verify, **args)
     else:
         msg = 'Cannot find file: %s' % src_path
         logging.error(msg)
         raise Exception(msg)
 
 
-def copydir(path, dest, excluded_files=None, log_file=None):
-    """Copy directory using robocopy command.
+def copydir(path, dest, excluded_files=None, log_file=None, engine=None, workers=None,
+            incremental=False, mirror=False, algorithm=None, verify=None):
+    """Copy directory using robocopy command or in process copy engine.
+    @param engine: 'robocopy' or 'native', default is robocopy on Windows
+    @param workers: Number of threads used by native engine
+    @param incremental: Only copy files added/changed since last copy.
+        Metadata of copied files is saved in dest + '.manifest'
+    @param mirror: Delete files removed from source since last copy, used with incremental
+    @param algorithm: Hash algorithm to detect changed files whose mtime changed, used with incremental
+    @param verify: Hash algorithm like 'sha1' to verify copied files. Files are hashed while
+        they are copied and digests are saved in dest + '.manifest'. Native engine is used
+    @return: CopyStats if native engine is used, SyncStats if incremental is True
     """
+    if incremental:
+        stats = sync_tree(path, dest, excluded_files, mirror, algorithm, workers=workers,
+                          verify=verify)
+        if stats.failures:
+            msg = 'Failed to sync %s. %d files failed, first error: %s' % (
+                path, len(stats.failures), stats.failures[0][1])
+            logging.error(msg)
+            raise Exception(msg)
+        return stats
+
+    if engine is None:
+        engine = 'robocopy' if os.name == 'nt' and not verify else 'native'
+    if engine == 'native' or verify:
+        stats = copytree(path, dest, excluded_files, workers, verify=verify)
+        if stats.failures:
+            msg = 'Failed to copy %s. %d files failed, first error: %s' % (
+                path, len(stats.failures), stats.failures[0][1])
+            logging.error(msg)
+            raise Exception(msg)
+        return stats
+
     dest = re.sub(r'([^\\])(\\+)$', r'\1', dest)  # robocopy did not accept directory end with '\'
 
     logging.info('Copy %s to %s', path, dest)
     command = None
+    ex_args = None
 
     if log_file is not None:
         log_str = ' >> "%s"' % log_file
@@ -137,7 +252,11 @@ def copydir(path, dest, excluded_files=None, log_file=None):
     command += log_str
     logging.debug('Command %s', command)
 
-    ret = os.system(command)
+    try:
+        ret = get_launcher().system(command)
+    finally:
+        if ex_args is not None and ex_args.startswith('/JOB:'):
+            os.remove(ex_args[len('/JOB:'):].strip('"'))
     if ret <= 3:
         logging.info('Direcotry copied successfully')
     else:
@@ -146,66 +265,72 @@ def copydir(path, dest, excluded_files=None, log_file=None):
         raise Exception(msg)
 
 
+def _same_file_stat(src_path, dest_path):
+    """Check whether destination file has the same size and mtime as source file"""
+    try:
+        src_stat = os.stat(src_path)
+        dest_stat = os.stat(dest_path)
+    except OSError:
+        return False
+    return src_stat.st_size == dest_stat.st_size and \
+        int(src_stat.st_mtime) == int(dest_stat.st_mtime)
+
+
 def _get_exclude_file_args(path, excluded_files):
     r"""
     Get arguments for robocopy to exclude some files and direcotrys
-    Format: /XF "c:\file1" /XD "c:\folder1" /XD "c:\folder2\folder22" /xf "C:\folder3\file33" /elif
+    Format: /XF "c:\file1" /XD "c:\folder1" /XF *.tmp /XD *.tmp
+    Literal paths are passed to both /XF and /XD, so no path is checked on disk.
+    A robocopy job file is used when the arguments are too long for command line.
+    @param excluded_files: ExcludeMatcher or list of exclusion patterns
     """
-    ex_file = []
-    ex_dir = []
-    for ex_file in excluded_files:
-        rel_path = os.path.join(path, ex_file)
-
-        if not os.path.exists(rel_path):
-            logging.warn('Cannot found path: %s', rel_path)
-            continue
-
-        if os.path.isfile(rel_path):
-            ex_file.append(rel_path)
-            logging.debug('Exclude file: %s', rel_path)
-        elif os.path.isdir(rel_path):
-            ex_dir.append(rel_path)
-            logging.debug('Exclude dir: %s', rel_path)
-
-    ex_files = ['/XF "%s"'% i  for i in ex_file]
-    ex_dirs = ['/XD "%s"'% i  for i in ex_dir]
-    logging.debug('Excude files: %s', str(ex_files))
-    logging.debug('Excude dirs : %s', str(ex_dirs))
-    ex_file_args = ' '.join(ex_files)
-    ex_dir_args = ' '.join(ex_dirs)
-
-    ex_args = ex_file_args
-    ex_args = ex_dir_args if len(ex_file_args) == 0 else ex_file_args + ' ' + ex_dir_args
-
-    if len(ex_args) == 0:
+    matcher = get_matcher(excluded_files)
+    if matcher.regexes or matcher.path_globs:
+        logging.warning('robocopy ignores regular expressions and paths with wildcards: %s',
+                        matcher.regexes + matcher.path_globs)
+
+    names = [os.path.join(path, *i.split('/')) for i in matcher.literals] + matcher.name_globs
+    if len(names) == 0:
         logging.info('No excluded files')
         return None
-    else:
+
+    ex_args = ' '.join(['/XF %s' % ' '.join('"%s"' % i for i in names),
+                        '/XD %s' % ' '.join('"%s"' % i for i in names)])
+    if len(ex_args) <= ROBOCOPY_ARGS_LIMIT:
         logging.info('Exclued files: %s', ex_args)
         return ex_args
 
+    # Job file lists one excluded path per line after the switch
+    job_fd, job_file = tempfile.mkstemp(suffix='.rcj')
+    with os.fdopen(job_fd, 'w') as job:
+        for switch in ('/XF', '/XD'):
+            job.write(switch + '\n')
+            for name in names:
+                job.write('    %s\n' % name)
+    logging.info('%d excluded files are saved in job file %s', len(names), job_file)
+    return '/JOB:"%s"' % job_file
+
 
 def is_drive_letter(path):
     """Check wheter specified path is a drive letter"""
     return re.match('^[a-zA-Z]{1}:$', path)
 
 
-def enum_usb_disks():
+def enum_usb_disks(refresh=False):
     r"""
     Get USB Pen drive list
+    The list is cached until a drive letter changes or it expires, see winutils.volumes
+    :param refresh: Read the list again instead of using cache
     :return Dist name list like: ['D:', 'E:']
     """
-    wmic_cmd = 'wmic'
-    cmd = '"%s" logicaldisk where "DriveType=2 and Size<>null" get DeviceID' % wmic_cmd
-    cmd_list = shlex.split(cmd)
-    cmd_output = subprocess.check_output(cmd_list)
-    return re.findall(r'[A-Z]:', cmd_output)
+    return get_inventory().removable(refresh)
 
 
-def eject_usb_disk(disk_name):
+def eject_usb_disk(disk_name, timeout=10):
     """
     Eject USB pen drive
     :param disk_name: USB Drive Name, eg D:, E:
+    :param timeout: Max seconds to wait until the drive is removed
     :return: True, the pen drive has been ejected, else False
     """
     from win32com.client import Dispatch
@@ -216,10 +341,11 @@ def eject_usb_disk(disk_name):
     if not disk_mat:
         logging.error("USB Pen drive name is not valid: %s", disk_name)
         return False
-    disk_name = disk_mat.group(0)
+    disk_name = disk_mat.group(0).upper()
 
     # Check the specified USB pen drive can be found or not
-    if disk_name not in enum_usb_disks():
+    inventory = get_inventory()
+    if disk_name not in inventory.removable(refresh=True):
         logging.info("USB Pen drive not found: %s", disk_name)
         return True
 
@@ -230,8 +356,7 @@ def eject_usb_disk(disk_name):
     shell.SHChangeNotify(shellcon.SHCNE_DRIVEREMOVED, shellcon.SHCNF_PATH, disk_name)
 
     # Check the USB pen drive has been ejected or not
-    time.sleep(1)
-    if disk_name in enum_usb_disks():
+    if not inventory.wait_for_removal(disk_name, timeout):
         logging.error("%s has not been ejected", disk_name)
         return False
 
@@ -240,23 +365,9 @@ def eject_usb_disk(disk_name):
 
 def read_unicode_file(file_path):
     """
-    Read content from unicode file
-    :return: one file object
+    Read content from unicode file.
+    Encoding is detected from BOM or sampled content and cached, see winutils.textfile.
+    Invalid bytes are replaced instead of failing in the middle of a large log.
+    :return: one file object, None if encoding cannot be detected
     """
-    import chardet
-    import codecs
-    file_obj = open(file_path, 'r')
-    f_line = file_obj.readline()
-    f_enc = chardet.detect(f_line)['encoding']
-    logging.debug('encoding:' + f_enc)
-    if not f_enc or f_enc.lower() == 'ascii':
-        file_obj.seek(0)
-        return file_obj
-    elif f_enc.lower().startswith('utf-8'):
-        file_obj.close()
-        return codecs.open(file_path, 'r', f_enc)
-    elif f_enc.lower().startswith('utf-16'):
-        file_obj.close()
-        return codecs.open(file_path, 'r', 'utf_16')
-    logging.error('Cannot detect file type')
-    return None
+    return open_text(file_path, errors='replace')
@@ -0,0 +1,238 @@
+# encoding=utf-8
+"""
+Launch external commands and record how long they take.
+
+All commands executed by winutils go through the default launcher,
+so the slowest commands can be found with:
+
+>>> print(get_launcher().format_summary())  # doctest: +SKIP
+"""
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+import logging
+import threading
+import subprocess
+from collections import namedtuple
+
+
+# Upper bound (seconds) of latency histogram buckets
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+# Frames from these modules are skipped when caller of a command is detected
+INTERNAL_MODULES = set([__name__])
+
+CommandRecord = namedtuple('CommandRecord',
+                           ['cmd', 'exe', 'caller', 'elapsed', 'returncode', 'output_size'])
+
+
+def command_name(cmd):
+    r"""
+    Get executable name of a command line
+    >>> command_name(r'"C:\Windows\System32\reg.exe" add HKLM\Software')
+    'reg'
+    >>> command_name(['robocopy', 'a', 'b'])
+    'robocopy'
+    """
+    if isinstance(cmd, (list, tuple)):
+        exe = str(cmd[0]) if cmd else ''
+    else:
+        cmd = str(cmd).strip()
+        if cmd.startswith('"'):
+            exe = cmd[1:].split('"', 1)[0]
+        else:
+            exe = cmd.split(None, 1)[0] if cmd else ''
+    exe = os.path.basename(exe.replace('\\', '/')).lower()
+    if exe.endswith('.exe'):
+        exe = exe[:-4]
+    return exe
+
+
+def get_caller():
+    """Get module and function name which launches a command"""
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_globals.get('__name__') in INTERNAL_MODULES:
+        frame = frame.f_back
+    if frame is None:
+        return None
+    return '%s:%s' % (frame.f_globals.get('__name__'), frame.f_code.co_name)
+
+
+class CommandStats(object):
+    """Statistics of one executable"""
+    def __init__(self, exe):
+        self.exe = exe
+        self.count = 0
+        self.failures = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.output_size = 0
+        self.histogram = [0] * len(HISTOGRAM_BUCKETS)
+        self.callers = {}
+
+    def add(self, record):
+        """Add a command record"""
+        self.count += 1
+        if record.returncode != 0:
+            self.failures += 1
+        self.total_time += record.elapsed
+        self.max_time = max(self.max_time, record.elapsed)
+        self.output_size += record.output_size
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if record.elapsed <= bound:
+                self.histogram[i] += 1
+                break
+        self.callers[record.caller] = self.callers.get(record.caller, 0) + 1
+
+    @property
+    def avg_time(self):
+        """Average wall time in seconds"""
+        return self.total_time / self.count if self.count else 0.0
+
+    def as_dict(self):
+        """Get statistics as dict"""
+        return {
+            'exe': self.exe,
+            'count': self.count,
+            'failures': self.failures,
+            'total_time': self.total_time,
+            'avg_time': self.avg_time,
+            'max_time': self.max_time,
+            'output_size': self.output_size,
+            'histogram': list(zip(HISTOGRAM_BUCKETS, self.histogram)),
+            'callers': dict(self.callers),
+        }
+
+
+class Launcher(object):
+    """
+    Launch commands, record wall time, exit code, output size and caller
+    per executable, and call hooks before/after each command.
+    pre hook is called as hook(cmd, exe), post hook as hook(record).
+    """
+    def __init__(self):
+        self.stats = {}
+        self.pre_hooks = []
+        self.post_hooks = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, pre=None, post=None):
+        """Add pre and/or post hook"""
+        if pre is not None:
+            self.pre_hooks.append(pre)
+        if post is not None:
+            self.post_hooks.append(post)
+
+    def remove_hook(self, hook):
+        """Remove a pre or post hook"""
+        for hooks in (self.pre_hooks, self.post_hooks):
+            if hook in hooks:
+                hooks.remove(hook)
+
+    def begin(self, cmd, caller=None):
+        """Call pre hooks before a command is launched, return a token for end()"""
+        exe = command_name(cmd)
+        for hook in self.pre_hooks:
+            hook(cmd, exe)
+        return cmd, exe, caller or get_caller(), time.time()
+
+    def end(self, token, returncode, output_size=0):
+        """Record a finished command and call post hooks"""
+        cmd, exe, caller, start = token
+        record = CommandRecord(cmd, exe, caller, time.time() - start, returncode, output_size)
+        logging.debug('%s exited with %s in %.3f seconds', exe, returncode, record.elapsed)
+
+        with self._lock:
+            if exe not in self.stats:
+                self.stats[exe] = CommandStats(exe)
+            self.stats[exe].add(record)
+        for hook in self.post_hooks:
+            hook(record)
+        return record
+
+    def run(self, cmd, shell=False, stdout=None, stderr=None, **popen_args):
+        """Execute a command and wait for it.
+        @return: exit code, stdout and stderr. Output is None if it is not piped
+        """
+        token = self.begin(cmd)
+        try:
+            process = subprocess.Popen(cmd, stdout=stdout, stderr=stderr, shell=shell, **popen_args)
+        except OSError:
+            self.end(token, None)
+            raise
+        out, err = process.communicate()
+        self.end(token, process.returncode, len(out or '') + len(err or ''))
+        return process.returncode, out, err
+
+    def system(self, cmd):
+        """Execute command in shell as os.system(), return exit code"""
+        return self.run(cmd, shell=True)[0]
+
+    def check_call(self, cmd, shell=False):
+        """Same as subprocess.check_call()"""
+        ret = self.run(cmd, shell=shell)[0]
+        if ret != 0:
+            raise subprocess.CalledProcessError(ret, cmd)
+        return ret
+
+    def check_output(self, cmd, shell=False):
+        """Same as subprocess.check_output()"""
+        ret, out = self.run(cmd, shell=shell, stdout=subprocess.PIPE)[:2]
+        if ret != 0:
+            raise subprocess.CalledProcessError(ret, cmd, output=out)
+        return out
+
+    def popen_read(self, cmd):
+        """Execute command in shell and read its output as os.popen().read()"""
+        return self.run(cmd, shell=True, stdout=subprocess.PIPE, universal_newlines=True)[1]
+
+    def summary(self):
+        """Get statistics of each executable, the slowest comes first"""
+        with self._lock:
+            stats = [i.as_dict() for i in self.stats.values()]
+        return sorted(stats, key=lambda i: i['total_time'], reverse=True)
+
+    def histogram(self, exe=None):
+        """Get latency histogram as list of (upper bound seconds, count)
+        @param exe: executable name, all commands are counted if it is None
+        """
+        counts = [0] * len(HISTOGRAM_BUCKETS)
+        with self._lock:
+            for stats in self.stats.values():
+                if exe is None or stats.exe == exe:
+                    counts = [i + j for i, j in zip(counts, stats.histogram)]
+        return list(zip(HISTOGRAM_BUCKETS, counts))
+
+    def format_summary(self):
+        """Get statistics as a text table"""
+        lines = ['%-16s %6s %6s %10s %10s %10s %12s' % (
+            'Command', 'Count', 'Fail', 'Total(s)', 'Avg(s)', 'Max(s)', 'Output(B)')]
+        for i in self.summary():
+            lines.append('%-16s %6d %6d %10.3f %10.3f %10.3f %12d' % (
+                i['exe'], i['count'], i['failures'], i['total_time'],
+                i['avg_time'], i['max_time'], i['output_size']))
+        return '\n'.join(lines)
+
+    def reset(self):
+        """Clear recorded statistics"""
+        with self._lock:
+            self.stats = {}
+
+
+_LAUNCHER = Launcher()
+
+
+def get_launcher():
+    """Get default launcher"""
+    return _LAUNCHER
+
+
+def set_launcher(launcher):
+    """Replace default launcher, e.g. use a stub in test.
+    Return previous launcher"""
+    global _LAUNCHER
+    old_launcher = _LAUNCHER
+    _LAUNCHER = launcher
+    return old_launcher
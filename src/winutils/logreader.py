@@ -0,0 +1,274 @@
+# encoding=utf-8
+"""
+Search, tail and follow large log files.
+
+Files are memory mapped. Logs in ASCII compatible encodings like UTF-8 are
+searched with a bytes regular expression over the mapped buffer directly.
+UTF-16/32 logs are decoded in large chunks cut at line ends, and matched
+with a text regular expression.
+"""
+from __future__ import absolute_import
+
+import os
+import re
+import sys
+import time
+import mmap
+import codecs
+from collections import namedtuple
+
+from .textfile import detect_encoding
+
+# Bytes decoded at a time when searching UTF-16/32 logs
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Bytes read at a time when scanning backwards for tail
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# offset: byte offset of match in file, line: decoded line containing match,
+# groups: decoded groups of match
+LogMatch = namedtuple('LogMatch', ['offset', 'line', 'groups'])
+
+_WIDE_BOMS = {
+    'utf-16': [(codecs.BOM_UTF16_LE, 'utf-16-le'), (codecs.BOM_UTF16_BE, 'utf-16-be')],
+    'utf-32': [(codecs.BOM_UTF32_LE, 'utf-32-le'), (codecs.BOM_UTF32_BE, 'utf-32-be')],
+}
+
+
+class _Mapping(object):
+    """Read only memory map of a file, an empty file is mapped to empty bytes"""
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.data = b''
+
+    def __enter__(self):
+        return self.data
+
+    def __exit__(self, *args):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+
+def _view(data, start):
+    """Get buffer of data from start without copying it"""
+    if sys.version_info[0] < 3:
+        return buffer(data, start) # Python 2 mmap has no memoryview
+    return memoryview(data)[start:]
+
+
+class LogReader(object):
+    """
+    Read a log file without decoding all of it.
+    The file is mapped again by each call, so content appended by other
+    processes is seen and the file is not kept open.
+    """
+    def __init__(self, path, encoding=None):
+        """
+        @param encoding: Encoding of file, it is detected if not set, see winutils.textfile
+        """
+        self.path = path
+        encoding = encoding or detect_encoding(path)
+        if encoding is None:
+            raise Exception('Cannot detect encoding of %s' % path)
+        self.encoding, self._start = self._codec(encoding)
+        self._newline = u'\n'.encode(self.encoding)
+        self._unit = len(self._newline)
+        # Offset of the next byte to read in follow mode
+        self.offset = self._start
+
+    def _codec(self, encoding):
+        """Get codec without BOM and size of BOM"""
+        name = codecs.lookup(encoding).name
+        if name == 'utf-8-sig':
+            return 'utf-8', len(codecs.BOM_UTF8)
+        if name in _WIDE_BOMS:
+            with open(self.path, 'rb') as file_obj:
+                head = file_obj.read(4)
+            for bom, codec in _WIDE_BOMS[name]:
+                if head.startswith(bom):
+                    return codec, len(bom)
+            return _WIDE_BOMS[name][0][1], 0
+        return name, 0
+
+    @property
+    def is_wide(self):
+        """Whether encoding uses 2 or 4 bytes per code unit, so bytes regex cannot be used"""
+        return self._unit > 1
+
+    def _decode(self, data):
+        """Decode bytes to text, invalid bytes are replaced"""
+        return codecs.decode(data, self.encoding, 'replace')
+
+    def _rfind_newline(self, data, start, end):
+        """Find last newline aligned to code unit in data[start:end], -1 if not found"""
+        while True:
+            pos = data.rfind(self._newline, start, end)
+            if pos < 0 or (pos - self._start) % self._unit == 0:
+                return pos
+            end = pos + self._unit - 1
+
+    def _find_newline(self, data, start):
+        """Get end of first newline aligned to code unit from start, size of data if not found"""
+        while True:
+            pos = data.find(self._newline, start)
+            if pos < 0:
+                return len(data)
+            if (pos - self._start) % self._unit == 0:
+                return pos + self._unit
+            start = pos + 1
+
+    def _lines(self, data):
+        """Split decoded data to lines without line endings"""
+        lines = self._decode(data).split(u'\n')
+        if lines and not lines[-1]:
+            lines.pop()
+        return [i[:-1] if i.endswith(u'\r') else i for i in lines]
+
+    def search(self, pattern, flags=0):
+        """
+        Yield LogMatch of every match of regular expression.
+        ^ and $ match at the beginning and end of lines, use '\r?$' for CRLF line ends.
+        @param pattern: Regular expression text. For ASCII compatible encodings it is
+            encoded and matched as bytes, so non ASCII characters are only matched literally
+        """
+        flags |= re.MULTILINE
+        with _Mapping(self.path) as data:
+            if self.is_wide:
+                for item in self._search_wide(data, pattern, flags):
+                    yield item
+                return
+            if not isinstance(pattern, bytes):
+                pattern = pattern.encode(self.encoding)
+            regex = re.compile(pattern, flags)
+            # Search after BOM, so ^ matches at the beginning of the first line
+            view = _view(data, self._start)
+            try:
+                for match in regex.finditer(view):
+                    start = self._start + match.start()
+                    begin = max(self._start, data.rfind(b'\n', 0, start) + 1)
+                    end = data.find(b'\n', self._start + match.end())
+                    line = self._lines(data[begin:len(data) if end < 0 else end])
+                    groups = tuple(None if i is None else self._decode(i)
+                                   for i in match.groups())
+                    # Match refers to mapped buffer, which cannot be closed while it exists
+                    del match
+                    yield LogMatch(start, line[0] if line else u'', groups)
+            finally:
+                if isinstance(view, memoryview):
+                    view.release()
+
+    def _search_wide(self, data, pattern, flags):
+        """Search UTF-16/32 data in decoded chunks which end at line ends"""
+        if isinstance(pattern, bytes):
+            pattern = pattern.decode('ascii')
+        regex = re.compile(pattern, flags)
+        start = self._start
+        size = len(data)
+        while start < size:
+            cut = min(size, start + CHUNK_SIZE)
+            if cut < size:
+                pos = self._rfind_newline(data, start, cut)
+                if pos >= 0:
+                    cut = pos + self._unit
+                else:
+                    # A line longer than chunk, extend chunk to the end of line
+                    cut = self._find_newline(data, cut)
+            text = self._decode(data[start:cut])
+            # Byte offset of text position, advanced from match to match
+            char_pos, byte_pos = 0, start
+            for match in regex.finditer(text):
+                byte_pos += len(text[char_pos:match.start()].encode(self.encoding))
+                char_pos = match.start()
+                begin = text.rfind(u'\n', 0, match.start()) + 1
+                end = text.find(u'\n', match.end())
+                line = text[begin:len(text) if end < 0 else end]
+                yield LogMatch(byte_pos, line.rstrip(u'\r'), match.groups())
+            start = cut
+
+    def tail(self, count=10):
+        """Get last lines of file, the file is scanned backwards from its end"""
+        with _Mapping(self.path) as data:
+            end = len(data)
+            # Trailing newline does not start another line
+            if end - self._unit >= self._start and \
+                    data[end - self._unit:end] == self._newline:
+                end -= self._unit
+            found = 0
+            pos = end
+            while found < count and pos > self._start:
+                block_start = max(self._start, pos - TAIL_BLOCK_SIZE)
+                while found < count:
+                    newline = self._rfind_newline(data, block_start, pos)
+                    if newline < 0:
+                        break
+                    found += 1
+                    pos = newline
+                if block_start == self._start:
+                    break
+                if found < count:
+                    # Also find a newline which crosses block boundary
+                    pos = block_start + self._unit - 1
+            begin = pos + self._unit if found == count else self._start
+            return self._lines(data[begin:end] + self._newline) if begin < end else []
+
+    def seek_end(self):
+        """Start follow mode from current end of file.
+        An incomplete last line is read by the next call when it is complete"""
+        with _Mapping(self.path) as data:
+            end = len(data)
+            if end - self._unit >= self._start and \
+                    data[end - self._unit:end] == self._newline:
+                self.offset = end
+                return
+            pos = self._rfind_newline(data, self._start, end)
+            self.offset = pos + self._unit if pos >= 0 else self._start
+
+    def read_new(self):
+        """
+        Read complete lines appended since last call.
+        An incomplete last line is left to the next call. If the file is truncated,
+        it is read from the beginning again.
+        @return: List of lines without line endings
+        """
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            self.offset = self._start
+        if size == self.offset:
+            return []
+        with open(self.path, 'rb') as file_obj:
+            file_obj.seek(self.offset)
+            data = file_obj.read(size - self.offset)
+        # Offsets of data are relative to self.offset which is aligned
+        pos = data.rfind(self._newline)
+        while pos >= 0 and (pos + self.offset - self._start) % self._unit:
+            pos = data.rfind(self._newline, 0, pos + self._unit - 1)
+        if pos < 0:
+            return []
+        data = data[:pos + self._unit]
+        self.offset += len(data)
+        return self._lines(data)
+
+    def follow(self, interval=1.0, timeout=None, from_end=True):
+        """
+        Yield lines appended to file like 'tail -f'.
+        @param interval: Seconds to wait when there is no new line
+        @param timeout: Stop after seconds without new lines, None to follow forever
+        @param from_end: Only yield lines appended after this call
+        """
+        if from_end:
+            self.seek_end()
+        idle_since = time.time()
+        while True:
+            lines = self.read_new()
+            if lines:
+                idle_since = time.time()
+                for line in lines:
+                    yield line
+                continue
+            if timeout is not None and time.time() - idle_since >= timeout:
+                return
+            time.sleep(interval)
@@ -0,0 +1,122 @@
+# encoding=utf-8
+"""
+Cache of file metadata on share drives.
+
+Querying one path lists its parent directory with one scandir call, and
+caches the type of every entry in it. Siblings are then answered without
+another request to the server. A name missing from a listing is cached as
+missing for a shorter time.
+"""
+from __future__ import absolute_import
+
+import os
+import time
+import logging
+import threading
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir # Python 2
+
+# Seconds to trust a directory listing for existing entries
+METADATA_TTL = 5.0
+
+# Seconds to trust a directory listing for missing entries
+NEGATIVE_TTL = 1.0
+
+# Results of MetadataCache.lookup(), None means the path cannot be checked
+FILE = 'file'
+DIR = 'dir'
+MISSING = 'missing'
+
+
+class MetadataCache(object):
+    """Directory listings with TTL, keyed by normalized directory path"""
+    def __init__(self, ttl=METADATA_TTL, negative_ttl=NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.listings = 0
+        self.hits = 0
+        # {directory key: (list time, {entry name key: FILE or DIR} or None if not listed)}
+        self._dirs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.normpath(path))
+
+    def _list(self, dir_path):
+        """List directory, return {name key: FILE or DIR}, None if it cannot be listed"""
+        self.listings += 1
+        try:
+            entries = {}
+            for entry in scandir(dir_path):
+                entries[os.path.normcase(entry.name)] = DIR if entry.is_dir() else FILE
+            return entries
+        except OSError as err:
+            logging.debug('Cannot list %s: %s', dir_path, err)
+            return None
+
+    def _listing(self, dir_path, refresh):
+        """Get cached listing of directory and its age, list it if it is expired"""
+        key = self._key(dir_path)
+        now = time.time()
+        with self._lock:
+            cached = self._dirs.get(key)
+        if cached is not None and not refresh:
+            age = now - cached[0]
+            # Entries are valid for ttl, missing names and failed listings for negative_ttl
+            if age < self.negative_ttl or (cached[1] is not None and age < self.ttl):
+                self.hits += 1
+                return cached[1], age
+        entries = self._list(dir_path)
+        with self._lock:
+            self._dirs[key] = (time.time(), entries)
+        return entries, 0.0
+
+    def lookup(self, path, refresh=False):
+        """
+        Get type of path from listing of its parent directory.
+        @param refresh: List parent directory again even if it is cached
+        @return: FILE, DIR, MISSING, or None if parent directory cannot be listed
+        """
+        path = os.path.normpath(path)
+        parent, name = os.path.split(path)
+        if not name or parent == path:
+            # Root of share cannot be listed from its parent
+            return DIR if os.path.isdir(path) else None
+        entries, age = self._listing(parent, refresh)
+        if entries is None:
+            # Path is missing for sure if its parent is missing
+            return MISSING if self.lookup(parent, refresh) in (MISSING, FILE) else None
+        kind = entries.get(os.path.normcase(name))
+        if kind is None and age >= self.negative_ttl:
+            # Negative result expired, listing is still valid for other entries
+            entries, age = self._listing(parent, True)
+            if entries is None:
+                return None
+            kind = entries.get(os.path.normcase(name))
+        return kind or MISSING
+
+    def lookup_many(self, paths, refresh=False):
+        """Get types of paths, each parent directory is listed at most once"""
+        result = []
+        listed = set()
+        for path in paths:
+            parent = self._key(os.path.dirname(os.path.normpath(path)))
+            result.append(self.lookup(path, refresh and parent not in listed))
+            listed.add(parent)
+        return result
+
+    def invalidate(self, path=None):
+        """Forget listings affected by a change of path, its parents and children.
+        Forget all listings if path is None"""
+        with self._lock:
+            if path is None:
+                self._dirs.clear()
+                return
+            key = self._key(path)
+            for dir_key in list(self._dirs):
+                if key == dir_key or key.startswith(dir_key.rstrip(os.sep) + os.sep) or \
+                        dir_key.startswith(key.rstrip(os.sep) + os.sep):
+                    del self._dirs[dir_key]
@@ -0,0 +1,182 @@
+# encoding=utf-8
+"""
+Pack a directory tree into one zip file on a share drive.
+
+Creating many small files on a share drive costs round trips for every file.
+pack_tree() streams the tree into one archive while it walks, so the share
+only sees one file being written sequentially. The zip central directory is
+the index: a single member is read without unpacking the others, and
+unpack() extracts members in the order they are stored.
+"""
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+import shutil
+import fnmatch
+import logging
+import zipfile
+
+from .archive import makedirs, member_path
+from .copier import iter_tree
+from .sync import replace
+
+# Buffer size of archive file, writes and reads on share drive are batched by it
+BUFFER_SIZE = 1024 * 1024
+
+
+class PackStats(object):
+    """Result of pack_tree() and unpack()"""
+    def __init__(self):
+        self.files = 0
+        self.dirs = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+        # List of (path, error message)
+        self.failures = []
+
+    def __repr__(self):
+        return '<PackStats files=%d dirs=%d bytes=%d failures=%d elapsed=%.3fs>' % (
+            self.files, self.dirs, self.bytes, len(self.failures), self.elapsed)
+
+
+class _StreamWriter(object):
+    """Write only file wrapper without seek, so zipfile writes data descriptors
+    instead of seeking back to update headers of each member"""
+    def __init__(self, file_obj):
+        self._file = file_obj
+        self._pos = 0
+
+    def write(self, data):
+        self._file.write(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, *args):
+        raise OSError('Stream is not seekable')
+
+    def flush(self):
+        self._file.flush()
+
+
+def _open_zip(file_obj):
+    """Open zip file for writing. Python 2 zipfile requires a seekable file"""
+    if sys.version_info[0] >= 3:
+        file_obj = _StreamWriter(file_obj)
+    return zipfile.ZipFile(file_obj, 'w', zipfile.ZIP_STORED, allowZip64=True)
+
+
+def pack_tree(src, archive_path, excluded_files=None, compression=zipfile.ZIP_STORED):
+    """
+    Pack directory tree into zip file. The archive is written to a temporary file
+    and renamed, so readers never see a partial archive.
+    A file which cannot be opened is skipped. If reading a file fails after part of
+    it is written, Exception is raised and the temporary file is removed.
+    @param excluded_files: ExcludeMatcher or list of exclusion patterns relative to src
+    @param compression: zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED
+    @return: PackStats, files which cannot be opened are listed in stats.failures
+    """
+    stats = PackStats()
+    start = time.time()
+    logging.info('Pack %s to %s', src, archive_path)
+    makedirs(os.path.dirname(os.path.abspath(archive_path)))
+    tmp_path = archive_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb', BUFFER_SIZE) as file_obj:
+            with _open_zip(file_obj) as archive:
+                for rel_path, entry in iter_tree(src, excluded_files, stats):
+                    name = rel_path.replace(os.sep, '/')
+                    offset = archive.fp.tell()
+                    try:
+                        archive.write(entry.path, name, compression)
+                    except (IOError, OSError) as err:
+                        logging.error('Failed to pack %s: %s', entry.path, err)
+                        stats.failures.append((entry.path, str(err)))
+                        if archive.fp.tell() != offset:
+                            # Part of member is written, the archive cannot be published
+                            msg = 'Failed to pack %s, %s is not created' % (src, archive_path)
+                            logging.error(msg)
+                            raise Exception(msg)
+                        continue
+                    if entry.is_dir():
+                        stats.dirs += 1
+                    else:
+                        stats.files += 1
+                        stats.bytes += entry.stat().st_size
+        replace(tmp_path, archive_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    stats.elapsed = time.time() - start
+    logging.info('Packed %s: %s', src, stats)
+    return stats
+
+
+def verify_archive(archive_path):
+    """Read all members back and check their CRC, raise Exception if one is corrupt"""
+    with open(archive_path, 'rb', BUFFER_SIZE) as file_obj:
+        with zipfile.ZipFile(file_obj) as archive:
+            name = archive.testzip()
+    if name is not None:
+        msg = 'Failed to verify %s, member %s is corrupt' % (archive_path, name)
+        logging.error(msg)
+        raise Exception(msg)
+
+
+def list_members(archive_path):
+    """Get names of members, only the index at the end of archive is read"""
+    with zipfile.ZipFile(archive_path) as archive:
+        return archive.namelist()
+
+
+def read_member(archive_path, name):
+    """Read content of one member without unpacking others"""
+    with open(archive_path, 'rb') as file_obj:
+        with zipfile.ZipFile(file_obj) as archive:
+            return archive.read(name.replace('\\', '/'))
+
+
+def unpack(archive_path, dest_dir, patterns=None):
+    """
+    Unpack archive created by pack_tree(). Members are extracted in the order they
+    are stored, so archive on share drive is read sequentially.
+    @param patterns: Only extract members whose name matches one of the glob patterns
+    @return: PackStats
+    """
+    stats = PackStats()
+    start = time.time()
+    logging.info('Unpack %s to %s', archive_path, dest_dir)
+    makedirs(dest_dir)
+    with open(archive_path, 'rb', BUFFER_SIZE) as file_obj:
+        with zipfile.ZipFile(file_obj) as archive:
+            infos = sorted(archive.infolist(), key=lambda i: i.header_offset)
+            for info in infos:
+                if patterns and not any(fnmatch.fnmatch(info.filename, i) for i in patterns):
+                    stats.skipped += 1
+                    continue
+                path = member_path(dest_dir, info.filename)
+                if path is None:
+                    logging.warning('Skip member outside of destination: %s', info.filename)
+                    stats.skipped += 1
+                    continue
+                if info.filename.endswith('/'):
+                    makedirs(path)
+                    stats.dirs += 1
+                    continue
+                makedirs(os.path.dirname(path))
+                with archive.open(info) as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, BUFFER_SIZE)
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                os.utime(path, (mtime, mtime))
+                stats.files += 1
+                stats.bytes += info.file_size
+
+    stats.elapsed = time.time() - start
+    logging.info('Unpacked %s: %s', archive_path, stats)
+    return stats
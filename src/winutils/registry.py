@@ -0,0 +1,205 @@
+# encoding=utf-8
+r"""
+Read/Write Windows registry in process.
+
+Registry operations go through a backend, WinRegBackend is used by default.
+Use MemoryRegistry to test registry operations on non-Windows OS:
+
+>>> reg = MemoryRegistry()
+>>> with RegistryWriter(reg) as writer:
+...     writer.add(r'HKLM\Software\Test', 'Name', 'value')
+...     writer.add(r'HKLM\Software\Test', 'Count', 1, 'REG_DWORD')
+>>> read_value(r'HKEY_LOCAL_MACHINE\software\test', 'name', reg)
+('value', 'REG_SZ')
+"""
+import logging
+from collections import OrderedDict
+try:
+    import _winreg as winreg
+except ImportError:
+    try:
+        import winreg # Python 3
+    except ImportError:
+        winreg = None # Not Windows OS
+
+
+ROOT_KEYS = {
+    'HKLM': 'HKEY_LOCAL_MACHINE',
+    'HKCU': 'HKEY_CURRENT_USER',
+    'HKCR': 'HKEY_CLASSES_ROOT',
+    'HKU': 'HKEY_USERS',
+    'HKCC': 'HKEY_CURRENT_CONFIG',
+}
+
+VALUE_TYPES = ('REG_SZ', 'REG_EXPAND_SZ', 'REG_MULTI_SZ', 'REG_DWORD', 'REG_QWORD', 'REG_BINARY')
+
+
+def split_key(key):
+    r"""
+    Split registry key to root key name and sub key
+    >>> split_key(r'HKLM\Software\Microsoft')
+    ('HKEY_LOCAL_MACHINE', 'Software\\Microsoft')
+    """
+    root, _, sub_key = key.strip('\\').partition('\\')
+    root = root.upper()
+    root = ROOT_KEYS.get(root, root)
+    if root not in ROOT_KEYS.values():
+        msg = 'Invalid registry root key: %s' % key
+        logging.error(msg)
+        raise Exception(msg)
+    return root, sub_key
+
+
+class RegistryBackend(object):
+    """
+    Interface of registry backend.
+    A key handle returned by open_key() is passed to other functions.
+    """
+    def open_key(self, key, write=False):
+        """Open registry key like HKLM\\Software, create it if write is True"""
+        raise NotImplementedError
+
+    def close_key(self, handle):
+        """Close key handle returned by open_key()"""
+        raise NotImplementedError
+
+    def query_value(self, handle, name):
+        """Return value data and value type name"""
+        raise NotImplementedError
+
+    def set_value(self, handle, name, value, value_type):
+        """Set value data, value_type is a name in VALUE_TYPES"""
+        raise NotImplementedError
+
+
+class WinRegBackend(RegistryBackend):
+    """Access registry of current OS with winreg, 64 bit view is used"""
+
+    def open_key(self, key, write=False):
+        if winreg is None:
+            raise Exception('winreg is not available on this OS')
+
+        root, sub_key = split_key(key)
+        root = getattr(winreg, root)
+        if write:
+            access = winreg.KEY_READ | winreg.KEY_WRITE | winreg.KEY_WOW64_64KEY
+            return winreg.CreateKeyEx(root, sub_key, 0, access)
+        return winreg.OpenKey(root, sub_key, 0, winreg.KEY_READ | winreg.KEY_WOW64_64KEY)
+
+    def close_key(self, handle):
+        winreg.CloseKey(handle)
+
+    def query_value(self, handle, name):
+        value, type_id = winreg.QueryValueEx(handle, name)
+        type_names = [i for i in VALUE_TYPES if getattr(winreg, i) == type_id]
+        return value, type_names[0] if type_names else type_id
+
+    def set_value(self, handle, name, value, value_type):
+        winreg.SetValueEx(handle, name, 0, getattr(winreg, value_type), value)
+
+
+class MemoryRegistry(RegistryBackend):
+    """
+    Registry stored in memory, it is case insensitive as Windows registry.
+    """
+    def __init__(self):
+        # {(root, sub key in lower case): {value name in lower case: (value, type)}}
+        self.keys = {}
+
+    @staticmethod
+    def _normalize(key):
+        root, sub_key = split_key(key)
+        return root, sub_key.lower()
+
+    def open_key(self, key, write=False):
+        handle = self._normalize(key)
+        if handle not in self.keys:
+            if not write:
+                raise OSError('Registry key not found: %s' % key)
+            self.keys[handle] = {}
+        return handle
+
+    def close_key(self, handle):
+        pass
+
+    def query_value(self, handle, name):
+        values = self.keys[handle]
+        if name.lower() not in values:
+            raise OSError('Registry value not found: %s' % name)
+        return values[name.lower()]
+
+    def set_value(self, handle, name, value, value_type):
+        self.keys[handle][name.lower()] = (value, value_type)
+
+
+_BACKEND = WinRegBackend()
+
+
+def get_backend():
+    """Get default registry backend"""
+    return _BACKEND
+
+
+def set_backend(backend):
+    """Replace default registry backend, e.g. use MemoryRegistry in test.
+    Return previous backend"""
+    global _BACKEND
+    old_backend = _BACKEND
+    _BACKEND = backend
+    return old_backend
+
+
+def read_value(key, name, backend=None):
+    """Read registry value, return value data and value type name"""
+    backend = backend or get_backend()
+    handle = backend.open_key(key)
+    try:
+        return backend.query_value(handle, name)
+    finally:
+        backend.close_key(handle)
+
+
+class RegistryWriter(object):
+    """
+    Write a batch of registry values, each key is opened once.
+    Values are written when apply() is called or the with block exits.
+    """
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.writes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.apply()
+
+    def add(self, key, name, value, value_type='REG_SZ'):
+        """Add a registry value to write, as "reg add key /v name /t type /d value" does"""
+        if value_type not in VALUE_TYPES:
+            raise Exception('Unsupported registry value type: %s' % value_type)
+        self.writes.append((key, name, value, value_type))
+
+    def apply(self):
+        """Write all added values, return number of values written"""
+        backend = self.backend or get_backend()
+
+        key_values = OrderedDict()
+        for key, name, value, value_type in self.writes:
+            key_values.setdefault(split_key(key), []).append((name, value, value_type))
+
+        count = 0
+        for (root, sub_key), values in key_values.items():
+            key = '%s\\%s' % (root, sub_key)
+            handle = backend.open_key(key, write=True)
+            try:
+                for name, value, value_type in values:
+                    logging.debug('Set registry value %s\\%s = %s', key, name, value)
+                    backend.set_value(handle, name, value, value_type)
+                    count += 1
+            finally:
+                backend.close_key(handle)
+
+        self.writes = []
+        return count
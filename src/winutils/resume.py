@@ -0,0 +1,230 @@
+# encoding=utf-8
+"""
+Resumable chunked copy of large files.
+
+Data is written to dest + '.part'. Digest of each chunk is appended to the
+journal dest + '.journal' after the chunk is flushed to disk. When a copy
+fails, the next attempt verifies chunks recorded in journal and continues
+after the last good one. The temporary file is renamed to dest when it is
+complete.
+
+FaultInjector simulates a dropped link with a local file:
+
+>>> import tempfile
+>>> src = os.path.join(tempfile.mkdtemp(), 'src.bin')
+>>> with open(src, 'wb') as file_obj:
+...     _ = file_obj.write(b'x' * 1000)
+>>> no_wait = RetryPolicy(max_attempts=3, initial_delay=0, retry_on=(IOError, OSError))
+>>> stats = resumable_copy(src, src + '.copy', chunk_size=100, retry=no_wait,
+...                        opener=FaultInjector(fail_after=450))
+>>> stats.attempts, stats.resumed_bytes, open(src + '.copy', 'rb').read() == b'x' * 1000
+(2, 400, True)
+"""
+from __future__ import absolute_import
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+
+from .retry import RetryPolicy
+from .sync import replace
+from .copier import file_digest
+from .verify import verify_file
+
+# Bytes of one chunk recorded in journal
+CHUNK_SIZE = 8 * 1024 * 1024
+
+JOURNAL_VERSION = 1
+PART_SUFFIX = '.part'
+JOURNAL_SUFFIX = '.journal'
+
+# Retry policy of resumable_copy(), each attempt resumes from journal
+TRANSFER_RETRY = RetryPolicy(max_attempts=10, initial_delay=1.0, max_delay=30.0,
+                             retry_on=(IOError, OSError))
+
+
+class ResumeStats(object):
+    """Result of resumable_copy()"""
+    def __init__(self):
+        self.bytes = 0
+        # Bytes verified in temporary file instead of copied again
+        self.resumed_bytes = 0
+        self.chunks = 0
+        self.attempts = 0
+        # Whether the complete file was verified against digest of source
+        self.verified = False
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return '<ResumeStats bytes=%d resumed_bytes=%d chunks=%d attempts=%d elapsed=%.3fs>' % (
+            self.bytes, self.resumed_bytes, self.chunks, self.attempts, self.elapsed)
+
+
+class FaultyFile(object):
+    """File wrapper which raises IOError when more than fail_after bytes are read"""
+    def __init__(self, file_obj, fail_after):
+        self._file = file_obj
+        self._left = fail_after
+
+    def read(self, size=-1):
+        if size < 0 or size > self._left:
+            data = self._file.read(self._left)
+            self._left = 0
+            if data:
+                return data
+            raise IOError('Injected read failure')
+        data = self._file.read(size)
+        self._left -= len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._file.close()
+
+
+class FaultInjector(object):
+    """Opener for resumable_copy() which makes the first opened files fail"""
+    def __init__(self, fail_after, failures=1):
+        """
+        @param fail_after: Bytes read before a failure
+        @param failures: Number of opened files to fail, later files are not wrapped
+        """
+        self.fail_after = fail_after
+        self.failures = failures
+
+    def __call__(self, path, mode='rb'):
+        file_obj = open(path, mode)
+        if self.failures <= 0:
+            return file_obj
+        self.failures -= 1
+        return FaultyFile(file_obj, self.fail_after)
+
+
+def _read_full(file_obj, size):
+    """Read size bytes unless end of file is reached, network files may return less"""
+    parts = []
+    while size > 0:
+        data = file_obj.read(size)
+        if not data:
+            break
+        parts.append(data)
+        size -= len(data)
+    return b''.join(parts)
+
+
+def _load_journal(path, header):
+    """Get chunk digests recorded for the same source, empty list if journal is stale"""
+    try:
+        with open(path, 'r') as file_obj:
+            lines = file_obj.read().split('\n')
+        if json.loads(lines[0]) != header:
+            return []
+    except (IOError, OSError, ValueError):
+        return []
+    digests = []
+    for line in lines[1:]:
+        parts = line.split()
+        # The last line may be incomplete
+        if len(parts) != 2 or parts[0] != str(len(digests)):
+            break
+        digests.append(parts[1])
+    return digests
+
+
+def _verify_chunks(path, digests, chunk_size, algorithm):
+    """Get number of leading chunks in file which match digests"""
+    if not os.path.isfile(path):
+        return 0
+    count = 0
+    with open(path, 'rb') as file_obj:
+        for digest in digests:
+            data = _read_full(file_obj, chunk_size)
+            if not data or hashlib.new(algorithm, data).hexdigest() != digest:
+                break
+            count += 1
+    return count
+
+
+def _write_journal(path, header, digests):
+    """Rewrite journal with header and digests"""
+    with open(path, 'w') as file_obj:
+        file_obj.write(json.dumps(header, sort_keys=True) + '\n')
+        for index, digest in enumerate(digests):
+            file_obj.write('%d %s\n' % (index, digest))
+
+
+def _copy_chunks(src, dest, chunk_size, algorithm, opener, stats):
+    """One attempt of resumable copy"""
+    stats.attempts += 1
+    tmp_path = dest + PART_SUFFIX
+    journal_path = dest + JOURNAL_SUFFIX
+    src_stat = os.stat(src)
+    size = src_stat.st_size
+    header = {'version': JOURNAL_VERSION, 'size': size, 'mtime': src_stat.st_mtime,
+              'chunk_size': chunk_size, 'algorithm': algorithm}
+
+    digests = _load_journal(journal_path, header)
+    done = _verify_chunks(tmp_path, digests, chunk_size, algorithm) if digests else 0
+    if done:
+        logging.info('Resume %s from chunk %d of %d', src, done, len(digests))
+        stats.resumed_bytes += min(done * chunk_size, size)
+    digests = digests[:done]
+    _write_journal(journal_path, header, digests)
+
+    offset = min(done * chunk_size, size)
+    with open(tmp_path, 'r+b' if os.path.isfile(tmp_path) else 'wb') as tmp:
+        tmp.truncate(offset)
+        tmp.seek(offset)
+        with opener(src, 'rb') as src_obj:
+            src_obj.seek(offset)
+            with open(journal_path, 'a') as journal:
+                while offset < size:
+                    data = _read_full(src_obj, min(chunk_size, size - offset))
+                    if not data:
+                        raise IOError('Unexpected end of %s at %d' % (src, offset))
+                    tmp.write(data)
+                    tmp.flush()
+                    os.fsync(tmp.fileno())
+                    digest = hashlib.new(algorithm, data).hexdigest()
+                    journal.write('%d %s\n' % (len(digests), digest))
+                    journal.flush()
+                    digests.append(digest)
+                    offset += len(data)
+                    stats.bytes += len(data)
+                    stats.chunks += 1
+
+    shutil.copystat(src, tmp_path)
+    replace(tmp_path, dest)
+    os.remove(journal_path)
+
+
+def resumable_copy(src, dest, chunk_size=CHUNK_SIZE, algorithm='sha1', retry=None, opener=open,
+                   verify=None):
+    """
+    Copy a large file in chunks, a failed copy is resumed from the last verified chunk.
+    Failed copies leave dest + '.part' and dest + '.journal', so a later call resumes too.
+    @param retry: RetryPolicy of attempts, default is TRANSFER_RETRY
+    @param opener: Function to open source file like open(), e.g. FaultInjector in test
+    @param verify: Hash algorithm like 'sha1' to compare the complete file with source,
+        Exception is raised if they differ
+    @return: ResumeStats
+    """
+    stats = ResumeStats()
+    start = time.time()
+    logging.info('Copy %s to %s in chunks of %d bytes', src, dest, chunk_size)
+    (retry or TRANSFER_RETRY).call(_copy_chunks, src, dest, chunk_size, algorithm, opener, stats)
+    if verify:
+        # Resumed chunks were not read from source in this call, so hash the whole source
+        verify_file(dest, file_digest(src, verify), verify)
+        stats.verified = True
+    stats.elapsed = time.time() - start
+    logging.info('Copied %s: %s', src, stats)
+    return stats
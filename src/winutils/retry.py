@@ -0,0 +1,148 @@
+# encoding=utf-8
+"""
+Retry operations with exponential backoff, jitter and a total deadline.
+
+>>> policy = RetryPolicy(max_attempts=3, initial_delay=0, retry_on=(IOError,))
+>>> policy.call(lambda: 'done')
+'done'
+>>> policy.stats.attempts
+1
+"""
+from __future__ import absolute_import
+
+import time
+import random
+import logging
+import threading
+
+
+class RetryStats(object):
+    """Metrics of operations executed by retry policies"""
+    def __init__(self):
+        self.calls = 0
+        self.attempts = 0
+        self.successes = 0
+        self.failures = 0
+        self.give_ups = 0
+        self.wait_time = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, attempts, waited, success, give_up=False):
+        """Add result of one call"""
+        with self._lock:
+            self.calls += 1
+            self.attempts += attempts
+            self.wait_time += waited
+            if success:
+                self.successes += 1
+            else:
+                self.failures += 1
+            if give_up:
+                self.give_ups += 1
+
+    def as_dict(self):
+        """Get metrics as dict"""
+        return {
+            'calls': self.calls,
+            'attempts': self.attempts,
+            'successes': self.successes,
+            'failures': self.failures,
+            'give_ups': self.give_ups,
+            'wait_time': self.wait_time,
+        }
+
+
+class RetryPolicy(object):
+    """
+    Retry policy with exponential backoff.
+    Delay before n-th retry is initial_delay * multiplier ** (n - 1),
+    limited by max_delay and randomized by +/- jitter.
+    """
+    def __init__(self, max_attempts=5, initial_delay=0.5, max_delay=30.0, multiplier=2.0,
+                 jitter=0.2, deadline=None, retry_on=(Exception,), retry_if=None,
+                 stats=None, sleep=time.sleep, clock=time.time):
+        """
+        @param deadline: Max seconds spent in one call, including waiting
+        @param retry_on: Exception types which are retried
+        @param retry_if: Function to check whether an exception is retryable
+        @param stats: RetryStats object shared by policies, a new one is created if it is None
+        """
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retry_on = retry_on
+        self.retry_if = retry_if
+        self.stats = stats if stats is not None else RetryStats()
+        self._sleep = sleep
+        self._clock = clock
+
+    def delay(self, retry):
+        """Get seconds to wait before n-th retry, retry starts from 1"""
+        delay = min(self.initial_delay * self.multiplier ** (retry - 1), self.max_delay)
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(delay, 0)
+
+    def is_retryable(self, err):
+        """Check whether an exception is retryable"""
+        if not isinstance(err, self.retry_on):
+            return False
+        return self.retry_if is None or self.retry_if(err)
+
+    def _wait(self, retry, start):
+        """Wait before next attempt, return seconds waited or None if deadline is reached"""
+        if retry >= self.max_attempts:
+            return None
+        delay = self.delay(retry)
+        if self.deadline is not None:
+            remaining = self.deadline - (self._clock() - start)
+            if remaining <= 0:
+                return None
+            delay = min(delay, remaining)
+        self._sleep(delay)
+        return delay
+
+    def call(self, func, *args, **kwargs):
+        """Call func until it succeeds, raise last exception if all attempts failed"""
+        start = self._clock()
+        waited = 0.0
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = func(*args, **kwargs)
+            except Exception as err:
+                if not self.is_retryable(err):
+                    logging.error('Attempt %d failed, not retryable: %s', attempt, err)
+                    self.stats.add(attempt, waited, False, give_up=True)
+                    raise
+                logging.warning('Attempt %d failed: %s', attempt, err)
+                delay = self._wait(attempt, start)
+                if delay is None:
+                    self.stats.add(attempt, waited, False)
+                    raise
+                waited += delay
+            else:
+                self.stats.add(attempt, waited, True)
+                return result
+
+    def poll(self, predicate, *args, **kwargs):
+        """Call predicate until it returns True.
+        Return False if it is still False after all attempts"""
+        start = self._clock()
+        waited = 0.0
+        attempt = 0
+        while True:
+            attempt += 1
+            if predicate(*args, **kwargs):
+                self.stats.add(attempt, waited, True)
+                return True
+            logging.debug('%d try, condition is not met', attempt)
+            delay = self._wait(attempt, start)
+            if delay is None:
+                self.stats.add(attempt, waited, False)
+                return False
+            waited += delay
@@ -1,12 +1,30 @@
 # encoding=utf-8
 """Access share drive from Windows OS"""
 import os
-import time
 import re
 import logging
 
 from .fs import copy, delete
-from .shell import NET_CMD
+from .retry import RetryPolicy, RetryStats
+from .filecache import get_cache
+from .smbpool import get_pool
+from .transfer import transfer_paths
+from .resume import resumable_copy
+from .pack import pack_tree, unpack, read_member, verify_archive
+from .snapshot import scan_tree
+from .archive import makedirs
+from .metacache import MetadataCache, METADATA_TTL, FILE, DIR, MISSING
+
+
+def _succeeded(stats):
+    """Check stats returned by fs.copy(), None means a file or robocopy is copied"""
+    return stats is None or not stats.failures
+
+
+def _fetch_cached(src, dest):
+    """Copy function of download_many() which serves files from the download cache"""
+    get_cache().fetch(src, dest)
+    return os.path.getsize(dest)
 
 
 class ShareDrive(object):
@@ -18,11 +36,18 @@ class ShareDrive(object):
     False
     """
     path_pattern = re.compile(r'\\\\[^\\]+')
+    # Metrics of exists() retries
+    exists_stats = RetryStats()
 
-    def __init__(self, path=None, usr=None, pwd=None):
+    def __init__(self, path=None, usr=None, pwd=None, metadata_ttl=METADATA_TTL):
+        """
+        @param metadata_ttl: Seconds to cache listings of remote directories
+        """
         self._path = path
         self.usr = usr
         self.pwd = pwd
+        self._handle = None
+        self.metadata = MetadataCache(metadata_ttl)
 
     def __enter__(self):
         if self._path is not None:
@@ -34,6 +59,8 @@ class ShareDrive(object):
 
     def open(self, path=None, device=''):
         r"""Mount specified share drive
+        The session is shared with other ShareDrive objects of the same share and user,
+        'net use' is only run if it is not mounted, see winutils.smbpool.
         @param path: Remote folder path like: \\david-pc\share
         """
         if path:
@@ -41,100 +68,230 @@ class ShareDrive(object):
         else:
             path = self._path
 
-        if self.usr:
-            _mount_cmd = '%s use %s "%s" /user:%s "%s"'
-            cmd = _mount_cmd % (NET_CMD, device, path, self.usr, self.pwd)
-        else:
-            cmd = '%s use %s "%s"' % (NET_CMD, device, path)
-
-        logging.info('Mount share drive(%s)', path)
-        logging.debug(cmd)
-
-        # Invoke command to mount share drive
-        ret = os.system(cmd)
-        if ret == 0:
-            logging.info('Mounted')
-            return path
-        else:
-            logging.error('Share drive cannot be mounted. Error code %d', ret)
+        handle = get_pool().acquire(path, self.usr, self.pwd, device)
+        if handle is None:
             return None
+        self.close()
+        self._handle = handle
+        return path
 
-    def download(self, rmt_path, loc_path):
+    def download(self, rmt_path, loc_path, use_cache=True, verify=None, resumable=False,
+                 packed=False):
         """
         Download file from share drive to local file system.
+        Files are served from the local download cache if it is enabled, see winutils.filecache.
         @param rmt_path: Remote file path
         @param loc_path: Local file path
+        @param use_cache: Look up and fill the download cache
+        @param verify: Hash algorithm like 'sha1' to verify files which are not served
+            from cache, see fs.copydir()
+        @param resumable: Copy a large file in chunks which are resumed after a failure
+            instead of cached, see winutils.resume
+        @param packed: rmt_path is an archive uploaded with packed=True, it is unpacked
+            into local folder loc_path while it is read
         """
         if not self.exists(rmt_path):
             logging.error("%s does not exist", rmt_path)
             return False
         rmt_path = self.get_abs_path(rmt_path)
-        return copy(rmt_path, loc_path)
+        if packed:
+            unpack(rmt_path, loc_path)
+            return True
+        if resumable and os.path.isfile(rmt_path):
+            try:
+                makedirs(os.path.dirname(os.path.abspath(loc_path)))
+                resumable_copy(rmt_path, loc_path, verify=verify)
+            except Exception:
+                logging.error("Failed to download %s", rmt_path)
+                return False
+            return True
+        cache = get_cache()
+        if use_cache and cache is not None and os.path.isfile(rmt_path):
+            cache.fetch(rmt_path, loc_path)
+            return True
+        return _succeeded(copy(rmt_path, loc_path, verify=verify))
 
-    def upload(self, loc_path, rmt_path):
+    def upload(self, loc_path, rmt_path, incremental=False, mirror=False, verify=None,
+               resumable=False, packed=False):
         """Upload file/ to share folder
         @param loc_path: Local file/folder path
         @param rmt_path: Remote file/folder path
+        @param incremental: Only upload files changed since last upload instead of
+            deleting remote path and uploading everything
+        @param mirror: Delete remote files which are removed from local folder, used with incremental
+        @param verify: Hash algorithm like 'sha1' to verify uploaded files, see fs.copydir()
+        @param resumable: Copy a large file in chunks which are resumed after a failure,
+            the remote file is replaced when it is complete
+        @param packed: Pack local folder into one zip file rmt_path instead of creating
+            every file on share drive, see winutils.pack. With verify, CRC of every
+            member is checked by reading the archive back
         @return: True if successed else False
         """
         rmt_path = self.get_abs_path(rmt_path)
-        if not delete(rmt_path):
-            logging.error("Failed to upload file")
-            return False
-        else:
-            return copy(loc_path, rmt_path)
+        try:
+            if packed:
+                try:
+                    stats = pack_tree(loc_path, rmt_path)
+                    if verify:
+                        verify_archive(rmt_path)
+                except Exception:
+                    logging.error("Failed to upload %s", loc_path)
+                    return False
+                return not stats.failures
+            if incremental:
+                try:
+                    stats = copy(loc_path, rmt_path, incremental=True, mirror=mirror,
+                                 verify=verify)
+                except Exception:
+                    logging.error("Failed to upload %s", loc_path)
+                    return False
+                return _succeeded(stats)
+            if resumable and os.path.isfile(loc_path):
+                try:
+                    makedirs(os.path.dirname(rmt_path))
+                    resumable_copy(loc_path, rmt_path, verify=verify)
+                except Exception:
+                    logging.error("Failed to upload %s", loc_path)
+                    return False
+                return True
+            try:
+                delete(rmt_path)
+            except Exception:
+                logging.error("Failed to upload file")
+                return False
+            return _succeeded(copy(loc_path, rmt_path, verify=verify))
+        finally:
+            self.metadata.invalidate(rmt_path)
+
+    def download_many(self, rmt_paths, loc_dir, workers=None, callback=None, use_cache=True):
+        """
+        Download files into local folder, several files are transferred at the same time.
+        A failed file does not stop others.
+        @param rmt_paths: Remote file/folder paths or glob patterns
+        @param loc_dir: Local folder, folders are downloaded with their names
+        @param workers: Number of files in flight
+        @param callback: Function called with TransferStats after each file
+        @param use_cache: Look up and fill the download cache
+        @return: TransferStats, failed files are listed in stats.failures
+        """
+        rmt_paths = [self.get_abs_path(i) for i in rmt_paths]
+        copy_func = _fetch_cached if use_cache and get_cache() is not None else None
+        return transfer_paths(rmt_paths, loc_dir, workers, callback, copy_func)
+
+    def upload_many(self, loc_paths, rmt_dir, workers=None, callback=None):
+        """
+        Upload files into remote folder, several files are transferred at the same time.
+        A failed file does not stop others.
+        @param loc_paths: Local file/folder paths or glob patterns
+        @param rmt_dir: Remote folder, folders are uploaded with their names
+        @return: TransferStats, failed files are listed in stats.failures
+        """
+        rmt_dir = self.get_abs_path(rmt_dir)
+        try:
+            return transfer_paths(loc_paths, rmt_dir, workers, callback)
+        finally:
+            self.metadata.invalidate(rmt_dir)
+
+    def read_packed(self, rmt_path, name):
+        """
+        Read one file of an archive uploaded with packed=True without downloading others
+        @param name: Path of file relative to the uploaded folder
+        @return: Content in bytes
+        """
+        return read_member(self.get_abs_path(rmt_path), name)
 
     def is_file(self, remote_path):
         """
         Check whether remote path is a file path
         """
         remote_path = self.get_abs_path(remote_path)
-        return os.path.isfile(remote_path)
+        kind = self.metadata.lookup(remote_path)
+        if kind is None:
+            return os.path.isfile(remote_path)
+        return kind == FILE
 
     def is_dir(self, remote_path):
         """
         Check whether remote path is a folder path
         """
         remote_path = self.get_abs_path(remote_path)
-        return os.path.isdir(remote_path)
+        kind = self.metadata.lookup(remote_path)
+        if kind is None:
+            return os.path.isdir(remote_path)
+        return kind == DIR
 
     def exists(self, path, retry_count=50, delay=0.5):
         """
         Check whether remote path exists or not
+        The answer comes from cached listing of parent directory, see winutils.metacache.
+        Checks are only retried if the parent directory cannot be listed.
+        @param retry_count: Max number of checks
+        @param delay: Max seconds to wait between checks,
+            total waiting time is limited to retry_count * delay
         """
         path = self.get_abs_path(path)
+        kind = self.metadata.lookup(path)
+        if kind is not None:
+            return kind != MISSING
         # Workaround for window share drive
         # Sometimes, windows share drive cannot be detected.
         # Wait about 6 seconds, the path can be accessed.
-        for i in range(retry_count):
-            logging.debug('%d try to detect file', i)
-            if os.path.exists(path):
-                return True
-            time.sleep(delay)
+        policy = RetryPolicy(max_attempts=retry_count, initial_delay=min(0.1, delay),
+                             max_delay=delay, multiplier=1.5, deadline=retry_count * delay,
+                             stats=self.exists_stats)
+        return policy.poll(os.path.exists, path)
 
-        return False
+    def exists_many(self, paths):
+        """
+        Check whether remote paths exist, each parent directory is listed once.
+        Checks are not retried.
+        @return: List of True/False in the order of paths
+        """
+        paths = [self.get_abs_path(i) for i in paths]
+        kinds = self.metadata.lookup_many(paths)
+        return [os.path.exists(path) if kind is None else kind != MISSING
+                for path, kind in zip(paths, kinds)]
+
+    def snapshot(self, subpath='', excluded_files=None, workers=None):
+        """
+        Walk remote tree once and record path, type, size and mtime of every entry.
+        Queries against the snapshot are answered in memory, compare two snapshots or
+        a snapshot of a local folder with winutils.snapshot.diff().
+        @param subpath: Remote folder, relative to share drive path or absolute
+        @param workers: Number of directories listed at the same time
+        @return: Snapshot, see winutils.snapshot
+        """
+        return scan_tree(self.get_abs_path(subpath), excluded_files, workers)
 
     def delete(self, path):
         """
         Delete file from share folder
+        @return: DeleteStats
         """
         path = self.get_abs_path(path)
-        return delete(path)
+        try:
+            return delete(path)
+        finally:
+            self.metadata.invalidate(path)
 
     def mkdir(self, path):
         """
         Create directory on share folder
         """
         path = self.get_abs_path(path)
-        os.makedirs(path)
+        try:
+            os.makedirs(path)
+        finally:
+            self.metadata.invalidate(path)
 
     def close(self):
         """
         Close connection
+        The share is unmounted when no ShareDrive uses it and it is idle for a while
         """
-        command = '%s use "%s" /delete' % (NET_CMD, self._path)
-        logging.debug('Share drive will be umounted. Command: %s', command)
-        os.system(command)
+        if self._handle is not None:
+            get_pool().release(self._handle)
+            self._handle = None
 
     def get_abs_path(self, path):
         """
@@ -154,6 +311,6 @@ if __name__ == '__main__':
     # import doctest
     # doctest.testmod()
     with ShareDrive(r'\\shwdejointd140\reports\temp') as cd:
-        print cd.delete("LogsKnownPatterns.log")
-        print cd.delete("temp2")
+        print(cd.delete("LogsKnownPatterns.log"))
+        print(cd.delete("temp2"))
 
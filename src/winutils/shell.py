@@ -5,62 +5,67 @@ Define functions for windows shell
 import os
 import re
 import sys
+import json
+import struct
+import codecs
+import locale
+import hashlib
 import subprocess
+import collections
 import logging
-try:
-    import _winreg as winreg
-except ImportError:
-    import winreg # Python 3
 
+from . import registry
+from . import launcher
+from .launcher import get_launcher, get_caller
 from .winos import get_long_bit
 
+launcher.INTERNAL_MODULES.add(__name__)
+
 
 class Shell(object):
     """
     Define funcitons for Windows Shell operations
     """
+    # Resolved native command paths, {cache key: {command: path}}
+    _cmd_cache = {}
+    # Optional file to persist resolved command paths between processes
+    cmd_cache_file = os.environ.get('WINUTILS_CMD_CACHE')
+
     @classmethod
     def add2path(cls, dir_path):
         """Add directory to path envrioment
         @param dir_path: Directory path
         """
-        reg_key_sys = r'SYSTEM\CurrentControlSet\Control\Session Manager\Environment'
-        reg_key_usr = r'Environment'
+        reg_key_sys = r'HKLM\SYSTEM\CurrentControlSet\Control\Session Manager\Environment'
+        reg_key_usr = r'HKCU\Environment'
         reg_val = 'PATH'
 
-        def read_path(key, sub_key):
-            """xxx"""
-            with winreg.OpenKey(key, sub_key, winreg.KEY_READ | winreg.KEY_WOW64_64KEY) as path_key:
-                val = winreg.QueryValueEx(path_key, reg_val)[0]
-                paths = val.split(os.path.pathsep)
-                logging.info('Current PATH variable in %s: %s', sub_key, paths)
+        def read_path(key):
+            """Read PATH value of key, check whether dir_path is in it"""
+            val = registry.read_value(key, reg_val)[0]
+            paths = val.split(os.path.pathsep)
+            logging.info('Current PATH variable in %s: %s', key, paths)
 
-                found = False
-                tmp_path = [i for i in paths if i.lower() == dir_path.lower()]
-                if len(tmp_path) != 0:
-                    logging.info(
-                        '%s already exist in PATH environment variable', dir_path)
-                    found = True
+            found = False
+            tmp_path = [i for i in paths if i.lower() == dir_path.lower()]
+            if len(tmp_path) != 0:
+                logging.info(
+                    '%s already exist in PATH environment variable', dir_path)
+                found = True
 
-                return found, val
+            return found, val
 
-        found1, sys_path = read_path(winreg.HKEY_LOCAL_MACHINE, reg_key_sys)
+        found1, sys_path = read_path(reg_key_sys)
         if found1:
             return True
-        found2 = read_path(winreg.HKEY_CURRENT_USER, reg_key_usr)[0]
+        found2 = read_path(reg_key_usr)[0]
         if found2:
             return True
 
         # Add specified path to envrioment variable
         new_val = sys_path + os.path.pathsep + dir_path
-        cmd = r'%(cmd)s add "HKLM\%(key)s" /v %(val_name)s /t REG_EXPAND_SZ /d "%(val)s" /f' % \
-              {
-                  'cmd': cls.reg_cmd(),
-                  'key': reg_key_sys,
-                  'val_name': reg_val,
-                  'val': new_val
-              }
-        cls.system(cmd)
+        with registry.RegistryWriter() as writer:
+            writer.add(reg_key_sys, reg_val, new_val, 'REG_EXPAND_SZ')
 
     @classmethod
     def system(cls, cmd, expected_code=0, shell=True):
@@ -68,10 +73,8 @@ class Shell(object):
         Return stdout and stderr of application"""
         logging.debug('Execute command: %s', cmd)
 
-        process = subprocess.Popen(
+        ret, out, err = get_launcher().run(
             cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=shell)
-        out, err = process.communicate()
-        ret = process.returncode
 
         if ret != expected_code:
             desc = '%s failed: %s\nError Message: %s' % (cmd, out, err)
@@ -80,6 +83,77 @@ class Shell(object):
 
         return out, err
 
+    @classmethod
+    def stream(cls, cmd, expected_code=0, shell=True, encoding=None, tail=100):
+        """Execute a specified application and yield its output line by line.
+        stderr is merged into stdout. Only the last lines are kept in memory
+        for error message.
+        @param encoding: Encoding of output, default is preferred locale encoding
+        @param tail: Number of last lines reported when command failed
+        """
+        logging.debug('Execute command: %s', cmd)
+        encoding = encoding or locale.getpreferredencoding(False) or 'utf-8'
+        tail_lines = collections.deque(maxlen=tail)
+        output_size = [0]
+
+        proc_launcher = get_launcher()
+        token = proc_launcher.begin(cmd)
+        process = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=shell)
+        try:
+            for line in _iter_lines(process.stdout, encoding, output_size):
+                tail_lines.append(line)
+                yield line
+            ret = process.wait()
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            proc_launcher.end(token, process.returncode, output_size[0])
+
+        if ret != expected_code:
+            desc = '%s failed: exit code %d\nLast output:\n%s' % (
+                cmd, ret, '\n'.join(tail_lines))
+            logging.error(desc)
+            raise Exception(desc)
+
+    @classmethod
+    def system_stream(cls, cmd, callback, expected_code=0, shell=True, encoding=None, tail=100):
+        """Execute a specified application and call callback with each line of output.
+        Return last lines of output"""
+        tail_lines = collections.deque(maxlen=tail)
+        for line in cls.stream(cmd, expected_code, shell, encoding, tail):
+            tail_lines.append(line)
+            callback(line)
+        return list(tail_lines)
+
+    @classmethod
+    def run_async(cls, cmd, expected_code=0, shell=True, timeout=None):
+        """Coroutine version of system() built on asyncio (Python 3 only).
+        Number of concurrent child processes is limited by aioshell.MAX_CONCURRENCY
+        @param timeout: Seconds to wait before the command is killed
+        """
+        from .aioshell import run_async
+        return run_async(cmd, expected_code, shell, timeout, get_caller())
+
+    @classmethod
+    def gather(cls, cmds, expected_code=0, shell=True, timeout=None):
+        """Coroutine to execute commands concurrently (Python 3 only).
+        Return list of stdout and stderr in the same order of cmds"""
+        from .aioshell import gather
+        return gather(cmds, expected_code, shell, timeout, caller=get_caller())
+
+    @classmethod
+    def system_many(cls, cmds, expected_code=0, shell=True, timeout=None):
+        """Execute independent commands concurrently and wait for all of them.
+        Commands are executed one by one if asyncio is not available"""
+        if sys.version_info < (3, 7):
+            return [cls.system(cmd, expected_code, shell) for cmd in cmds]
+
+        from .aioshell import system_many
+        return system_many(cmds, expected_code, shell, timeout, get_caller())
+
     @staticmethod
     def is_32_bit_process():
         """
@@ -93,7 +167,17 @@ class Shell(object):
         Find command for current OS.
         If user are using Python for x86 on X64 platform,
         x64 version programs are stored under folder:c:\\windows\\sysnative
+        The result is memoized per process, and saved to cmd_cache_file if it is set.
         """
+        cache = cls._load_cmd_cache()
+        if cmd not in cache:
+            cache[cmd] = cls._where(cmd)
+            cls._save_cmd_cache()
+        return cache[cmd]
+
+    @classmethod
+    def _where(cls, cmd):
+        """Search native command path without cache"""
         os_bit = get_long_bit()
         if os_bit != "32" and cls.is_32_bit_process():
             _pat = re.compile(r'(C:\\Windows\\)(system32)', re.IGNORECASE)
@@ -112,6 +196,51 @@ class Shell(object):
         logging.debug('Fail to find command path for %s', cmd)
         return cmd
 
+    @classmethod
+    def _cmd_cache_key(cls):
+        """Key of command cache: interpreter bitness and PATH"""
+        key = '%d|%s' % (struct.calcsize('P') * 8, os.environ.get('PATH', ''))
+        return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def _load_cmd_cache(cls):
+        """Load command paths saved in cmd_cache_file once per process"""
+        key = cls._cmd_cache_key()
+        if key in cls._cmd_cache:
+            return cls._cmd_cache[key]
+
+        cache = {}
+        if cls.cmd_cache_file and os.path.isfile(cls.cmd_cache_file):
+            try:
+                with open(cls.cmd_cache_file, 'r') as cache_file:
+                    cache = json.load(cache_file).get(key, {})
+            except (IOError, OSError, ValueError) as err:
+                logging.warning('Cannot read command cache %s: %s', cls.cmd_cache_file, err)
+        cls._cmd_cache[key] = cache
+        return cache
+
+    @classmethod
+    def _save_cmd_cache(cls):
+        """Save resolved command paths to cmd_cache_file"""
+        if not cls.cmd_cache_file:
+            return
+
+        content = {}
+        try:
+            if os.path.isfile(cls.cmd_cache_file):
+                with open(cls.cmd_cache_file, 'r') as cache_file:
+                    content = json.load(cache_file)
+            content.update(cls._cmd_cache)
+            with open(cls.cmd_cache_file, 'w') as cache_file:
+                json.dump(content, cache_file)
+        except (IOError, OSError, ValueError) as err:
+            logging.warning('Cannot write command cache %s: %s', cls.cmd_cache_file, err)
+
+    @classmethod
+    def clear_cmd_cache(cls):
+        """Forget command paths resolved in this process"""
+        cls._cmd_cache.clear()
+
     @classmethod
     def reg_cmd(cls):
         """
@@ -136,22 +265,60 @@ class Shell(object):
             (r'services\Tcpip\Parameters', 'NV Hostname')
         ]
 
-        for key_name, value_name in reg_values:
-            cmd = (r'%s add "HKEY_LOCAL_MACHINE\SYSTEM\CurrentControlSet\%s"' +
-                   r' /v "%s" /t REG_SZ /d %s /f') % \
-                  (cls.reg_cmd(), key_name, value_name, hostname)
-            os.system(cmd)
+        with registry.RegistryWriter() as writer:
+            for key_name, value_name in reg_values:
+                writer.add(r'HKEY_LOCAL_MACHINE\SYSTEM\CurrentControlSet\%s' % key_name,
+                           value_name, hostname)
+
+
+def _iter_lines(file_obj, encoding, output_size=None, chunk_size=65536):
+    """Read and decode lines from pipe as soon as they are available
+    @param output_size: One item list to count bytes read"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    fileno = file_obj.fileno()
+    pending = u''
+    while True:
+        data = os.read(fileno, chunk_size)
+        if output_size is not None:
+            output_size[0] += len(data)
+        pending += decoder.decode(data, final=not data)
+        lines = pending.splitlines(True)
+        pending = u''
+        # Last line may be incomplete, or '\r' of '\r\n' at the end of chunk
+        if data and lines and (not lines[-1].endswith(('\n', '\r')) or lines[-1].endswith('\r')):
+            pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(u'\r\n')
+        if not data:
+            break
+
+
+# Native command constants and command names, their paths are resolved by
+# Shell.where() on first access, so importing this module launches no process
+NATIVE_COMMANDS = {
+    'REG_CMD': 'reg',
+    'NET_CMD': 'net',
+    'WMIC_CMD': 'wmic',
+    'NETSH_CMD': 'netsh',
+    'SCHTASKS_CMD': 'schtasks',
+    'ROBOCOPY_CMD': 'robocopy',
+    'MSIEXEC_CMD': 'msiexec',
+}
+
+
+def __getattr__(name):
+    """Resolve native command constant like REG_CMD on first access (Python 3.7+)"""
+    if name in NATIVE_COMMANDS:
+        value = globals()[name] = Shell.where(NATIVE_COMMANDS[name])
+        return value
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
 
 
-# Get native command path
-REG_CMD = Shell.where('reg')
-NET_CMD = Shell.where('net')
-WMIC_CMD = Shell.where('wmic')
-NETSH_CMD = Shell.where('netsh')
-SCHTASKS_CMD = Shell.where('schtasks')
-ROBOCOPY_CMD = Shell.where('robocopy')
-MSIEXEC_CMD = Shell.where('msiexec')
+if sys.version_info < (3, 7):
+    # Module __getattr__ is not supported, Shell.where() launches no process anyway
+    for _name, _cmd in NATIVE_COMMANDS.items():
+        globals()[_name] = Shell.where(_cmd)
 
 
 if __name__ == '__main__':
-    print Shell.where('powershell')
+    print(Shell.where('powershell'))
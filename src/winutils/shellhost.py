@@ -0,0 +1,210 @@
+# encoding=utf-8
+"""
+Keep one shell interpreter process open and execute commands in it,
+which saves the startup time of powershell.exe/cmd.exe for each command.
+
+>>> with ShellHost('bash') as host:  # doctest: +SKIP
+...     host.execute('echo hello')
+'hello'
+"""
+from __future__ import absolute_import
+
+import uuid
+import atexit
+import locale
+import logging
+import threading
+import subprocess
+from collections import namedtuple
+try:
+    import Queue as queue
+except ImportError:
+    import queue # Python 3
+
+from . import launcher
+from .launcher import get_launcher
+
+launcher.INTERNAL_MODULES.add(__name__)
+
+
+# argv: command line to start interpreter
+# template: script sent to interpreter, it must print sentinel and exit code after command
+Dialect = namedtuple('Dialect', ['argv', 'template'])
+
+DIALECTS = {
+    'powershell': Dialect(
+        ['powershell.exe', '-NoLogo', '-NoProfile', '-NonInteractive', '-Command', '-'],
+        '%(cmd)s\n"%(sentinel)s $(if ($?) {0} elseif ($LASTEXITCODE) {$LASTEXITCODE} else {1})"\n'),
+    'cmd': Dialect(
+        ['cmd.exe', '/Q', '/K', 'prompt $S'],
+        '%(cmd)s\r\necho %(sentinel)s %%errorlevel%%\r\n'),
+    'bash': Dialect(
+        ['bash', '--noprofile', '--norc'],
+        '%(cmd)s\necho "%(sentinel)s $?"\n'),
+}
+
+
+class ShellHost(object):
+    """
+    Long-lived interpreter process. Commands are sent through stdin, output
+    of each command ends with a sentinel line which contains its exit code.
+    The process is restarted if it exited or a command timed out.
+    """
+    def __init__(self, dialect='powershell', encoding=None):
+        """
+        @param dialect: Name in DIALECTS or a Dialect object
+        @param encoding: Encoding of interpreter input/output
+        """
+        self.dialect = dialect if isinstance(dialect, Dialect) else DIALECTS[dialect]
+        self.encoding = encoding or locale.getpreferredencoding(False) or 'utf-8'
+        # Number of times interpreter was started again after it stopped
+        self.restart_count = 0
+        self._started = False
+        self._process = None
+        self._lines = None
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def alive(self):
+        """Whether interpreter process is running"""
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        """Start interpreter process if it is not running"""
+        if self.alive:
+            return
+        if self._process is not None:
+            logging.warning('Shell host exited with %s, restart it', self._process.returncode)
+            self._kill()
+        if self._started:
+            self.restart_count += 1
+        self._started = True
+
+        logging.debug('Start shell host: %s', self.dialect.argv)
+        self._process = subprocess.Popen(
+            self.dialect.argv, stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self._lines = queue.Queue()
+        reader = threading.Thread(target=self._read_output,
+                                  args=(self._process.stdout, self._lines))
+        reader.daemon = True
+        reader.start()
+
+    @staticmethod
+    def _read_output(pipe, lines):
+        """Read output of interpreter in background thread, None means EOF"""
+        for line in iter(pipe.readline, b''):
+            lines.put(line)
+        lines.put(None)
+        pipe.close()
+
+    def _kill(self):
+        """Stop interpreter process"""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        # stdout is closed by reader thread
+        try:
+            process.stdin.close()
+        except (IOError, OSError):
+            pass
+
+    def close(self):
+        """Stop interpreter process"""
+        with self._lock:
+            self._kill()
+
+    def run(self, cmd, timeout=None):
+        """
+        Execute a command in interpreter
+        @param timeout: Seconds to wait for command, interpreter is restarted on timeout
+        @return: exit code and output(stdout and stderr) of command. If command ends
+            interpreter, exit code of interpreter is returned
+        """
+        with self._lock:
+            self.start()
+            self._count += 1
+            sentinel = '__WINUTILS_%s_%d__' % (uuid.uuid4().hex, self._count)
+            script = self.dialect.template % {'cmd': cmd, 'sentinel': sentinel}
+
+            token = get_launcher().begin(cmd)
+            ret = None
+            output = []
+            try:
+                try:
+                    self._process.stdin.write(script.encode(self.encoding))
+                    self._process.stdin.flush()
+                except (IOError, OSError):
+                    self._kill()
+                    raise Exception('Shell host crashed before %s' % cmd)
+
+                while True:
+                    try:
+                        line = self._lines.get(timeout=timeout)
+                    except queue.Empty:
+                        self._kill()
+                        raise Exception('%s timed out after %s seconds' % (cmd, timeout))
+                    if line is None:
+                        # Command ended interpreter, e.g. 'exit 3', it is restarted by next run()
+                        ret = self._process.wait()
+                        logging.debug('Shell host exited with %s during %s', ret, cmd)
+                        break
+
+                    line = line.decode(self.encoding, 'replace')
+                    pos = line.find(sentinel)
+                    if pos < 0:
+                        output.append(line)
+                        continue
+                    output.append(line[:pos])
+                    ret = int(line[pos + len(sentinel):].strip() or 1)
+                    break
+            finally:
+                output = ''.join(output).replace('\r\n', '\n')
+                get_launcher().end(token, ret, len(output))
+
+        return ret, output.rstrip('\n')
+
+    def execute(self, cmd, expected_code=0, timeout=None):
+        """Execute a command as Shell.system() does, return output of command"""
+        logging.debug('Execute command in shell host: %s', cmd)
+        ret, output = self.run(cmd, timeout)
+        if ret != expected_code:
+            desc = '%s failed: %s' % (cmd, output)
+            logging.error(desc)
+            raise Exception(desc)
+        return output
+
+
+# Shared shell hosts, {dialect name: ShellHost}
+_HOSTS = {}
+_HOSTS_LOCK = threading.Lock()
+
+
+def get_host(dialect='powershell'):
+    """Get shell host shared in current process"""
+    with _HOSTS_LOCK:
+        if dialect not in _HOSTS:
+            _HOSTS[dialect] = ShellHost(dialect)
+        return _HOSTS[dialect]
+
+
+def close_hosts():
+    """Stop all shared shell hosts"""
+    with _HOSTS_LOCK:
+        for host in _HOSTS.values():
+            host.close()
+        _HOSTS.clear()
+
+
+atexit.register(close_hosts)
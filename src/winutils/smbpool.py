@@ -0,0 +1,233 @@
+# encoding=utf-8
+r"""
+Process wide pool of SMB sessions.
+
+A session is mounted once with 'net use' and shared by all ShareDrive
+objects of the same server, share and user. Handles are reference counted,
+a session without handles is unmounted after it has been idle for
+idle_timeout seconds, or when the process exits.
+
+'net use' commands go through a runner, so the pool can be tested without SMB:
+
+>>> commands = []
+>>> pool = SessionPool(runner=lambda cmd: commands.append(cmd) or 0, net_cmd='net')
+>>> first = pool.acquire(r'\\server\share\logs')
+>>> second = pool.acquire(r'\\SERVER\share\temp')
+>>> pool.release(first)
+>>> pool.release(second)
+>>> pool.close_idle(idle_timeout=0)
+1
+>>> commands
+['net use  "\\\\server\\share"', 'net use "\\\\server\\share" /delete']
+"""
+from __future__ import absolute_import
+
+import time
+import atexit
+import logging
+import threading
+
+from . import shell
+from .launcher import get_launcher
+
+# Seconds to keep a session without handles mounted
+IDLE_TIMEOUT = 60.0
+
+
+def split_unc(path):
+    r"""
+    Get server and share of UNC path
+    >>> split_unc(r'\\server\share\dir\file.txt')
+    ('server', 'share')
+    """
+    parts = [i for i in path.replace('/', '\\').split('\\') if i]
+    if len(parts) < 2:
+        msg = 'Invalid share drive path: %s' % path
+        logging.error(msg)
+        raise Exception(msg)
+    return parts[0], parts[1]
+
+
+def _system(cmd):
+    """Default runner of 'net use' commands"""
+    return get_launcher().system(cmd)
+
+
+class Session(object):
+    """One mounted share"""
+    def __init__(self, key, target, device):
+        self.key = key
+        self.target = target
+        self.device = device
+        self.refs = 0
+        self.mounted = False
+        self.last_used = time.time()
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return '<Session %s refs=%d mounted=%s>' % (self.target, self.refs, self.mounted)
+
+
+class SessionHandle(object):
+    """Reference to a session returned by SessionPool.acquire()"""
+    def __init__(self, session):
+        self.session = session
+        self.released = False
+
+    @property
+    def target(self):
+        """Mounted path"""
+        return self.session.target
+
+
+class SessionPool(object):
+    """Reference counted SMB sessions keyed by server, share, user and device"""
+    def __init__(self, runner=None, idle_timeout=IDLE_TIMEOUT, net_cmd=None):
+        """
+        @param runner: Function to run a 'net use' command and return exit code,
+            default is Launcher.system()
+        @param idle_timeout: Seconds to keep a session without handles mounted
+        @param net_cmd: Path of net command, default is shell.NET_CMD
+        """
+        self.runner = runner or _system
+        self.idle_timeout = idle_timeout
+        self.net_cmd = net_cmd
+        self.mounts = 0
+        self.reuses = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def _net(self):
+        return str(self.net_cmd or shell.NET_CMD)
+
+    def acquire(self, path, usr=None, pwd=None, device=''):
+        """
+        Get handle of session which mounts the share of path, mount it if it is not mounted.
+        A drive letter device is mapped to path itself, else the share is mounted.
+        @return: SessionHandle, None if share cannot be mounted
+        """
+        server, share = split_unc(path)
+        key = (server.lower(), share.lower(), (usr or '').lower(), device.upper())
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                target = path if device else '\\\\%s\\%s' % (server, share)
+                session = self._sessions[key] = Session(key, target, device)
+            session.refs += 1
+
+        with session.lock:
+            if session.mounted:
+                self.reuses += 1
+                logging.debug('Reuse share drive session %s', session.target)
+            elif not self._mount(session, usr, pwd):
+                with self._lock:
+                    session.refs -= 1
+                    if session.refs == 0 and self._sessions.get(key) is session:
+                        del self._sessions[key]
+                return None
+        return SessionHandle(session)
+
+    def _mount(self, session, usr, pwd):
+        """Run 'net use' to mount session"""
+        if usr:
+            cmd = '%s use %s "%s" /user:%s "%s"' % (
+                self._net(), session.device, session.target, usr, pwd)
+        else:
+            cmd = '%s use %s "%s"' % (self._net(), session.device, session.target)
+        logging.info('Mount share drive(%s)', session.target)
+        ret = self.runner(cmd)
+        if ret != 0:
+            logging.error('Share drive cannot be mounted. Error code %d', ret)
+            return False
+        logging.info('Mounted')
+        session.mounted = True
+        self.mounts += 1
+        return True
+
+    def _unmount(self, session):
+        """Run 'net use /delete' to unmount session"""
+        name = session.device or session.target
+        command = '%s use "%s" /delete' % (self._net(), name)
+        logging.debug('Share drive will be umounted. Command: %s', command)
+        self.runner(command)
+        session.mounted = False
+
+    def release(self, handle):
+        """Release handle, the session is unmounted after it is idle for idle_timeout"""
+        if handle.released:
+            return
+        handle.released = True
+        session = handle.session
+        with self._lock:
+            session.refs -= 1
+            session.last_used = time.time()
+            if session.refs == 0:
+                self._schedule()
+
+    def _schedule(self):
+        """Start timer to close idle sessions, self._lock is held"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.idle_timeout, self.close_idle)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def close_idle(self, idle_timeout=None):
+        """Unmount sessions without handles which are idle for idle_timeout seconds.
+        Return number of unmounted sessions"""
+        idle_timeout = self.idle_timeout if idle_timeout is None else idle_timeout
+        now = time.time()
+        count = 0
+        # Unmount with lock held, so a new session of the same share is not mounted meanwhile
+        with self._lock:
+            for session in list(self._sessions.values()):
+                if session.refs or now - session.last_used < idle_timeout:
+                    continue
+                if session.mounted:
+                    self._unmount(session)
+                    count += 1
+                del self._sessions[session.key]
+            if any(i.refs == 0 for i in self._sessions.values()):
+                self._schedule()
+        return count
+
+    def close_all(self):
+        """Unmount all sessions whether they are used or not"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            for session in self._sessions.values():
+                if session.mounted:
+                    self._unmount(session)
+            self._sessions.clear()
+
+    def sessions(self):
+        """Get list of current sessions"""
+        with self._lock:
+            return list(self._sessions.values())
+
+
+_POOL = SessionPool()
+
+
+def get_pool():
+    """Get session pool used by ShareDrive"""
+    return _POOL
+
+
+def set_pool(pool):
+    """Replace session pool, e.g. use one with a fake runner in test. Return previous pool"""
+    global _POOL
+    old_pool = _POOL
+    _POOL = pool
+    return old_pool
+
+
+def _close_pool():
+    """Unmount sessions of current pool at exit"""
+    _POOL.close_all()
+
+
+atexit.register(_close_pool)
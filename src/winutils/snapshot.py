@@ -0,0 +1,231 @@
+# encoding=utf-8
+"""
+Snapshot of a directory tree and diff of two snapshots.
+
+Directories are listed with scandir on a thread pool, one directory per
+task. A subdirectory is queued as soon as its parent is listed, and the
+latency of a share drive is paid once per directory instead of once per
+path. Queries against a snapshot are answered in memory. A local
+folder can be scanned the same way and compared with a remote one.
+
+>>> import tempfile
+>>> root = tempfile.mkdtemp()
+>>> with open(os.path.join(root, 'a.txt'), 'w') as file_obj:
+...     _ = file_obj.write('a')
+>>> old = scan_tree(root)
+>>> os.mkdir(os.path.join(root, 'logs'))
+>>> os.remove(os.path.join(root, 'a.txt'))
+>>> [(i.change, i.path) for i in diff(old, scan_tree(root))]
+[('removed', 'a.txt'), ('added', 'logs')]
+"""
+from __future__ import absolute_import
+
+import os
+import json
+import time
+import logging
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir # Python 2
+try:
+    import Queue as queue
+except ImportError:
+    import queue # Python 3
+
+from .deleter import FILE_ATTRIBUTE_REPARSE_POINT
+from .exclude import get_matcher
+from .metacache import FILE, DIR, MISSING
+from .sync import replace
+
+# Number of directories listed at the same time
+WORKERS = 8
+
+SNAPSHOT_VERSION = 1
+
+# Changes yielded by diff()
+ADDED = 'added'
+REMOVED = 'removed'
+MODIFIED = 'modified'
+
+# Metadata of one entry, mtime is None for directories
+Entry = namedtuple('Entry', ['kind', 'size', 'mtime'])
+
+# One change between two snapshots, old or new is None if entry is added or removed
+Change = namedtuple('Change', ['change', 'path', 'old', 'new'])
+
+
+def _key(rel_path):
+    """Snapshot key of relative path"""
+    return rel_path.replace('\\', '/').strip('/')
+
+
+class Snapshot(object):
+    """
+    Metadata of all entries under root.
+    entries: {relative path with '/' separator: Entry}
+    """
+    def __init__(self, root, entries=None, created=None):
+        self.root = root
+        self.entries = entries if entries is not None else {}
+        self.created = created or time.time()
+        # List of (directory path, error message) which cannot be listed
+        self.failures = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, path):
+        return _key(path) in self.entries
+
+    def __repr__(self):
+        return '<Snapshot %s entries=%d failures=%d>' % (
+            self.root, len(self.entries), len(self.failures))
+
+    def get(self, path):
+        """Get Entry of relative path, None if it is missing"""
+        return self.entries.get(_key(path))
+
+    def kind(self, path):
+        """Get FILE, DIR or MISSING of relative path"""
+        entry = self.get(path)
+        return entry.kind if entry is not None else MISSING
+
+    def is_file(self, path):
+        """Check whether relative path is a file"""
+        return self.kind(path) == FILE
+
+    def is_dir(self, path):
+        """Check whether relative path is a directory"""
+        return self.kind(path) == DIR
+
+    def exists(self, path):
+        """Check whether relative path exists"""
+        return _key(path) in self.entries
+
+    def listdir(self, path=''):
+        """Get sorted names of entries in directory"""
+        prefix = _key(path)
+        prefix = prefix + '/' if prefix else ''
+        return sorted(key[len(prefix):] for key in self.entries
+                      if key.startswith(prefix) and '/' not in key[len(prefix):])
+
+    def total_size(self):
+        """Get total bytes of files"""
+        return sum(i.size for i in self.entries.values() if i.kind == FILE)
+
+    def save(self, path):
+        """Write snapshot as JSON to a temporary file and rename it"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as file_obj:
+            json.dump({'version': SNAPSHOT_VERSION, 'root': self.root, 'created': self.created,
+                       'entries': dict((k, list(v)) for k, v in self.entries.items())},
+                      file_obj, separators=(',', ':'))
+        replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load snapshot saved by save()"""
+        with open(path, 'r') as file_obj:
+            content = json.load(file_obj)
+        if content.get('version') != SNAPSHOT_VERSION:
+            msg = 'Unsupported snapshot version %s: %s' % (content.get('version'), path)
+            logging.error(msg)
+            raise Exception(msg)
+        entries = dict((k, Entry(*v)) for k, v in content['entries'].items())
+        return cls(content['root'], entries, content['created'])
+
+
+def _list_dir(root, rel_dir):
+    """List one directory in worker thread, return (rel_dir, [(name, Entry, walk)], error).
+    walk is False for links and junctions, they are recorded but not followed"""
+    try:
+        result = []
+        for entry in scandir(os.path.join(root, rel_dir) if rel_dir else root):
+            stat = entry.stat(follow_symlinks=False)
+            link = entry.is_symlink() or \
+                getattr(stat, 'st_file_attributes', 0) & FILE_ATTRIBUTE_REPARSE_POINT
+            if entry.is_dir(follow_symlinks=False):
+                result.append((entry.name, Entry(DIR, 0, None), not link))
+            else:
+                result.append((entry.name, Entry(FILE, stat.st_size, stat.st_mtime), False))
+        return rel_dir, result, None
+    except Exception as err:
+        # Error must be returned to scan_tree(), else it waits for this directory forever
+        return rel_dir, [], str(err)
+
+
+def scan_tree(root, excluded_files=None, workers=None):
+    """
+    Walk directory tree once. A directory is listed as soon as its parent is listed,
+    so a slow directory does not hold up others. Links are not followed.
+    @param excluded_files: ExcludeMatcher or list of exclusion patterns relative to root
+    @param workers: Number of directories listed at the same time
+    @return: Snapshot, directories which cannot be listed are in snapshot.failures
+    """
+    excluded = get_matcher(excluded_files)
+    snapshot = Snapshot(root)
+    start = time.time()
+    results = queue.Queue()
+    pool = ThreadPool(workers or WORKERS)
+    try:
+        pool.apply_async(_list_dir, (root, ''), callback=results.put)
+        pending = 1
+        while pending:
+            rel_dir, entries, err = results.get()
+            pending -= 1
+            if err is not None:
+                logging.error('Cannot list %s: %s', os.path.join(root, rel_dir), err)
+                snapshot.failures.append((os.path.join(root, rel_dir), err))
+                continue
+            for name, entry, walk in entries:
+                rel_path = os.path.join(rel_dir, name) if rel_dir else name
+                if excluded.match(rel_path):
+                    continue
+                snapshot.entries[_key(rel_path)] = entry
+                if walk:
+                    pool.apply_async(_list_dir, (root, rel_path), callback=results.put)
+                    pending += 1
+    finally:
+        pool.close()
+        pool.join()
+    logging.info('Scanned %s in %.3fs: %s', root, time.time() - start, snapshot)
+    return snapshot
+
+
+def _changed(old, new, mtime_tolerance):
+    """Check whether entry is modified, mtime of directories is not compared"""
+    if old.kind != new.kind:
+        return True
+    if old.kind == DIR:
+        return False
+    return old.size != new.size or abs(old.mtime - new.mtime) > mtime_tolerance
+
+
+def diff(old, new, mtime_tolerance=0.0):
+    """
+    Compare two snapshots, yield Change in the order of paths
+    @param mtime_tolerance: Seconds of mtime difference which is ignored,
+        e.g. 2 if one side is a FAT file system
+    """
+    old_keys = sorted(old.entries)
+    new_keys = sorted(new.entries)
+    i = j = 0
+    while i < len(old_keys) or j < len(new_keys):
+        if j == len(new_keys) or (i < len(old_keys) and old_keys[i] < new_keys[j]):
+            key = old_keys[i]
+            yield Change(REMOVED, key, old.entries[key], None)
+            i += 1
+        elif i == len(old_keys) or new_keys[j] < old_keys[i]:
+            key = new_keys[j]
+            yield Change(ADDED, key, None, new.entries[key])
+            j += 1
+        else:
+            key = old_keys[i]
+            old_entry, new_entry = old.entries[key], new.entries[key]
+            if _changed(old_entry, new_entry, mtime_tolerance):
+                yield Change(MODIFIED, key, old_entry, new_entry)
+            i += 1
+            j += 1
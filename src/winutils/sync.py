@@ -0,0 +1,225 @@
+# encoding=utf-8
+"""
+Incremental directory sync based on a manifest.
+
+The manifest records relative path, size, mtime and optionally content hash
+of every file copied to destination. Next sync only compares metadata of
+source files with the manifest, then copies added/changed files.
+"""
+from __future__ import absolute_import, division
+
+import os
+import json
+import time
+import logging
+from functools import partial
+from multiprocessing.pool import ThreadPool
+
+from .archive import makedirs
+from .copier import copy_file, copy_file_digest, file_digest, iter_tree, WORKERS
+from .verify import Verifier
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = '.manifest'
+
+
+class SyncStats(object):
+    """Result of sync_tree()"""
+    def __init__(self):
+        self.added = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.skipped = 0
+        self.verified = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        # List of (path, error message)
+        self.failures = []
+
+    def __repr__(self):
+        return '<SyncStats added=%d updated=%d unchanged=%d deleted=%d bytes=%d ' \
+               'verified=%d failures=%d elapsed=%.3fs>' % (
+                   self.added, self.updated, self.unchanged, self.deleted, self.bytes,
+                   self.verified, len(self.failures), self.elapsed)
+
+
+def manifest_path(dest):
+    """Get default manifest path of destination, it is stored next to destination"""
+    return os.path.normpath(dest) + MANIFEST_SUFFIX
+
+
+class Manifest(object):
+    """
+    Metadata of files in destination.
+    files: {relative path with '/' separator: [size, mtime, hex digest or None]}
+    """
+    def __init__(self, path, algorithm=None):
+        self.path = path
+        self.algorithm = algorithm
+        self.files = {}
+
+    @classmethod
+    def load(cls, path, algorithm=None):
+        """Load manifest, an empty one is returned if file is missing or invalid"""
+        manifest = cls(path, algorithm)
+        if not os.path.isfile(path):
+            return manifest
+        try:
+            with open(path, 'r') as file_obj:
+                content = json.load(file_obj)
+        except (IOError, OSError, ValueError) as err:
+            logging.warning('Ignore invalid manifest %s: %s', path, err)
+            return manifest
+
+        if content.get('version') != MANIFEST_VERSION:
+            logging.warning('Ignore manifest %s of version %s', path, content.get('version'))
+            return manifest
+        # Digests of another algorithm cannot be compared
+        if algorithm is None or content.get('algorithm') == algorithm:
+            manifest.algorithm = content.get('algorithm')
+            manifest.files = content.get('files', {})
+        else:
+            manifest.files = dict((k, v[:2] + [None]) for k, v in content.get('files', {}).items())
+        return manifest
+
+    def save(self):
+        """Write manifest to a temporary file and rename it"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file_obj:
+            json.dump({'version': MANIFEST_VERSION, 'algorithm': self.algorithm,
+                       'files': self.files}, file_obj, separators=(',', ':'))
+        replace(tmp_path, self.path)
+
+
+def replace(src, dest):
+    """Rename file and overwrite destination"""
+    if hasattr(os, 'replace'):
+        os.replace(src, dest)
+    else:
+        # Python 2 on Windows cannot rename to an existing file
+        if os.name == 'nt' and os.path.exists(dest):
+            os.remove(dest)
+        os.rename(src, dest)
+
+
+def _key(rel_path):
+    """Manifest key of relative path"""
+    return rel_path.replace(os.sep, '/')
+
+
+def _copy_item(algorithm, item):
+    """Copy one file in worker thread, return (key, destination, size, digest, error).
+    Digest is computed while file is copied if algorithm is set"""
+    key, src_path, dest_path = item
+    try:
+        makedirs(os.path.dirname(dest_path))
+        if algorithm:
+            size, digest = copy_file_digest(src_path, dest_path, algorithm)
+            return key, dest_path, size, digest, None
+        return key, dest_path, copy_file(src_path, dest_path), None, None
+    except (IOError, OSError) as err:
+        return key, dest_path, 0, None, str(err)
+
+
+def sync_tree(src, dest, excluded_files=None, delete=False, algorithm=None,
+              manifest_file=None, workers=None, verify=None):
+    """
+    Copy only files which are added or changed since last sync.
+    @param excluded_files: ExcludeMatcher or list of exclusion patterns relative to src
+    @param delete: Delete files from dest which are removed from src
+    @param algorithm: Hash algorithm like 'sha1'. If it is set, a file whose mtime
+        changed but content did not change is not copied again
+    @param manifest_file: Manifest path, default is dest + '.manifest'
+    @param verify: Hash algorithm to verify copied files, see copier.copytree().
+        It is also used as algorithm if algorithm is not set
+    @return: SyncStats
+    """
+    algorithm = algorithm or verify
+    stats = SyncStats()
+    start = time.time()
+    manifest = Manifest.load(manifest_file or manifest_path(dest), algorithm)
+    old_files = manifest.files
+    new_files = {}
+    logging.info('Sync %s to %s, %d files in manifest', src, dest, len(old_files))
+
+    # Compare metadata of source files with manifest
+    items = []
+    makedirs(dest)
+    for rel_path, entry in iter_tree(src, excluded_files, stats):
+        if entry.is_dir():
+            continue
+        key = _key(rel_path)
+        stat = entry.stat()
+        record = [stat.st_size, stat.st_mtime, None]
+        old = old_files.get(key)
+        if old is not None and old[0] == record[0]:
+            if old[1] == record[1]:
+                new_files[key] = old
+                stats.unchanged += 1
+                continue
+            if algorithm and old[2]:
+                record[2] = file_digest(entry.path, algorithm)
+                if record[2] == old[2]:
+                    new_files[key] = record
+                    stats.unchanged += 1
+                    continue
+        # Digest of added files is computed while they are copied
+        new_files[key] = record
+        items.append((key, entry.path, os.path.join(dest, rel_path)))
+
+    # Copy added and changed files
+    verifier = Verifier(algorithm) if verify else None
+    pool = ThreadPool(workers or WORKERS)
+    try:
+        for key, dest_path, size, digest, err in pool.imap_unordered(
+                partial(_copy_item, algorithm), items):
+            if err is not None:
+                logging.error('Failed to copy %s: %s', key, err)
+                stats.failures.append((key, err))
+                # Invalid size makes it copied again next time
+                new_files[key] = [-1, 0, None]
+                continue
+            if digest is not None:
+                new_files[key][2] = digest
+            if verifier is not None:
+                verifier.submit(dest_path, digest, key)
+            if key in old_files:
+                stats.updated += 1
+            else:
+                stats.added += 1
+            stats.bytes += size
+    finally:
+        pool.close()
+        pool.join()
+        if verifier is not None:
+            verifier.join()
+
+    if verifier is not None:
+        stats.verified = verifier.verified
+        stats.failures.extend(verifier.failures)
+        for key in verifier.failed_keys:
+            new_files[key] = [-1, 0, None]
+
+    # Delete files which are removed from source
+    for key in set(old_files) - set(new_files):
+        if not delete:
+            new_files[key] = old_files[key]
+            continue
+        path = os.path.join(dest, *key.split('/'))
+        try:
+            if os.path.isfile(path):
+                os.remove(path)
+            stats.deleted += 1
+        except OSError as err:
+            logging.error('Failed to delete %s: %s', path, err)
+            stats.failures.append((key, str(err)))
+            new_files[key] = old_files[key]
+
+    manifest.algorithm = algorithm or manifest.algorithm
+    manifest.files = new_files
+    manifest.save()
+
+    stats.elapsed = time.time() - start
+    logging.info('Synced %s: %s', src, stats)
+    return stats
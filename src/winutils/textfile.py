@@ -0,0 +1,181 @@
+# encoding=utf-8
+"""
+Detect encoding of text files and decode them as a stream.
+
+Detection checks BOM first, then samples a few chunks spread over the file
+within a byte budget. Results are cached by path, size and mtime, so reading
+the same log again does not sample it again.
+"""
+from __future__ import absolute_import
+
+import io
+import os
+import codecs
+import logging
+import threading
+from collections import OrderedDict
+try:
+    import chardet
+except ImportError:
+    chardet = None
+
+# Bytes sampled to detect encoding, split into SAMPLE_CHUNKS chunks
+SAMPLE_SIZE = 64 * 1024
+SAMPLE_CHUNKS = 4
+
+# Buffer size of decoder, large buffers decode UTF-16 logs much faster
+BUFFER_SIZE = 1024 * 1024
+
+# Max number of detected encodings to remember
+CACHE_SIZE = 256
+
+# UTF-32 BOM must be checked before UTF-16 BOM which is its prefix
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _bom_encoding(head):
+    """Get encoding from BOM, None if there is no BOM"""
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    return None
+
+
+def _sample(file_obj, size, budget, chunks):
+    """Read chunks at even offsets spread over the file, the first one starts at 0"""
+    chunk_size = max(4, budget // chunks)
+    if size <= budget:
+        return [file_obj.read()]
+    result = []
+    step = (size - chunk_size) // (chunks - 1) if chunks > 1 else 0
+    for index in range(chunks):
+        # Keep UTF-16/32 code units aligned
+        file_obj.seek(index * step & ~3)
+        result.append(file_obj.read(chunk_size))
+    return result
+
+
+def _utf16_encoding(data):
+    """Guess byte order of UTF-16 without BOM from zero bytes of ASCII characters"""
+    if len(data) < 4:
+        return None
+    half = len(data) // 2
+    even = data[0::2].count(b'\x00')
+    odd = data[1::2].count(b'\x00')
+    if odd > half * 0.4 and even < half * 0.05:
+        return 'utf-16-le'
+    if even > half * 0.4 and odd < half * 0.05:
+        return 'utf-16-be'
+    return None
+
+
+def _is_utf8(data, first):
+    """Check whether chunk is valid UTF-8, chunk may start or end in a character"""
+    if not first:
+        # Skip continuation bytes of a character started before the chunk
+        index = 0
+        while index < min(3, len(data)) and 0x80 <= bytearray(data[index:index + 1])[0] < 0xC0:
+            index += 1
+        data = data[index:]
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _detect(chunks):
+    """Detect encoding of sampled chunks without BOM"""
+    data = b''.join(chunks)
+    encoding = _utf16_encoding(data)
+    if encoding:
+        return encoding
+    if b'\x00' not in data:
+        try:
+            data.decode('ascii')
+            # ASCII sample, UTF-8 also decodes the rest of file if it is not ASCII
+            return 'utf-8'
+        except UnicodeDecodeError:
+            pass
+        if all(_is_utf8(chunk, index == 0) for index, chunk in enumerate(chunks)):
+            return 'utf-8'
+    if chardet is None:
+        return None
+    encoding = chardet.detect(data)['encoding']
+    if not encoding:
+        return None
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        return None
+
+
+def detect_encoding(file_path, sample_size=None, use_cache=True):
+    """
+    Detect encoding of text file.
+    @param sample_size: Max bytes to read, default is SAMPLE_SIZE
+    @param use_cache: Reuse encoding detected for the same path, size and mtime
+    @return: Encoding name which can be passed to io.open(), None if it is unknown
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime)
+    if use_cache:
+        with _cache_lock:
+            if key in _cache:
+                return _cache[key]
+
+    with open(file_path, 'rb') as file_obj:
+        head = file_obj.read(4)
+        encoding = _bom_encoding(head)
+        if encoding is None:
+            file_obj.seek(0)
+            chunks = _sample(file_obj, stat.st_size, sample_size or SAMPLE_SIZE, SAMPLE_CHUNKS)
+            encoding = _detect(chunks)
+    logging.debug('Encoding of %s: %s', file_path, encoding)
+
+    with _cache_lock:
+        _cache[key] = encoding
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return encoding
+
+
+def clear_cache():
+    """Forget detected encodings"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def open_text(file_path, encoding=None, errors='strict', buffer_size=BUFFER_SIZE):
+    """
+    Open text file with detected encoding.
+    Content is decoded incrementally, lines are read without loading the whole file.
+    @return: Text file object, None if encoding cannot be detected
+    """
+    encoding = encoding or detect_encoding(file_path)
+    if encoding is None:
+        logging.error('Cannot detect encoding of %s', file_path)
+        return None
+    return io.open(file_path, 'r', encoding=encoding, errors=errors, buffering=buffer_size)
+
+
+def iter_lines(file_path, encoding=None, errors='replace', buffer_size=BUFFER_SIZE):
+    """
+    Yield decoded lines of text file, line endings are translated to '\\n'.
+    @param errors: How to handle bytes invalid in the encoding, see codecs
+    """
+    file_obj = open_text(file_path, encoding, errors, buffer_size)
+    if file_obj is None:
+        raise Exception('Cannot detect encoding of %s' % file_path)
+    with file_obj:
+        for line in file_obj:
+            yield line
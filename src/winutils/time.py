@@ -3,7 +3,8 @@
 Define date time related funcitons
 """
 import re
-import subprocess
+
+from .launcher import get_launcher
 
 class Timezone(object):
     """Define class to store timezone settings"""
@@ -16,7 +17,7 @@ class Timezone(object):
     def list_timezone(cls):
         """Lists all valid time zone IDs and display names"""
         cmd = 'tzutil /l'
-        cmd_output = subprocess.check_output(cmd)
+        cmd_output = get_launcher().check_output(cmd)
 
         name_pattern = \
             re.compile(r'\((?P<utc_offset>UTC[\+\-]\d{2}:\d{2})\)\s+(?P<display_name>.*)')
@@ -37,18 +38,18 @@ class Timezone(object):
     @staticmethod
     def current_tz_id():
         """Get current timezone ID"""
-        return subprocess.check_output('tzutil /g').strip()
+        return get_launcher().check_output('tzutil /g').strip()
 
     @staticmethod
     def set_timezone(timezone_id):
         """Set timezone to specified value"""
-        return subprocess.check_call('tzutil /s "%s"' % timezone_id) == 0
+        return get_launcher().check_call('tzutil /s "%s"' % timezone_id) == 0
 
 
 def set_date(year, month, day):
     """Set date of current OS using date command"""
     set_cmd = 'date %s/%s/%s' % (month, day, year)
-    return subprocess.check_call(set_cmd, shell=True) == 0
+    return get_launcher().check_call(set_cmd, shell=True) == 0
 
 
 if __name__ == '__main__':
@@ -56,4 +57,4 @@ if __name__ == '__main__':
     #     print tz.utc_offset
     #     print tz.display_name
     #     print tz.time_zone_id
-    print Timezone.current_tz_id()
+    print(Timezone.current_tz_id())
@@ -0,0 +1,136 @@
+# encoding=utf-8
+"""
+Transfer many files on a thread pool.
+Small files are dominated by latency of share drive, so several files are
+kept in flight at the same time. Each thread reuses its own copy buffer.
+"""
+from __future__ import absolute_import, division
+
+import os
+import glob
+import time
+import logging
+from multiprocessing.pool import ThreadPool
+
+from .archive import makedirs
+from .copier import copy_file, iter_tree
+
+# Number of files in flight
+WORKERS = 8
+
+_GLOB_CHARS = ('*', '?', '[')
+
+
+class TransferStats(object):
+    """Progress and result of transfer_many(), it is passed to progress callback"""
+    def __init__(self, total=0):
+        self.total = total
+        self.files = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        # List of (path, error message)
+        self.failures = []
+        self._start = time.time()
+
+    @property
+    def done(self):
+        """Number of files transferred or failed"""
+        return self.files + len(self.failures)
+
+    @property
+    def throughput(self):
+        """Bytes per second"""
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def update(self):
+        """Update elapsed time"""
+        self.elapsed = time.time() - self._start
+
+    def __repr__(self):
+        return '<TransferStats files=%d/%d bytes=%d failures=%d elapsed=%.3fs %.1f MB/s>' % (
+            self.files, self.total, self.bytes, len(self.failures), self.elapsed,
+            self.throughput / 1024 / 1024)
+
+
+def expand(paths, stats=None):
+    """
+    Expand paths and glob patterns to files.
+    A directory is expanded to files under it, their relative paths start with directory name.
+    @param stats: Missing paths are added to stats.failures
+    @return: List of (file path, relative destination path)
+    """
+    items = []
+    for path in paths:
+        if any(i in path for i in _GLOB_CHARS):
+            matches = sorted(glob.glob(path))
+        else:
+            matches = [path]
+        for match in matches:
+            name = os.path.basename(os.path.normpath(match))
+            if os.path.isdir(match):
+                for rel_path, entry in iter_tree(match, stats=stats):
+                    if not entry.is_dir():
+                        items.append((entry.path, os.path.join(name, rel_path)))
+            elif os.path.isfile(match):
+                items.append((match, name))
+            elif stats is not None:
+                logging.error('Cannot find file: %s', match)
+                stats.failures.append((match, 'Cannot find file'))
+    return items
+
+
+def transfer_many(items, workers=None, callback=None, copy_func=None):
+    """
+    Copy files on a thread pool, a failed file does not stop others.
+    @param items: List of (source file, destination file)
+    @param workers: Number of files in flight
+    @param callback: Function called with TransferStats after each file
+    @param copy_func: Function to copy a file and return bytes copied, default is copy_file
+    @return: TransferStats
+    """
+    return _transfer(items, TransferStats(len(items)), workers, callback, copy_func)
+
+
+def _transfer(items, stats, workers, callback, copy_func):
+    """Copy items and update stats"""
+    copy_func = copy_func or copy_file
+
+    def copy_item(item):
+        src, dest = item
+        try:
+            makedirs(os.path.dirname(os.path.abspath(dest)))
+            return src, copy_func(src, dest), None
+        except Exception as err:
+            # A failed file must not abort others
+            return src, 0, str(err) or err.__class__.__name__
+
+    pool = ThreadPool(workers or WORKERS)
+    try:
+        for src, size, err in pool.imap_unordered(copy_item, items):
+            if err is not None:
+                logging.error('Failed to transfer %s: %s', src, err)
+                stats.failures.append((src, err))
+            else:
+                stats.files += 1
+                stats.bytes += size
+            stats.update()
+            if callback is not None:
+                callback(stats)
+    finally:
+        pool.close()
+        pool.join()
+
+    stats.update()
+    logging.info('Transferred %d files: %s', stats.total, stats)
+    return stats
+
+
+def transfer_paths(paths, dest_dir, workers=None, callback=None, copy_func=None):
+    """
+    Copy files, directories and glob matches into dest_dir.
+    @return: TransferStats, missing paths are listed in stats.failures
+    """
+    stats = TransferStats()
+    items = [(src, os.path.join(dest_dir, rel_path)) for src, rel_path in expand(paths, stats)]
+    stats.total = len(items) + len(stats.failures)
+    return _transfer(items, stats, workers, callback, copy_func)
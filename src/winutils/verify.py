@@ -0,0 +1,68 @@
+# encoding=utf-8
+"""
+Verify copied files against digests computed while they were copied.
+Destination files are hashed on a separate thread pool, so verification
+overlaps with the copy of other files.
+"""
+from __future__ import absolute_import
+
+import logging
+from multiprocessing.pool import ThreadPool
+
+from .copier import file_digest
+
+# Number of threads to hash destination files
+WORKERS = 2
+
+
+class Verifier(object):
+    """Hash destination files in background and compare them with expected digests"""
+    def __init__(self, algorithm='sha1', workers=None):
+        self.algorithm = algorithm
+        self.verified = 0
+        # List of (path, error message)
+        self.failures = []
+        # Keys of failed files passed to submit()
+        self.failed_keys = []
+        self._pool = ThreadPool(workers or WORKERS)
+
+    def _verify(self, item):
+        """Hash one file in worker thread, return (path, key, error)"""
+        path, expected, key = item
+        try:
+            actual = file_digest(path, self.algorithm)
+        except (IOError, OSError) as err:
+            return path, key, str(err)
+        if actual != expected:
+            return path, key, 'Digest mismatch, expected %s but got %s' % (expected, actual)
+        return path, key, None
+
+    def _done(self, result):
+        """Record result, it is called in result handler thread of pool"""
+        path, key, err = result
+        if err is None:
+            self.verified += 1
+            return
+        logging.error('Failed to verify %s: %s', path, err)
+        self.failures.append((path, err))
+        self.failed_keys.append(key)
+
+    def submit(self, path, expected, key=None):
+        """Queue file to verify, return immediately"""
+        self._pool.apply_async(self._verify, ((path, expected, key),), callback=self._done)
+
+    def join(self):
+        """Wait for all queued files, return failures"""
+        self._pool.close()
+        self._pool.join()
+        return self.failures
+
+
+def verify_file(path, expected, algorithm='sha1'):
+    """Check digest of file, raise Exception if it does not match"""
+    actual = file_digest(path, algorithm)
+    if actual != expected:
+        msg = 'Failed to verify %s, expected %s digest %s but got %s' % (
+            path, algorithm, expected, actual)
+        logging.error(msg)
+        raise Exception(msg)
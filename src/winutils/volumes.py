@@ -0,0 +1,232 @@
+# encoding=utf-8
+r"""
+Inventory of removable disks.
+
+The disk list is read from a provider and cached. It is read again when the
+provider reports a change, or when the cache is older than the TTL.
+Win32Provider reports a change when the bitmask of drive letters changes,
+which costs one API call instead of a wmic process. Waiting for a disk lists
+disks again every POLL_INTERVAL as well, because a card reader keeps its drive
+letter when its media is ejected.
+Use MemoryVolumes to test code depending on removable disks on non-Windows OS:
+
+>>> volumes = MemoryVolumes(['E:'])
+>>> inventory = VolumeInventory(volumes)
+>>> inventory.removable()
+['E:']
+>>> volumes.remove('E:')
+>>> inventory.wait_for_removal('E:', timeout=1)
+True
+"""
+from __future__ import absolute_import
+
+import re
+import time
+import shlex
+import threading
+try:
+    import ctypes
+except ImportError:
+    ctypes = None
+
+from .launcher import get_launcher
+
+# Seconds to keep disk list when provider does not report a change
+DEFAULT_TTL = 2.0
+
+# Seconds between change checks when provider cannot notify changes
+POLL_INTERVAL = 0.1
+
+DRIVE_REMOVABLE = 2
+SEM_FAILCRITICALERRORS = 0x1
+
+
+class VolumeProvider(object):
+    """Interface of removable disk provider"""
+    def list_removable(self):
+        """Get sorted names of removable disks with media, like ['D:', 'E:']"""
+        raise NotImplementedError
+
+    def change_token(self):
+        """Get a cheap value which changes when disks may have changed, None if not supported"""
+        return None
+
+    def wait_change(self, token, timeout):
+        """Wait until change_token() is different from token or timeout,
+        return True if it changed. Provider without change token sleeps until timeout"""
+        deadline = time.time() + timeout
+        while True:
+            if token is not None and self.change_token() != token:
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+
+class WmicProvider(VolumeProvider):
+    """List removable disks with wmic, a process is started for each list"""
+    def list_removable(self):
+        cmd = 'wmic logicaldisk where "DriveType=2 and Size<>null" get DeviceID'
+        output = get_launcher().check_output(shlex.split(cmd))
+        if isinstance(output, bytes):
+            # wmic writes UTF-16 to a pipe on some Windows versions
+            output = output.decode('utf-16' if b'\x00' in output else 'ascii', 'replace')
+        return sorted(re.findall(r'[A-Z]:', output))
+
+
+class Win32Provider(VolumeProvider):
+    """List removable disks with Win32 API in process"""
+    def __init__(self):
+        if ctypes is None or not hasattr(ctypes, 'windll'):
+            raise Exception('Win32 API is not available on this OS')
+        self._kernel32 = ctypes.windll.kernel32
+
+    def change_token(self):
+        return self._kernel32.GetLogicalDrives()
+
+    def list_removable(self):
+        mask = self._kernel32.GetLogicalDrives()
+        disks = []
+        # Do not show a dialog for a card reader without media
+        old_mode = self._kernel32.SetErrorMode(SEM_FAILCRITICALERRORS)
+        try:
+            for index in range(26):
+                if not mask & 1 << index:
+                    continue
+                root = u'%s:\\' % chr(ord('A') + index)
+                if self._kernel32.GetDriveTypeW(root) != DRIVE_REMOVABLE:
+                    continue
+                # Size is not available if there is no media
+                if self._kernel32.GetDiskFreeSpaceExW(root, None, None, None):
+                    disks.append(root[:2])
+        finally:
+            self._kernel32.SetErrorMode(old_mode)
+        return disks
+
+
+class MemoryVolumes(VolumeProvider):
+    """Removable disks stored in memory, changes are notified to waiting threads at once"""
+    def __init__(self, disks=None):
+        self.disks = set(disks or [])
+        self._version = 0
+        self._cond = threading.Condition()
+
+    def add(self, disk):
+        """Plug a disk"""
+        with self._cond:
+            self.disks.add(disk)
+            self._version += 1
+            self._cond.notify_all()
+
+    def remove(self, disk):
+        """Unplug a disk"""
+        with self._cond:
+            self.disks.discard(disk)
+            self._version += 1
+            self._cond.notify_all()
+
+    def list_removable(self):
+        with self._cond:
+            return sorted(self.disks)
+
+    def change_token(self):
+        return self._version
+
+    def wait_change(self, token, timeout):
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._version == token:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+
+class VolumeInventory(object):
+    """Cached list of removable disks"""
+    def __init__(self, provider, ttl=DEFAULT_TTL):
+        """
+        @param provider: VolumeProvider
+        @param ttl: Seconds to keep disk list if provider does not report a change
+        """
+        self.provider = provider
+        self.ttl = ttl
+        self.refresh_count = 0
+        self._disks = None
+        self._token = None
+        self._time = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Read disk list again on next call"""
+        with self._lock:
+            self._disks = None
+
+    def removable(self, refresh=False):
+        """Get names of removable disks with media, like ['D:', 'E:']"""
+        token = self.provider.change_token()
+        with self._lock:
+            if refresh or self._disks is None or token != self._token or \
+                    time.time() - self._time >= self.ttl:
+                self._disks = self.provider.list_removable()
+                self._token = token
+                self._time = time.time()
+                self.refresh_count += 1
+            return list(self._disks)
+
+    def _wait(self, condition, timeout):
+        """Wait until condition(disks) returns a true value, return it or None on timeout"""
+        deadline = time.time() + timeout
+        while True:
+            token = self.provider.change_token()
+            # List disks each time, media can be ejected while its drive letter stays
+            result = condition(self.removable(refresh=True))
+            if result:
+                return result
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            self.provider.wait_change(token, min(POLL_INTERVAL, remaining))
+
+    def wait_for_removal(self, disk, timeout=10):
+        """Wait until disk is removed, return False on timeout"""
+        disk = disk[:2].upper()
+        return self._wait(lambda disks: disk not in disks, timeout) is not None
+
+    def wait_for_arrival(self, timeout=10, known=None):
+        """
+        Wait until a new removable disk arrives.
+        @param known: Disks present before, default is current disks
+        @return: List of new disks, empty list on timeout
+        """
+        known = set(self.removable(refresh=True) if known is None else known)
+        return self._wait(lambda disks: [i for i in disks if i not in known], timeout) or []
+
+
+def _default_provider():
+    """Win32 API on Windows, empty memory provider on other OS"""
+    if ctypes is not None and hasattr(ctypes, 'windll'):
+        return Win32Provider()
+    return MemoryVolumes()
+
+
+_INVENTORY = None
+
+
+def get_inventory():
+    """Get default volume inventory"""
+    global _INVENTORY
+    if _INVENTORY is None:
+        _INVENTORY = VolumeInventory(_default_provider())
+    return _INVENTORY
+
+
+def set_inventory(inventory):
+    """Replace default volume inventory, e.g. use one with MemoryVolumes in test.
+    Return previous inventory"""
+    global _INVENTORY
+    old_inventory = _INVENTORY
+    _INVENTORY = inventory
+    return old_inventory
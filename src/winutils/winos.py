@@ -4,40 +4,89 @@ Define functions to read OS attrubites.
 """
 import os
 import re
+import struct
 import logging
-import subprocess
+import platform
 from collections import namedtuple
 
+from .launcher import get_launcher
+
 
 WinLicenseStatus = namedtuple('LicenseStatus',
                               ['activated', 'expired', 'remaing_minutes', 'remaing_rearm_count'])
 
 
-def get_long_bit():
+# Cached result of get_long_bit()
+_LONG_BIT = None
+
+
+def get_long_bit(refresh=False):
     """
     Check whether this system is 32bit or 64 bit system
+    The result is detected in process and cached. WMIC is only used
+    when neither environment variables nor interpreter can tell it.
+    @param refresh: Detect OS bit again instead of using cached value
     @return:
         32 if OS is 32 bit.
         64 is OS is 64 bit.
     """
-    out = os.popen("wmic cpu get addresswidth|more +1")
+    global _LONG_BIT
+    if _LONG_BIT is None or refresh:
+        bit = _detect_long_bit()
+        if bit is None:
+            bit = _wmic_long_bit()
+        logging.debug('OS bit: %s', bit)
+        _LONG_BIT = bit
+    return _LONG_BIT
+
+
+def _detect_long_bit():
+    """
+    Detect OS bit without launching any process
+    @return: "32", "64" or None if it cannot be detected
+    """
+    # PROCESSOR_ARCHITEW6432 is only set for 32 bit process running on 64 bit OS
+    if os.environ.get('PROCESSOR_ARCHITEW6432'):
+        return "64"
+
+    arch = os.environ.get('PROCESSOR_ARCHITECTURE', '').upper()
+    if arch in ('AMD64', 'ARM64', 'IA64'):
+        return "64"
+    if arch == 'X86':
+        return "32"
+
+    # 64 bit interpreter can only run on 64 bit OS
+    if struct.calcsize('P') == 8:
+        return "64"
+
+    machine = platform.machine().upper()
+    if machine.endswith('64'):
+        return "64"
+    if machine in ('X86', 'I386', 'I686'):
+        return "32"
+
+    return None
+
+
+def _wmic_long_bit():
+    """Get OS bit from output of WMIC command"""
+    out = get_launcher().popen_read("wmic cpu get addresswidth|more +1")
     bit = "32"
-    for line in out.readlines():
+    for line in out.splitlines():
         logging.debug('WMIC output: %s', line)
         if line.strip() != "":
             bit = line.strip()
             break
-    logging.debug('OS bit: %s', bit)
     return bit
 
 
 def reboot(timeout=0):
     """Reboot OS"""
-    os.system('shutdown -r -t %d' % timeout)
+    get_launcher().system('shutdown -r -t %d' % timeout)
 
 def shutdown(timeout=0):
     """Shutdown OS"""
-    os.system('shutdown -s -t %d' % timeout)
+    get_launcher().system('shutdown -s -t %d' % timeout)
 
 
 def get_license_status(sut):
@@ -51,7 +100,7 @@ def get_license_status(sut):
     dlv_cmd = r'cscript c:\Windows\System32\slmgr.vbs -dlv //nologo'
 
     # Execute slmgr.vbs -dli command to check lincense status
-    cmd_output = subprocess.check_output(dli_cmd)
+    cmd_output = get_launcher().check_output(dli_cmd)
     logging.debug('>' + dli_cmd)
     if 'grace time expired' in cmd_output:
         is_expired = True
@@ -69,7 +118,7 @@ def get_license_status(sut):
         return None
 
     # Execute slmgr.vbs -dlv command to get Remaining Windows rearm count
-    dlv_output = subprocess.check_output(dlv_cmd)
+    dlv_output = get_launcher().check_output(dlv_cmd)
     logging.debug('>' + dli_cmd)
     logging.debug(sut.dlv_output)
 
@@ -87,4 +136,4 @@ def get_license_status(sut):
 def rearm_windows():
     """Rearm Windows License"""
     rearm_cmd = r'cscript c:\Windows\System32\slmgr.vbs -rearm //nologo'
-    return subprocess.check_call(rearm_cmd) == 0
+    return get_launcher().check_call(rearm_cmd) == 0
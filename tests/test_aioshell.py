@@ -0,0 +1,62 @@
+# encoding=utf-8
+import os
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 7), reason='asyncio.run is required')
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='cmd.exe echo prints quotes')
+def test_shell_command_keeps_quotes():
+    from winutils.aioshell import system_many
+    assert system_many(['echo "a  b"']) == [(b'a  b\n', b'')]
+
+
+def test_system_many_in_running_loop():
+    import asyncio
+    from winutils.aioshell import system_many, gather
+
+    async def main():
+        with pytest.raises(Exception, match='await gather'):
+            system_many(['echo 1'])
+        return await gather(['echo 2'])
+
+    assert asyncio.run(main()) == [(b'2\n', b'')]
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX shell is required')
+def test_failed_command_kills_siblings(tmp_path):
+    import time
+    import warnings
+    from winutils.aioshell import system_many
+    from winutils.launcher import Launcher, set_launcher
+
+    pid_file = str(tmp_path / 'pid')
+    marker = str(tmp_path / 'marker')
+    launcher = Launcher()
+    old_launcher = set_launcher(launcher)
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            with pytest.raises(Exception, match='failed'):
+                system_many(['sleep 0.5; false',
+                             'sleep 30 & echo $! > %s; wait; touch %s' % (pid_file, marker)])
+    finally:
+        set_launcher(old_launcher)
+
+    with open(pid_file) as file_obj:
+        pid = int(file_obj.read())
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            os.kill(pid, 0)
+        except OSError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail('Process of cancelled command is still running')
+    assert not os.path.exists(marker)
+    # Both commands are recorded, including the cancelled one
+    assert launcher.stats['sleep'].count == 2
+    assert not [i for i in caught if 'Event loop is closed' in str(i.message)]
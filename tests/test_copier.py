@@ -0,0 +1,29 @@
+# encoding=utf-8
+import os
+
+import pytest
+
+from winutils.copier import copy_file, _kernel_copy
+
+
+def test_copy_file(tmp_path):
+    src = tmp_path / 'src.bin'
+    src.write_bytes(os.urandom(300000))
+    assert copy_file(str(src), str(tmp_path / 'dest.bin')) == 300000
+    assert (tmp_path / 'dest.bin').read_bytes() == src.read_bytes()
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason='procfs is required')
+def test_copy_file_of_zero_size_with_content(tmp_path):
+    size = copy_file('/proc/self/status', str(tmp_path / 'status'))
+    assert size > 0
+    assert os.path.getsize(str(tmp_path / 'status')) == size
+
+
+def test_kernel_copy_stops_early(tmp_path):
+    src = tmp_path / 'src.bin'
+    src.write_bytes(b'x' * 1000)
+    with open(str(src), 'rb') as src_obj, open(str(tmp_path / 'dest.bin'), 'wb') as dst:
+        # Size is larger than file, short copy must not be reported as success
+        assert not _kernel_copy(src_obj, dst, 2000)
+        assert src_obj.tell() == dst.tell() in (0, 1000)
@@ -0,0 +1,63 @@
+# encoding=utf-8
+import os
+
+from winutils.deleter import delete_tree
+
+
+def _make_tree(root):
+    for rel_path in ['a.txt', 'sub/b.txt', 'sub/deep/c.log', 'sub/deep/d.txt']:
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * 10)
+    (root / 'empty').mkdir()
+
+
+def test_delete_tree(tmp_path):
+    root = tmp_path / 'root'
+    _make_tree(root)
+    stats = delete_tree(str(root), workers=2)
+    assert not root.exists()
+    assert (stats.files, stats.dirs, stats.bytes) == (4, 4, 40)
+    assert not stats.failures
+
+
+def test_dry_run_keeps_files(tmp_path):
+    root = tmp_path / 'root'
+    _make_tree(root)
+    stats = delete_tree(str(root), dry_run=True)
+    assert (stats.files, stats.dirs, stats.bytes) == (4, 4, 40)
+    assert (root / 'sub' / 'deep' / 'c.log').exists()
+
+
+def test_excluded_entries_are_kept(tmp_path):
+    root = tmp_path / 'root'
+    _make_tree(root)
+    stats = delete_tree(str(root), excluded=['*.log'])
+    assert stats.skipped == 1
+    assert not stats.failures
+    assert sorted(os.listdir(str(root))) == ['sub']
+    assert os.listdir(str(root / 'sub' / 'deep')) == ['c.log']
+
+
+def test_links_are_not_followed(tmp_path):
+    target = tmp_path / 'target'
+    _make_tree(target)
+    root = tmp_path / 'root'
+    root.mkdir()
+    os.symlink(str(target), str(root / 'link'))
+    os.symlink(str(target / 'a.txt'), str(tmp_path / 'file_link'))
+    assert not delete_tree(str(root)).failures
+    assert not delete_tree(str(tmp_path / 'file_link')).failures
+    assert not root.exists()
+    assert not os.path.lexists(str(tmp_path / 'file_link'))
+    assert (target / 'a.txt').exists()
+    assert (target / 'sub' / 'deep' / 'd.txt').exists()
+
+
+def test_single_and_missing_file(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_bytes(b'x')
+    assert delete_tree(str(path)).files == 1
+    assert not path.exists()
+    stats = delete_tree(str(path))
+    assert stats.files == 0 and not stats.failures
@@ -0,0 +1,91 @@
+# encoding=utf-8
+"""
+Exclusion patterns. The benchmark matches thousands of patterns against a 100k
+file tree, and compares the matcher with a check of every pattern by fnmatch.
+Print timings with: PYTHONPATH=src python tests/test_exclude.py
+"""
+import time
+import fnmatch
+
+from winutils.exclude import ExcludeMatcher
+
+PATTERN_COUNT = 5000
+PATH_COUNT = 100000
+
+
+def make_patterns(count=PATTERN_COUNT):
+    """Literal paths, name globs and path globs in equal parts"""
+    patterns = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            patterns.append('dir%d/sub%d' % (i % 100, i))
+        elif kind == 1:
+            patterns.append('*.ext%d' % i)
+        else:
+            patterns.append('dir%d/*.tmp%d' % (i % 100, i))
+    return patterns
+
+
+def make_paths(count=PATH_COUNT):
+    return ['dir%d/sub%d/file%d.ext%d' % (i % 100, i % 7000, i, i % 9000) for i in range(count)]
+
+
+def reference_match(patterns, rel_path):
+    """Check each pattern against path and its parents one by one"""
+    parts = rel_path.split('/')
+    prefixes = ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+    for pattern in patterns:
+        if '/' in pattern or not any(c in pattern for c in '*?['):
+            if any(fnmatch.fnmatchcase(i, pattern) for i in prefixes):
+                return True
+        elif any(fnmatch.fnmatchcase(i, pattern) for i in parts):
+            return True
+    return False
+
+
+def benchmark(patterns, paths):
+    """Get seconds to compile and match all paths, and the matched paths"""
+    start = time.time()
+    matcher = ExcludeMatcher(patterns, ignore_case=False)
+    matched = [i for i in paths if matcher.match(i)]
+    return time.time() - start, matched
+
+
+def test_literal_name_with_brackets():
+    matcher = ExcludeMatcher(['logs/build[1].log', 'run[2]'], ignore_case=False)
+    assert matcher.match('logs/build[1].log')
+    assert matcher.match('logs/build1.log')
+    assert matcher.match('run[2]/out.txt')
+    assert matcher.match('a/run2')
+    assert not matcher.match('logs/build2.log')
+
+
+def test_same_result_as_reference():
+    patterns = make_patterns()
+    paths = make_paths()
+    matched = set(benchmark(patterns, paths)[1])
+    sample = paths[::500]
+    assert [i in matched for i in sample] == [reference_match(patterns, i) for i in sample]
+    assert matched
+
+
+def test_large_tree():
+    elapsed, matched = benchmark(make_patterns(), make_paths())
+    assert matched
+    # Generous bound, the reference needs minutes for the same work
+    assert elapsed < 30
+
+
+if __name__ == '__main__':
+    patterns = make_patterns()
+    paths = make_paths()
+    elapsed, matched = benchmark(patterns, paths)
+    print('matcher:   %.3fs for %d patterns over %d paths, %d matched' % (
+        elapsed, len(patterns), len(paths), len(matched)))
+    sample = paths[:1000]
+    start = time.time()
+    for path in sample:
+        reference_match(patterns, path)
+    ref_elapsed = (time.time() - start) * len(paths) / len(sample)
+    print('reference: %.3fs estimated from %d paths' % (ref_elapsed, len(sample)))
@@ -0,0 +1,68 @@
+# encoding=utf-8
+import os
+import time
+
+from winutils.filecache import FileCache
+
+
+def _remote(tmp_path, name, size):
+    path = tmp_path / 'remote' / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(name.encode('ascii')[:1] * size)
+    return str(path)
+
+
+def test_hit_and_miss(tmp_path):
+    cache = FileCache(str(tmp_path / 'cache'))
+    src = _remote(tmp_path, 'a.bin', 100)
+    assert not cache.fetch(src, str(tmp_path / 'out' / 'a1.bin'))
+    assert cache.fetch(src, str(tmp_path / 'out' / 'a2.bin'))
+    assert (tmp_path / 'out' / 'a2.bin').read_bytes() == b'a' * 100
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.hit_bytes) == (1, 1, 100)
+    assert cache.size() == 100
+
+
+def test_changed_remote_file_is_a_miss(tmp_path):
+    cache = FileCache(str(tmp_path / 'cache'))
+    src = _remote(tmp_path, 'a.bin', 100)
+    cache.fetch(src, str(tmp_path / 'a1.bin'))
+    with open(src, 'ab') as file_obj:
+        file_obj.write(b'b')
+    assert not cache.fetch(src, str(tmp_path / 'a2.bin'))
+    assert (tmp_path / 'a2.bin').read_bytes() == b'a' * 100 + b'b'
+
+
+def test_lru_eviction(tmp_path):
+    cache = FileCache(str(tmp_path / 'cache'), max_size=250)
+    paths = [_remote(tmp_path, name, 100) for name in ['a.bin', 'b.bin', 'c.bin']]
+    cache.fetch(paths[0], str(tmp_path / 'a.bin'))
+    time.sleep(0.01)
+    cache.fetch(paths[1], str(tmp_path / 'b.bin'))
+    time.sleep(0.01)
+    # Hit makes a.bin the most recently used entry
+    assert cache.fetch(paths[0], str(tmp_path / 'a.bin'))
+    time.sleep(0.01)
+    cache.fetch(paths[2], str(tmp_path / 'c.bin'))
+    assert cache.stats.evictions == 1
+    assert cache.size() == 200
+    assert cache.fetch(paths[0], str(tmp_path / 'a.bin'))
+    assert cache.fetch(paths[2], str(tmp_path / 'c.bin'))
+    assert not cache.fetch(paths[1], str(tmp_path / 'b.bin'))
+
+
+def test_evict_to_size(tmp_path):
+    cache = FileCache(str(tmp_path / 'cache'))
+    for name in ['a.bin', 'b.bin', 'c.bin']:
+        cache.fetch(_remote(tmp_path, name, 100), str(tmp_path / name))
+    assert cache.evict(100) == 2
+    assert cache.size() == 100
+    assert len(cache.entries()) == 1
+
+
+def test_linked_hit(tmp_path):
+    cache = FileCache(str(tmp_path / 'cache'), link=True)
+    src = _remote(tmp_path, 'a.bin', 10)
+    cache.fetch(src, str(tmp_path / 'a1.bin'))
+    assert cache.fetch(src, str(tmp_path / 'a2.bin'))
+    entry = cache.entries()[0][0]
+    assert os.path.samefile(entry, str(tmp_path / 'a2.bin'))
@@ -0,0 +1,22 @@
+# encoding=utf-8
+"""Importing winutils must not spawn any process, see Shell.where() and NativeCommand"""
+import os
+import sys
+import subprocess
+
+
+def _fail(*args, **kwargs):
+    raise AssertionError('Process spawned at import: %r' % (args,))
+
+
+def test_import_spawns_no_process(monkeypatch):
+    for name in list(sys.modules):
+        if name == 'winutils' or name.startswith('winutils.'):
+            monkeypatch.delitem(sys.modules, name)
+    monkeypatch.setattr(subprocess, 'Popen', _fail)
+    monkeypatch.setattr(os, 'popen', _fail)
+    monkeypatch.setattr(os, 'system', _fail)
+
+    import winutils
+    import winutils.shell
+    assert winutils.Shell is winutils.shell.Shell
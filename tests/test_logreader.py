@@ -0,0 +1,78 @@
+# encoding=utf-8
+import codecs
+
+import pytest
+
+from winutils.logreader import LogReader
+
+TEXT = u'ERROR first\r\nINFO second\r\nERROR caf\xe9 third\r\n'
+
+
+@pytest.mark.parametrize('bom, encoding', [
+    (b'', 'utf-8'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (b'', 'utf-16-le'),
+])
+def test_search_anchored(tmp_path, bom, encoding):
+    path = tmp_path / 'a.log'
+    path.write_bytes(bom + TEXT.encode(encoding))
+    reader = LogReader(str(path))
+    matches = list(reader.search(r'^ERROR (\w+)'))
+    assert [i.line for i in matches] == [u'ERROR first', u'ERROR caf\xe9 third']
+    assert matches[0].offset == len(bom)
+    assert matches[0].groups == (u'first',)
+    data = path.read_bytes()
+    assert data[matches[1].offset:].startswith(u'ERROR'.encode(encoding))
+
+
+def test_search_stopped_early(tmp_path):
+    path = tmp_path / 'a.log'
+    path.write_bytes(codecs.BOM_UTF8 + TEXT.encode('utf-8'))
+    matches = LogReader(str(path)).search('ERROR')
+    assert next(matches).line == u'ERROR first'
+    matches.close()
+
+
+def test_tail(tmp_path):
+    path = tmp_path / 'a.log'
+    path.write_bytes(codecs.BOM_UTF16_LE + TEXT.encode('utf-16-le'))
+    reader = LogReader(str(path))
+    assert reader.tail(2) == [u'INFO second', u'ERROR caf\xe9 third']
+    assert reader.tail(10) == [u'ERROR first', u'INFO second', u'ERROR caf\xe9 third']
+
+
+def test_read_new(tmp_path):
+    path = tmp_path / 'a.log'
+    path.write_bytes(codecs.BOM_UTF8 + b'old\n')
+    reader = LogReader(str(path))
+    reader.seek_end()
+    assert reader.read_new() == []
+    with open(str(path), 'ab') as file_obj:
+        file_obj.write(b'new\npart')
+    assert reader.read_new() == [u'new']
+    with open(str(path), 'ab') as file_obj:
+        file_obj.write(b'ial\n')
+    assert reader.read_new() == [u'partial']
+
+
+@pytest.mark.parametrize('encoding', ['utf-8', 'utf-16-le'])
+def test_seek_end_in_incomplete_line(tmp_path, encoding):
+    path = tmp_path / 'a.log'
+    path.write_bytes(u'old\npart'.encode(encoding))
+    reader = LogReader(str(path), encoding)
+    reader.seek_end()
+    with open(str(path), 'ab') as file_obj:
+        file_obj.write(u'ial\nnew\n'.encode(encoding))
+    assert reader.read_new() == [u'partial', u'new']
+
+
+def test_seek_end_of_single_incomplete_line(tmp_path):
+    path = tmp_path / 'a.log'
+    path.write_bytes(codecs.BOM_UTF8 + b'part')
+    reader = LogReader(str(path))
+    reader.seek_end()
+    assert reader.offset == len(codecs.BOM_UTF8)
+    with open(str(path), 'ab') as file_obj:
+        file_obj.write(b'ial\n')
+    assert reader.read_new() == [u'partial']
@@ -0,0 +1,119 @@
+# encoding=utf-8
+import os
+
+import pytest
+
+from winutils import metacache
+from winutils.metacache import MetadataCache, FILE, DIR, MISSING
+from winutils.sharedrive import ShareDrive
+
+
+class FakeTime(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(metacache, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def share(tmp_path):
+    (tmp_path / 'logs').mkdir()
+    (tmp_path / 'logs' / 'a.log').write_bytes(b'a')
+    (tmp_path / 'logs' / 'b.log').write_bytes(b'b')
+    (tmp_path / 'logs' / 'sub').mkdir()
+    return tmp_path
+
+
+def test_siblings_share_one_listing(share, clock):
+    cache = MetadataCache()
+    logs = share / 'logs'
+    kinds = [cache.lookup(str(logs / name)) for name in ['a.log', 'b.log', 'sub', 'c.log']]
+    assert kinds == [FILE, FILE, DIR, MISSING]
+    assert cache.listings == 1
+
+
+def test_missing_parent(share, clock):
+    cache = MetadataCache()
+    assert cache.lookup(str(share / 'missing' / 'a.log')) == MISSING
+    assert cache.lookup(str(share / 'logs' / 'a.log' / 'x')) == MISSING
+
+
+def test_positive_ttl(share, clock):
+    cache = MetadataCache(ttl=5.0, negative_ttl=1.0)
+    path = share / 'logs' / 'a.log'
+    assert cache.lookup(str(path)) == FILE
+    path.unlink()
+    clock.now += 4.9
+    assert cache.lookup(str(path)) == FILE
+    clock.now += 0.2
+    assert cache.lookup(str(path)) == MISSING
+    assert cache.listings == 2
+
+
+def test_negative_ttl(share, clock):
+    cache = MetadataCache(ttl=5.0, negative_ttl=1.0)
+    path = share / 'logs' / 'c.log'
+    assert cache.lookup(str(path)) == MISSING
+    path.write_bytes(b'c')
+    clock.now += 0.9
+    assert cache.lookup(str(path)) == MISSING
+    assert cache.listings == 1
+    clock.now += 0.2
+    # Existing entries are still valid, only the missing name lists the directory again
+    assert cache.lookup(str(share / 'logs' / 'a.log')) == FILE
+    assert cache.listings == 1
+    assert cache.lookup(str(path)) == FILE
+    assert cache.listings == 2
+
+
+def test_refresh(share, clock):
+    cache = MetadataCache()
+    path = share / 'logs' / 'a.log'
+    assert cache.lookup(str(path)) == FILE
+    path.unlink()
+    assert cache.lookup(str(path), refresh=True) == MISSING
+
+
+def test_invalidate_parents_and_children(share, clock):
+    (share / 'other').mkdir()
+    cache = MetadataCache()
+    for rel_path in ['a.log', 'logs/a.log', 'logs/sub/x', 'other/x']:
+        cache.lookup(str(share / rel_path))
+    assert cache.listings == 4
+    cache.invalidate(str(share / 'logs'))
+    # Listings of the share and logs folders are gone, other folder is still cached
+    for rel_path in ['a.log', 'logs/a.log', 'logs/sub/x', 'other/x']:
+        cache.lookup(str(share / rel_path))
+    assert cache.listings == 4 + 3
+
+
+def test_own_writes_are_visible(share, clock):
+    drive = ShareDrive(str(share))
+    assert drive.exists_many(['logs/a.log', 'logs/new', 'logs/sub']) == [True, False, True]
+    assert drive.metadata.listings == 1
+    drive.mkdir('logs/new')
+    assert drive.exists('logs/new')
+    assert drive.is_dir('logs/new')
+    drive.delete('logs/a.log')
+    assert not drive.exists('logs/a.log')
+    loc = share / 'loc.txt'
+    loc.write_bytes(b'x')
+    assert drive.upload(str(loc), 'logs/b.log')
+    assert drive.is_file('logs/b.log')
+
+
+def test_exists_many_lists_each_parent_once(share, clock):
+    drive = ShareDrive(str(share))
+    paths = ['logs/a.log', 'logs/b.log', 'logs/c.log', 'logs/sub/x', 'other']
+    assert drive.exists_many(paths) == [True, True, False, False, False]
+    assert drive.metadata.listings == 3
+    assert drive.exists_many(paths) == [True, True, False, False, False]
+    assert drive.metadata.listings == 3
@@ -0,0 +1,87 @@
+# encoding=utf-8
+import os
+import errno
+
+import pytest
+
+from winutils import fs
+from winutils.fs import move
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def _files(root):
+    result = {}
+    for dir_path, _, names in os.walk(str(root)):
+        for name in names:
+            path = os.path.join(dir_path, name)
+            rel_path = os.path.relpath(path, str(root)).replace(os.sep, '/')
+            result[rel_path] = open(path, 'rb').read()
+    return result
+
+
+@pytest.fixture
+def src(tmp_path):
+    root = tmp_path / 'src'
+    _write(root / 'a.txt', b'a')
+    _write(root / 'sub' / 'b.txt', b'b')
+    _write(root / 'sub' / 'deep' / 'c.txt', b'c')
+    return root
+
+
+def test_rename_into_directory(tmp_path, src):
+    (tmp_path / 'dest').mkdir()
+    result = move(str(src), str(tmp_path / 'dest'))
+    assert result.strategy == 'rename'
+    assert not src.exists()
+    assert _files(tmp_path / 'dest' / 'src') == {
+        'a.txt': b'a', 'sub/b.txt': b'b', 'sub/deep/c.txt': b'c'}
+
+
+def test_rename_file(tmp_path, src):
+    result = move(str(src / 'a.txt'), str(tmp_path / 'a.txt'))
+    assert result.strategy == 'rename'
+    assert (tmp_path / 'a.txt').read_bytes() == b'a'
+
+
+def test_merge_by_rename(tmp_path, src):
+    dest = tmp_path / 'dest'
+    _write(dest / 'src' / 'old.txt', b'old')
+    _write(dest / 'src' / 'sub' / 'old.txt', b'old')
+    result = move(str(src), str(dest))
+    assert result.strategy == 'rename'
+    assert not src.exists()
+    assert _files(dest / 'src') == {'a.txt': b'a', 'old.txt': b'old', 'sub/b.txt': b'b',
+                                    'sub/old.txt': b'old', 'sub/deep/c.txt': b'c'}
+
+
+def test_merge_copies_conflicts(tmp_path, src):
+    dest = tmp_path / 'dest'
+    _write(dest / 'src' / 'sub' / 'b.txt', b'old')
+    _write(dest / 'src' / 'old.txt', b'old')
+    result = move(str(src), str(dest))
+    assert result.strategy == 'copy'
+    assert not src.exists()
+    assert _files(dest / 'src') == {'a.txt': b'a', 'old.txt': b'old', 'sub/b.txt': b'b',
+                                    'sub/deep/c.txt': b'c'}
+
+
+def test_copy_across_volumes(tmp_path, src, monkeypatch):
+    def cross_device(src_path, dest_path):
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+    monkeypatch.setattr(fs, 'replace', cross_device)
+    (tmp_path / 'dest').mkdir()
+    result = move(str(src), str(tmp_path / 'dest'), workers=2)
+    assert result.strategy == 'copy'
+    assert result.stats.files == 3
+    assert not src.exists()
+    assert _files(tmp_path / 'dest' / 'src') == {
+        'a.txt': b'a', 'sub/b.txt': b'b', 'sub/deep/c.txt': b'c'}
+
+
+def test_move_missing_source(tmp_path):
+    with pytest.raises(Exception, match='Cannot move'):
+        move(str(tmp_path / 'missing'), str(tmp_path / 'dest'))
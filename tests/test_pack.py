@@ -0,0 +1,98 @@
+# encoding=utf-8
+import os
+import zipfile
+
+import pytest
+
+from winutils.pack import pack_tree, unpack, read_member, list_members
+
+
+def _tree(root):
+    os.makedirs(os.path.join(root, 'logs', 'empty'))
+    for name in ('a.log', 'b.log', 'c.log'):
+        with open(os.path.join(root, 'logs', name), 'wb') as file_obj:
+            file_obj.write(name.encode('ascii') * 100000)
+
+
+class FailingReader(object):
+    """File whose second read fails, as if a link dropped"""
+    def __init__(self, file_obj):
+        self._file = file_obj
+        self._reads = 0
+
+    def read(self, *args):
+        self._reads += 1
+        if self._reads > 1:
+            raise IOError('Injected read failure')
+        return self._file.read(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._file.close()
+
+
+def test_pack_and_unpack(tmp_path):
+    src = str(tmp_path / 'src')
+    _tree(src)
+    archive = str(tmp_path / 'share' / 'results.zip')
+    stats = pack_tree(src, archive)
+    assert (stats.files, stats.dirs, stats.failures) == (3, 2, [])
+    assert zipfile.ZipFile(archive).testzip() is None
+    assert 'logs/b.log' in list_members(archive)
+    assert read_member(archive, 'logs\\b.log') == b'b.log' * 100000
+
+    dest = str(tmp_path / 'dest')
+    assert unpack(archive, dest).files == 3
+    assert os.path.isdir(os.path.join(dest, 'logs', 'empty'))
+    with open(os.path.join(dest, 'logs', 'c.log'), 'rb') as file_obj:
+        assert file_obj.read() == b'c.log' * 100000
+    assert unpack(archive, str(tmp_path / 'some'), ['logs/a.*']).files == 1
+
+
+def test_unreadable_file_is_skipped(tmp_path, monkeypatch):
+    src = str(tmp_path / 'src')
+    _tree(src)
+
+    def opener(path, *args):
+        if path.endswith('b.log'):
+            raise IOError('Permission denied')
+        return open(path, *args)
+
+    monkeypatch.setattr(zipfile, 'open', opener, raising=False)
+    archive = str(tmp_path / 'results.zip')
+    stats = pack_tree(src, archive)
+    monkeypatch.undo()
+    assert [os.path.basename(i[0]) for i in stats.failures] == ['b.log']
+    assert zipfile.ZipFile(archive).testzip() is None
+    assert 'logs/b.log' not in list_members(archive)
+
+
+def test_partial_member_is_not_published(tmp_path, monkeypatch):
+    src = str(tmp_path / 'src')
+    _tree(src)
+
+    def opener(path, *args):
+        file_obj = open(path, *args)
+        return FailingReader(file_obj) if path.endswith('b.log') else file_obj
+
+    monkeypatch.setattr(zipfile, 'open', opener, raising=False)
+    archive = str(tmp_path / 'results.zip')
+    with pytest.raises(Exception, match='is not created'):
+        pack_tree(src, archive)
+    assert os.listdir(str(tmp_path)) == ['src']
+
+
+def test_packed_upload(tmp_path):
+    from winutils.sharedrive import ShareDrive
+    src = str(tmp_path / 'src')
+    _tree(src)
+    drive = ShareDrive(str(tmp_path / 'share'))
+    assert drive.upload(src, 'results.zip', packed=True, verify='sha1')
+    assert drive.read_packed('results.zip', 'logs/a.log') == b'a.log' * 100000
+    assert drive.download('results.zip', str(tmp_path / 'dest'), packed=True)
+    assert os.path.isfile(str(tmp_path / 'dest' / 'logs' / 'c.log'))
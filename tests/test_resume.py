@@ -0,0 +1,32 @@
+# encoding=utf-8
+import io
+
+import pytest
+
+from winutils.resume import resumable_copy, FaultInjector
+from winutils.retry import RetryPolicy
+
+NO_WAIT = RetryPolicy(max_attempts=3, initial_delay=0, retry_on=(IOError, OSError))
+
+
+def test_resume_and_verify(tmp_path):
+    src = tmp_path / 'src.bin'
+    src.write_bytes(b'0123456789' * 100)
+    dest = str(tmp_path / 'dest.bin')
+    stats = resumable_copy(str(src), dest, chunk_size=100, retry=NO_WAIT,
+                           opener=FaultInjector(fail_after=450), verify='sha1')
+    assert stats.attempts == 2
+    assert stats.verified
+    assert open(dest, 'rb').read() == src.read_bytes()
+
+
+def test_verify_detects_corrupt_copy(tmp_path):
+    src = tmp_path / 'src.bin'
+    src.write_bytes(b'x' * 1000)
+
+    def corrupt_opener(path, mode='rb'):
+        return io.BytesIO(b'y' * 1000)
+
+    with pytest.raises(Exception, match='Failed to verify'):
+        resumable_copy(str(src), str(tmp_path / 'dest.bin'), chunk_size=100, retry=NO_WAIT,
+                       opener=corrupt_opener, verify='sha1')
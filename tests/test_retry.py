@@ -0,0 +1,80 @@
+# encoding=utf-8
+import pytest
+
+from winutils.fs import UNZIP_RETRY
+from winutils.retry import RetryPolicy
+
+
+class FakeClock(object):
+    """Clock advanced by sleep() and by attempts of the tested function"""
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _policy(clock, **kwargs):
+    return RetryPolicy(jitter=0, sleep=clock.sleep, clock=clock, **kwargs)
+
+
+def _slow_failure(clock, seconds, message):
+    def func():
+        clock.now += seconds
+        raise Exception(message)
+    return func
+
+
+def test_retry_if_selects_errors():
+    clock = FakeClock()
+    policy = _policy(clock, max_attempts=6, initial_delay=1.0,
+                     retry_if=lambda err: 'There are no more files' in str(err))
+    with pytest.raises(Exception, match='Access denied'):
+        policy.call(_slow_failure(clock, 1, 'Access denied'))
+    assert policy.stats.attempts == 1
+    assert policy.stats.give_ups == 1
+    with pytest.raises(Exception, match='no more files'):
+        policy.call(_slow_failure(clock, 1, 'There are no more files.'))
+    assert policy.stats.attempts == 1 + 6
+
+
+def test_deadline_includes_attempt_time():
+    clock = FakeClock()
+    policy = _policy(clock, max_attempts=10, initial_delay=1.0, multiplier=1.0, deadline=5.0)
+    with pytest.raises(Exception):
+        policy.call(_slow_failure(clock, 2, 'busy'))
+    # 2s attempt, 1s wait, 2s attempt, no time left for another wait
+    assert policy.stats.attempts == 2
+    assert clock.sleeps == [1.0]
+
+
+def test_deadline_limits_last_wait():
+    clock = FakeClock()
+    policy = _policy(clock, max_attempts=10, initial_delay=4.0, multiplier=1.0, deadline=6.0)
+    assert not policy.poll(lambda: False)
+    assert clock.sleeps == [4.0, 2.0]
+
+
+def test_unzip_retries_slow_attempts():
+    # The error is raised after minutes of extracting a large file, it is still retried
+    clock = FakeClock()
+    policy = RetryPolicy(max_attempts=UNZIP_RETRY.max_attempts,
+                         initial_delay=UNZIP_RETRY.initial_delay, max_delay=UNZIP_RETRY.max_delay,
+                         deadline=UNZIP_RETRY.deadline, retry_if=UNZIP_RETRY.retry_if,
+                         jitter=0, sleep=clock.sleep, clock=clock)
+    attempts = []
+
+    def unzip():
+        attempts.append(clock.now)
+        clock.now += 120
+        if len(attempts) < 4:
+            raise Exception('Fail to extract file. Error msg: There are no more files.')
+        return True
+
+    assert policy.call(unzip)
+    assert len(attempts) == 4
@@ -0,0 +1,37 @@
+# encoding=utf-8
+import os
+
+from winutils import sharedrive
+from winutils.sharedrive import ShareDrive
+
+
+def _tree(root):
+    os.makedirs(os.path.join(root, 'logs'))
+    with open(os.path.join(root, 'logs', 'a.log'), 'w') as file_obj:
+        file_obj.write('a')
+
+
+def test_incremental_upload(tmp_path):
+    loc = str(tmp_path / 'loc')
+    _tree(loc)
+    drive = ShareDrive(str(tmp_path / 'share'))
+    assert drive.upload(loc, 'results', incremental=True) is True
+    assert drive.is_file('results/logs/a.log')
+
+
+def test_incremental_upload_failure(tmp_path):
+    drive = ShareDrive(str(tmp_path / 'share'))
+    assert drive.upload(str(tmp_path / 'missing'), 'results', incremental=True) is False
+
+
+def test_resumable_transfer_failure(tmp_path, monkeypatch):
+    def failed_copy(src, dest, verify=None):
+        raise Exception('Failed to copy %s, attempts exhausted' % src)
+    monkeypatch.setattr(sharedrive, 'resumable_copy', failed_copy)
+    loc = tmp_path / 'a.bin'
+    loc.write_bytes(b'a')
+    drive = ShareDrive(str(tmp_path / 'share'))
+    assert drive.upload(str(loc), 'a.bin', resumable=True) is False
+    (tmp_path / 'share').mkdir(exist_ok=True)
+    (tmp_path / 'share' / 'b.bin').write_bytes(b'b')
+    assert drive.download('b.bin', str(tmp_path / 'b.bin'), resumable=True) is False
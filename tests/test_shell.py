@@ -0,0 +1,109 @@
+# encoding=utf-8
+import os
+import sys
+import subprocess
+
+import pytest
+
+from winutils import shell
+
+
+def test_native_commands_are_strings():
+    for name in shell.NATIVE_COMMANDS:
+        value = getattr(shell, name)
+        assert isinstance(value, str)
+        assert value == shell.Shell.where(shell.NATIVE_COMMANDS[name])
+
+
+def test_native_command_uses():
+    reg = shell.REG_CMD
+    assert reg + ' add' == '%s add' % reg
+    assert 'x ' + reg == 'x %s' % reg
+    assert ' '.join([reg, 'add', 'HKLM']) == '%s add HKLM' % reg
+    assert subprocess.list2cmdline([reg, 'add']) == '%s add' % reg
+    assert os.path.exists(reg) in (True, False)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='module __getattr__ is required')
+def test_native_commands_are_resolved_on_access(monkeypatch):
+    monkeypatch.delitem(vars(shell), 'MSIEXEC_CMD', raising=False)
+    calls = []
+    monkeypatch.setattr(shell.Shell, 'where', classmethod(lambda cls, cmd: calls.append(cmd) or cmd))
+    assert 'MSIEXEC_CMD' not in vars(shell)
+    assert shell.MSIEXEC_CMD == 'msiexec'
+    assert shell.MSIEXEC_CMD == 'msiexec'
+    assert calls == ['msiexec']
+    with pytest.raises(AttributeError):
+        shell.NO_SUCH_CMD
+
+
+PYTHON = '"%s"' % sys.executable
+
+
+def _pipe_lines(data, chunk_size, encoding='utf-8'):
+    """Lines read by _iter_lines from a pipe which contains data"""
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, data)
+    os.close(write_fd)
+    output_size = [0]
+    with os.fdopen(read_fd, 'rb') as file_obj:
+        lines = list(shell._iter_lines(file_obj, encoding, output_size, chunk_size))
+    assert output_size[0] == len(data)
+    return lines
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 65536])
+def test_iter_lines_across_chunks(chunk_size):
+    data = u'ab\r\ncd\né中\r\n\nlast'.encode('utf-8')
+    assert _pipe_lines(data, chunk_size) == [u'ab', u'cd', u'é中', u'', u'last']
+
+
+def test_iter_lines_trailing_newline():
+    assert _pipe_lines(b'a\nb\n', 1) == [u'a', u'b']
+    assert _pipe_lines(b'', 1) == []
+
+
+def test_stream_final_line_without_newline():
+    cmd = '%s -c "import sys; sys.stdout.write(\'one\\ntwo\\nthree\')"' % PYTHON
+    assert list(shell.Shell.stream(cmd, encoding='utf-8')) == ['one', 'two', 'three']
+
+
+def test_stream_stderr_is_merged():
+    cmd = '%s -c "import sys; print(1); sys.stdout.flush(); sys.stderr.write(\'2\\n\')"' % PYTHON
+    assert list(shell.Shell.stream(cmd, encoding='utf-8')) == ['1', '2']
+
+
+def test_system_stream_keeps_tail():
+    cmd = '%s -c "for i in range(5000): print(i)"' % PYTHON
+    seen = []
+    tail = shell.Shell.system_stream(cmd, seen.append, encoding='utf-8', tail=10)
+    assert len(seen) == 5000
+    assert seen[0] == '0'
+    assert tail == [str(i) for i in range(4990, 5000)]
+
+
+def test_stream_exit_code():
+    cmd = '%s -c "import sys; [print(i) for i in range(300)]; sys.exit(3)"' % PYTHON
+    with pytest.raises(Exception) as info:
+        list(shell.Shell.stream(cmd, encoding='utf-8', tail=2))
+    message = str(info.value)
+    assert 'exit code 3' in message
+    assert message.endswith('298\n299')
+    assert '297' not in message.split('Last output:')[1]
+    assert list(shell.Shell.stream(cmd, expected_code=3, encoding='utf-8'))[-1] == '299'
+
+
+def test_stream_closed_early_kills_process():
+    from winutils.launcher import Launcher, set_launcher
+    launcher = Launcher()
+    records = []
+    launcher.add_hook(post=records.append)
+    old_launcher = set_launcher(launcher)
+    try:
+        lines = shell.Shell.stream('%s -c "while True: print(1)"' % PYTHON, encoding='utf-8')
+        assert next(lines) == '1'
+        lines.close()
+    finally:
+        set_launcher(old_launcher)
+    assert len(records) == 1
+    assert records[0].returncode is not None
@@ -0,0 +1,43 @@
+# encoding=utf-8
+import os
+
+import pytest
+
+from winutils.shellhost import ShellHost, DIALECTS, Dialect
+
+pytestmark = pytest.mark.skipif(not os.path.exists('/bin/bash'), reason='bash is required')
+
+BASH = Dialect(['/bin/bash', '--noprofile', '--norc'], DIALECTS['bash'].template)
+
+
+@pytest.fixture
+def host():
+    with ShellHost(BASH, encoding='utf-8') as shell_host:
+        yield shell_host
+
+
+def test_run_keeps_state(host):
+    assert host.run('cd /tmp') == (0, '')
+    assert host.run('pwd') == (0, '/tmp')
+    assert host.run('echo out; echo err >&2') == (0, 'out\nerr')
+    assert host.restart_count == 0
+
+
+def test_exit_code_of_failed_command(host):
+    assert host.run('false')[0] == 1
+    with pytest.raises(Exception):
+        host.execute('ls /nonexistent_dir_of_winutils_test')
+
+
+def test_exit_restarts_host_lazily(host):
+    host.run('export WINUTILS_TEST=1')
+    assert host.run('exit 3') == (3, '')
+    assert not host.alive
+    assert host.run('echo ${WINUTILS_TEST:-new}') == (0, 'new')
+    assert host.restart_count == 1
+
+
+def test_timeout_restarts_host(host):
+    with pytest.raises(Exception, match='timed out'):
+        host.run('sleep 5', timeout=0.2)
+    assert host.execute('echo ok') == 'ok'
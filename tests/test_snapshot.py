@@ -0,0 +1,58 @@
+# encoding=utf-8
+import os
+
+import pytest
+
+from winutils.snapshot import scan_tree, diff, Snapshot, ADDED, REMOVED, MODIFIED
+from winutils.metacache import FILE, MISSING
+
+
+def _write(path, data):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as file_obj:
+        file_obj.write(data)
+
+
+def test_scan_and_query(tmp_path):
+    root = str(tmp_path)
+    for i in range(5):
+        for j in range(3):
+            _write(os.path.join(root, 'd%d' % i, 'sub', 'f%d.txt' % j), 'x' * j)
+    snapshot = scan_tree(root, excluded_files=['d0'], workers=4)
+    assert len(snapshot) == 4 * 5
+    assert snapshot.is_file('d1/sub/f2.txt')
+    assert snapshot.is_dir('d1\\sub')
+    assert not snapshot.exists('d0')
+    assert snapshot.kind('d9') == MISSING
+    assert snapshot.listdir('d2/sub') == ['f0.txt', 'f1.txt', 'f2.txt']
+    assert snapshot.get('d3/sub/f1.txt').size == 1
+    assert snapshot.total_size() == 4 * 3
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink') or os.name == 'nt', reason='symlink is required')
+def test_link_cycle_is_not_followed(tmp_path):
+    root = str(tmp_path)
+    _write(os.path.join(root, 'a', 'f.txt'), 'f')
+    os.symlink(root, os.path.join(root, 'a', 'loop'))
+    snapshot = scan_tree(root)
+    assert sorted(snapshot.entries) == ['a', 'a/f.txt', 'a/loop']
+    assert snapshot.kind('a/loop') == FILE
+
+
+def test_save_load_and_diff(tmp_path):
+    root = str(tmp_path / 'tree')
+    _write(os.path.join(root, 'keep.txt'), 'k')
+    _write(os.path.join(root, 'gone.txt'), 'g')
+    _write(os.path.join(root, 'change.txt'), 'c')
+    old = scan_tree(root)
+    old.save(str(tmp_path / 'old.json'))
+    old = Snapshot.load(str(tmp_path / 'old.json'))
+
+    os.remove(os.path.join(root, 'gone.txt'))
+    _write(os.path.join(root, 'change.txt'), 'changed')
+    _write(os.path.join(root, 'new', 'n.txt'), 'n')
+    changes = [(i.change, i.path) for i in diff(old, scan_tree(root))]
+    assert changes == [(MODIFIED, 'change.txt'), (REMOVED, 'gone.txt'),
+                       (ADDED, 'new'), (ADDED, 'new/n.txt')]
+    assert old.kind('keep.txt') == FILE
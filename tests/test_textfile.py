@@ -0,0 +1,52 @@
+# encoding=utf-8
+import codecs
+
+import pytest
+
+from winutils import textfile
+from winutils.textfile import detect_encoding, iter_lines
+
+TEXT = u'2024-01-01 INFO started\r\n2024-01-01 ERROR caf\xe9 failed\r\n'
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    textfile.clear_cache()
+    yield
+    textfile.clear_cache()
+
+
+@pytest.mark.parametrize('data, encoding', [
+    (codecs.BOM_UTF8 + TEXT.encode('utf-8'), 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE + TEXT.encode('utf-16-le'), 'utf-16'),
+    (codecs.BOM_UTF32_LE + TEXT.encode('utf-32-le'), 'utf-32'),
+    (TEXT.encode('utf-16-le'), 'utf-16-le'),
+    (TEXT.encode('utf-16-be'), 'utf-16-be'),
+    (TEXT.encode('utf-8'), 'utf-8'),
+])
+def test_detect_encoding(tmp_path, data, encoding):
+    path = tmp_path / 'a.log'
+    path.write_bytes(data)
+    assert detect_encoding(str(path)) == encoding
+    assert list(iter_lines(str(path))) == TEXT.replace('\r\n', '\n').splitlines(True)
+
+
+def test_sampled_utf16_without_bom(tmp_path):
+    # Only chunks spread over the file are read, their offsets keep code units aligned
+    path = tmp_path / 'big.log'
+    path.write_bytes((TEXT * 5000).encode('utf-16-le'))
+    assert detect_encoding(str(path), sample_size=1024) == 'utf-16-le'
+
+
+def test_sampled_utf8_chunk_starts_in_character(tmp_path):
+    path = tmp_path / 'big.log'
+    path.write_bytes((u'中文 ' * 20000).encode('utf-8'))
+    assert detect_encoding(str(path), sample_size=1001) == 'utf-8'
+
+
+def test_cache_is_keyed_by_size(tmp_path):
+    path = tmp_path / 'a.log'
+    path.write_bytes(TEXT.encode('utf-16-le'))
+    assert detect_encoding(str(path)) == 'utf-16-le'
+    path.write_bytes(TEXT.encode('utf-8') + b'more')
+    assert detect_encoding(str(path)) == 'utf-8'
@@ -0,0 +1,34 @@
+# encoding=utf-8
+import os
+
+from winutils.transfer import transfer_many, transfer_paths
+
+
+def test_failed_file_does_not_abort_batch(tmp_path):
+    items = []
+    for i in range(4):
+        src = tmp_path / ('f%d.txt' % i)
+        src.write_text(u'x' * i)
+        items.append((str(src), str(tmp_path / 'out' / src.name)))
+
+    def copy_func(src, dest):
+        if src.endswith('f1.txt'):
+            raise ValueError('not an IO error')
+        with open(src, 'rb') as src_obj, open(dest, 'wb') as dst:
+            data = src_obj.read()
+            dst.write(data)
+        return len(data)
+
+    stats = transfer_many(items, workers=2, copy_func=copy_func)
+    assert stats.files == 3
+    assert stats.bytes == 5
+    assert [os.path.basename(i[0]) for i in stats.failures] == ['f1.txt']
+
+
+def test_transfer_paths_missing(tmp_path):
+    (tmp_path / 'a.txt').write_text(u'a')
+    stats = transfer_paths([str(tmp_path / 'a.txt'), str(tmp_path / 'missing')],
+                           str(tmp_path / 'out'))
+    assert stats.files == 1
+    assert len(stats.failures) == 1
+    assert stats.total == 2
@@ -0,0 +1,68 @@
+# encoding=utf-8
+import time
+import threading
+
+import pytest
+
+from winutils import launcher
+from winutils.volumes import VolumeProvider, VolumeInventory, MemoryVolumes, WmicProvider
+
+
+class FixedMaskProvider(VolumeProvider):
+    """Card reader whose drive letter stays when media is ejected"""
+    def __init__(self, disks):
+        self.disks = list(disks)
+
+    def change_token(self):
+        return 0x10
+
+    def list_removable(self):
+        return list(self.disks)
+
+
+def test_removal_without_token_change():
+    provider = FixedMaskProvider(['E:'])
+    inventory = VolumeInventory(provider)
+    assert inventory.removable() == ['E:']
+    threading.Timer(0.2, provider.disks.remove, ['E:']).start()
+    start = time.time()
+    assert inventory.wait_for_removal('E:', timeout=10)
+    assert time.time() - start < 2
+
+
+def test_removal_timeout():
+    inventory = VolumeInventory(FixedMaskProvider(['E:']))
+    assert not inventory.wait_for_removal('E:', timeout=0.3)
+
+
+def test_arrival():
+    volumes = MemoryVolumes(['E:'])
+    inventory = VolumeInventory(volumes)
+    threading.Timer(0.1, volumes.add, ['F:']).start()
+    assert inventory.wait_for_arrival(timeout=5) == ['F:']
+
+
+class StubLauncher(object):
+    """Launcher returning fixed output of check_output()"""
+    def __init__(self, output):
+        self.output = output
+        self.cmds = []
+
+    def check_output(self, cmd, shell=False):
+        self.cmds.append(cmd)
+        return self.output
+
+
+@pytest.mark.parametrize('output', [
+    b'DeviceID  \r\r\nF:        \r\r\nE:        \r\r\n\r\r\n',
+    u'\ufeffDeviceID  \r\nF:        \r\nE:        \r\n'.encode('utf-16-le'),
+    u'DeviceID  \r\nF:        \r\nE:        \r\n',
+])
+def test_wmic_provider(output):
+    stub = StubLauncher(output)
+    old_launcher = launcher.set_launcher(stub)
+    try:
+        assert WmicProvider().list_removable() == ['E:', 'F:']
+    finally:
+        launcher.set_launcher(old_launcher)
+    assert stub.cmds[0][0] == 'wmic'
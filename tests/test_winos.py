@@ -0,0 +1,62 @@
+# encoding=utf-8
+"""
+OS bitness detection. The benchmark compares the old wmic path, which ran on every
+call, with in-process detection, using a stub launcher which simulates wmic latency.
+Print timings with: PYTHONPATH=src python tests/test_winos.py
+"""
+import time
+import timeit
+import subprocess
+
+from winutils import winos
+from winutils.launcher import Launcher, set_launcher
+
+# Seconds a stubbed wmic command takes, real wmic takes far longer
+WMIC_LATENCY = 0.005
+
+CALLS = 50
+
+
+class StubLauncher(Launcher):
+    """Launcher which answers wmic without launching a process"""
+    def run(self, cmd, shell=False, stdout=None, stderr=None, **popen_args):
+        token = self.begin(cmd)
+        time.sleep(WMIC_LATENCY)
+        out = '64\n' if stdout == subprocess.PIPE else None
+        self.end(token, 0, len(out or ''))
+        return 0, out, None
+
+
+def benchmark(calls=CALLS):
+    """Get (seconds of old wmic path, seconds of new path, commands launched by new path)"""
+    launcher = StubLauncher()
+    old_launcher = set_launcher(launcher)
+    try:
+        old = timeit.timeit(winos._wmic_long_bit, number=calls)
+        launcher.reset()
+        winos.get_long_bit(refresh=True)
+        new = timeit.timeit(winos.get_long_bit, number=calls)
+        launched = sum(i['count'] for i in launcher.summary())
+    finally:
+        set_launcher(old_launcher)
+    return old, new, launched
+
+
+def test_wmic_fallback_parses_output():
+    old_launcher = set_launcher(StubLauncher())
+    try:
+        assert winos._wmic_long_bit() == '64'
+    finally:
+        set_launcher(old_launcher)
+
+
+def test_detection_is_faster_than_wmic():
+    old, new, launched = benchmark()
+    assert launched == 0
+    assert new < old
+
+
+if __name__ == '__main__':
+    old, new, launched = benchmark()
+    print('wmic path:       %.6fs for %d calls' % (old, CALLS))
+    print('in-process path: %.6fs for %d calls, %d commands launched' % (new, CALLS, launched))